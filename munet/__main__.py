@@ -65,7 +65,11 @@ async def async_main(args, config):
     # Setup the namespaces and network addressing.
 
     unet = await parser.async_build_topology(
-        config, rundir=args.rundir, args=args, pytestconfig=PytestConfig(args)
+        config,
+        rundir=args.rundir,
+        args=args,
+        pytestconfig=PytestConfig(args),
+        wait_links=args.topology_only,
     )
     logger.info("Topology up: rundir: %s", unet.rundir)
 
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""An asyncio native send/expect implementation.
+
+pexpect's ``async_=True`` can't be used with pipes or sockets, so waiting for
+output from those blocks the event loop. `AsyncSpawn` reads from an asyncio
+`StreamReader` instead. It works with UNIX sockets, pipes and ptys, so several
+consoles can be driven concurrently without stalling the loop.
+
+The module also has `Frame`, the sentinel framing used to run a bourne shell command
+and get its output and exit status in a single round trip.
+"""
+
+import asyncio
+import codecs
+import errno
+import fcntl
+import logging
+import os
+import re
+import shlex
+import socket
+import termios
+import time
+
+
+class ExpectEOF(EOFError):
+    """End of file was seen while expecting."""
+
+
+class ExpectTimeout(TimeoutError):
+    """The timeout expired while expecting."""
+
+
+class Frame:
+    """A bourne shell command framed by begin and end sentinels.
+
+    The begin sentinel is printed by its own line. The command is then sent as a
+    single compound command followed by the end sentinel, which includes the exit
+    status. The shell reads all of the block (printing only continuation prompts)
+    before running it. The sentinels are built by `printf` so echoed input never
+    matches them.
+
+    A shell (e.g., dash) may discard input it has already read when a command fails
+    to parse, so `isolate` should be used when several frames are sent at once. The
+    command is then run using `command eval` so a parse error can't affect the
+    frames that follow.
+    """
+
+    def __init__(self, tag, cmd, isolate=False):
+        self.tag = tag
+        if isolate:
+            cmd = f"command eval {shlex.quote(cmd)}"
+        self.endline = f"}}; printf '\\n@@MUNET:%s:END:%d@@\\n' {tag} \"$?\""
+        self.text = (
+            f"printf '@@MUNET:%s:BEGIN@@\\n' {tag}\n{{ :\n{cmd}\n{self.endline}\n"
+        )
+        self.begin_re = f"@@MUNET:{tag}:BEGIN@@"
+        self.end_re = f"@@MUNET:{tag}:END:(\\d+)@@"
+        self.sync_text = f"printf '@@MUNET:%s:SYNC@@\\n' {tag}\n"
+        self.sync_re = f"@@MUNET:{tag}:SYNC@@"
+
+    def get_output(self, output, cont_prompt=None, echo=False, escape=None):
+        """Get the command output from the text read before the end sentinel.
+
+        Args:
+            output: the text read after the prompt following the begin sentinel.
+            cont_prompt: the regex for the continuation prompt.
+            echo: True if the shell echoes its input.
+            escape: compiled regex of ANSI escape sequences to remove.
+        """
+        # Output follows the last continuation prompt (and any echoed input).
+        prompts = list(re.finditer(cont_prompt, output)) if cont_prompt else []
+        if prompts:
+            output = output[prompts[-1].end() :]
+        if echo:
+            idx = output.find(self.endline)
+            if idx != -1:
+                output = output[idx + len(self.endline) :]
+        if escape:
+            output = escape.sub("", output)
+        return output.replace("\r", "").strip()
+
+
+class AsyncSpawn:
+    """An asyncio send/expect process or connection.
+
+    The attributes `before`, `after`, `match` and `buffer` and the logfile
+    attributes behave as they do for pexpect.
+    """
+
+    def __init__(
+        self,
+        reader,
+        writer,
+        proc=None,
+        encoding="utf-8",
+        timeout=30,
+        name=None,
+        read_transport=None,
+    ):
+        """Create an AsyncSpawn.
+
+        Args:
+            reader: asyncio `StreamReader` to read output from.
+            writer: asyncio `StreamWriter` (or write transport) to send input to.
+            proc: the asyncio `Process`, if any, which is killed by `close`.
+            encoding: encoding of the input and output.
+            timeout: default expect timeout in seconds (None for no timeout).
+            name: name used in log messages.
+            read_transport: transport feeding `reader` to close on `close`.
+        """
+        self.reader = reader
+        self.writer = writer
+        self.proc = proc
+        self.read_transport = read_transport
+        self.encoding = encoding
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+        self.timeout = timeout
+        self.name = name if name else "AsyncSpawn"
+        self.echo = False
+
+        self.buffer = ""
+        self.before = None
+        self.after = None
+        self.match = None
+        self.match_index = None
+        self.eof = False
+
+        self.logfile = None
+        self.logfile_read = None
+        self.logfile_send = None
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc else None
+
+    def isalive(self):
+        if self.proc:
+            return self.proc.returncode is None
+        return not self.eof
+
+    def _log(self, s, logfile):
+        for lf in (self.logfile, logfile):
+            if lf:
+                lf.write(s)
+                lf.flush()
+
+    def send(self, s):
+        """Send the string `s`."""
+        self._log(s, self.logfile_send)
+        self.writer.write(s.encode(self.encoding))
+        return len(s)
+
+    def sendline(self, s=""):
+        """Send the string `s` followed by a newline."""
+        return self.send(s + "\n")
+
+    def _search(self, patterns):
+        """Return the index and match of the earliest matching pattern, or None."""
+        best_index = None
+        best_match = None
+        for i, regex in enumerate(patterns):
+            m = regex.search(self.buffer)
+            if m and (best_match is None or m.start() < best_match.start()):
+                best_index, best_match = i, m
+        if best_match is None:
+            return None
+        return best_index, best_match
+
+    async def _read(self, timeout):
+        try:
+            if timeout is None:
+                data = await self.reader.read(4096)
+            else:
+                data = await asyncio.wait_for(self.reader.read(4096), timeout)
+        except OSError as error:
+            # Reading a pty returns EIO once the other end has been closed.
+            if error.errno != errno.EIO:
+                raise
+            data = b""
+        if not data:
+            self.eof = True
+            return
+        s = self.decoder.decode(data)
+        self._log(s, self.logfile_read)
+        self.buffer += s
+
+    async def expect(self, patterns, timeout=-1):
+        """Wait for one of `patterns` to be seen in the output.
+
+        Args:
+            patterns: a regex string, compiled regex or a list of them.
+            timeout: seconds to wait, -1 for the default or None for no timeout.
+
+        Returns:
+            The index in `patterns` of the pattern that matched first in the output.
+
+        Raises:
+            ExpectTimeout: if no pattern is seen within `timeout`.
+            ExpectEOF: if end of file is seen first.
+        """
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        patterns = [re.compile(x) if isinstance(x, str) else x for x in patterns]
+        if timeout == -1:
+            timeout = self.timeout
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            found = self._search(patterns)
+            if found:
+                index, m = found
+                self.before = self.buffer[: m.start()]
+                self.after = m.group(0)
+                self.match = m
+                self.match_index = index
+                self.buffer = self.buffer[m.end() :]
+                return index
+            if self.eof:
+                self.before = self.buffer
+                self.buffer = ""
+                raise ExpectEOF(f"{self}: EOF while expecting {patterns}")
+            remaining = None if end is None else end - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError()
+                await self._read(remaining)
+            except asyncio.TimeoutError:
+                raise ExpectTimeout(
+                    f"{self}: timeout expecting {patterns}, buffer: {self.buffer!r}"
+                ) from None
+
+    async def close(self):
+        """Close the connection and kill and reap the process if any."""
+        self.writer.close()
+        if self.read_transport:
+            self.read_transport.close()
+        if self.proc:
+            if self.proc.returncode is None:
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:
+                    pass
+            await self.proc.wait()
+
+
+async def open_unix_spawn(sock, **kwargs):
+    """Create an `AsyncSpawn` for a connected UNIX socket (or its path)."""
+    if isinstance(sock, (str, os.PathLike)):
+        reader, writer = await asyncio.open_unix_connection(str(sock))
+    elif isinstance(sock, int):
+        sock = socket.socket(fileno=sock)
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+    else:
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+    return AsyncSpawn(reader, writer, **kwargs)
+
+
+async def create_process_spawn(args, use_pty=False, preexec_fn=None, **kwargs):
+    """Create an `AsyncSpawn` for a new process.
+
+    Args:
+        args: the command and its arguments.
+        use_pty: run the process on a new pty (with echo disabled) as its
+            controlling terminal, otherwise pipes are used for its standard input
+            and output (with standard error merged into the output).
+        preexec_fn: called in the child before exec.
+        **kwargs: passed on to `asyncio.create_subprocess_exec` except for
+            `encoding`, `timeout` and `name` which are passed on to `AsyncSpawn`.
+    """
+    skwargs = {k: kwargs.pop(k) for k in ("encoding", "timeout", "name") if k in kwargs}
+    if not use_pty:
+        # A new session keeps the process from being stopped by terminal signals.
+        # This doesn't need a `preexec_fn`, which keeps `subprocess` from using
+        # vfork and isn't safe to use with threads.
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True,
+            preexec_fn=preexec_fn,
+            **kwargs,
+        )
+        return AsyncSpawn(proc.stdout, proc.stdin, proc, **skwargs)
+
+    master, slave = os.openpty()
+    attrs = termios.tcgetattr(slave)
+    attrs[3] &= ~termios.ECHO
+    termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+    def pty_preexec():
+        os.setsid()
+        fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+        if preexec_fn:
+            preexec_fn()
+
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=slave,
+            stdout=slave,
+            stderr=slave,
+            preexec_fn=pty_preexec,
+            **kwargs,
+        )
+    except Exception:
+        os.close(master)
+        raise
+    finally:
+        os.close(slave)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    rfile = os.fdopen(master, "rb", buffering=0)
+    rtransport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), rfile
+    )
+    wfile = os.fdopen(os.dup(master), "wb", buffering=0)
+    transport, _ = await loop.connect_write_pipe(asyncio.Protocol, wfile)
+    logging.debug("create_process_spawn: pid %s on pty %s", proc.pid, master)
+    return AsyncSpawn(reader, transport, proc, read_transport=rtransport, **skwargs)
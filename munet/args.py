@@ -25,11 +25,29 @@ def add_launch_args(add_func):
         action="store_true",
         help="no isolation for top namespace, bridges exposed to default namespace",
     )
+    add_func(
+        "--kill-grace",
+        type=float,
+        metavar="SECS",
+        help="seconds to wait for processes to exit before SIGKILL (default: 30)",
+    )
     add_func(
         "--pcap",
         metavar="TARGET-LIST",
         help="comma-sep list of capture targets (NETWORK or NODE:IFNAME) or 'all'",
     )
+    add_func(
+        "--profile-build",
+        action="store_true",
+        help="record build and delete timing in RUNDIR/build-profile.json",
+    )
+    add_func(
+        "--sample-resources",
+        type=float,
+        metavar="SECS",
+        help="sample node CPU, memory and I/O usage every SECS into "
+        "RUNDIR/resources.jsonl",
+    )
     add_func(
         "--shell", metavar="NODE-LIST", help="comma-sep list of nodes to open shells on"
     )
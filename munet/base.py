@@ -8,6 +8,7 @@
 """A module that implements core functionality for library or standalone use."""
 
 import asyncio
+import contextlib
 import datetime
 import errno
 import ipaddress
@@ -21,14 +22,27 @@ import signal
 import subprocess
 import sys
 import tempfile
+import threading
 import time as time_mod
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Union
 
 from . import config as munet_config
 from . import linux
+from .aioexpect import ExpectEOF
+from .aioexpect import ExpectTimeout
+from .aioexpect import Frame
+from .aioexpect import create_process_spawn
+from .aioexpect import open_unix_spawn
+from .muexec import Executor
+from .muexec import ExecutorError
+from .netlink import NetlinkError
+from .netlink import RtNetlink
+from .profiler import BuildProfiler
+from .profiler import count_subprocess
 
 try:
     import pexpect
@@ -43,12 +57,27 @@ except ImportError:
 PEXPECT_PROMPT = "PEXPECT_PROMPT>"
 PEXPECT_CONTINUATION_PROMPT = "PEXPECT_PROMPT+"
 
+# Seconds to wait for a process to exit after SIGHUP before sending SIGKILL.
+KILL_GRACE = 30
+
 root_hostname = subprocess.check_output("hostname")
 our_pid = os.getpid()
 
 
 detailed_cmd_logging = False
 
+# Popen keyword args that commands run by a namespace executor may use.
+executor_kwargs = {
+    "cwd",
+    "encoding",
+    "env",
+    "ns_only",
+    "start_new_session",
+    "stderr",
+    "stdout",
+    "text",
+}
+
 
 class MunetError(Exception):
     """A generic munet error."""
@@ -71,6 +100,24 @@ class CalledProcessError(subprocess.CalledProcessError):
         return f"munet.base.CalledProcessError({self.returncode}, {self.cmd}, {o}, {e})"
 
 
+class BatchCmdError(CalledProcessError):
+    """A command in a batch of `ip` or `tc` commands failed.
+
+    The ``failed`` attribute is a list of ``(lineno, command)`` tuples, one for each
+    command in the batch that failed.
+    """
+
+    def __init__(self, returncode, cmd, output=None, stderr=None, failed=None):
+        super().__init__(returncode, cmd, output, stderr)
+        self.failed = failed if failed else []
+
+    def __str__(self):
+        s = super().__str__()
+        for lineno, line in self.failed:
+            s += f"\n\tfailed line {lineno}: {line}"
+        return s
+
+
 class Timeout:
     """An object to passively monitor for timeouts."""
 
@@ -322,6 +369,233 @@ def ensure_non_threaded_event_watcher():
     assert asyncio.get_event_loop_policy().get_child_watcher() is watcher
 
 
+async def _async_poll_pid_exit(pid, timeout):
+    for _ in Timeout(timeout):
+        try:
+            if os.waitpid(pid, os.WNOHANG) != (0, 0):
+                return True
+        except ChildProcessError:
+            # Not our child so check if it still exists.
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def async_wait_pid_exit(pid, timeout):
+    """Wait for the process `pid` to exit.
+
+    A pidfd is used to wait for the exit without polling, the process does not need
+    to be a child of ours. The process is not reaped.
+
+    Args:
+        pid: the process to wait on.
+        timeout: the maximum number of seconds to wait.
+
+    Returns:
+        True if the process exited, False if the timeout expired.
+    """
+    try:
+        fd = linux.pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except OSError as error:
+        logging.debug("pidfd_open(%s) failed, polling for exit: %s", pid, error)
+        return await _async_poll_pid_exit(pid, timeout)
+
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+
+    def on_exit():
+        if not exited.done():
+            exited.set_result(True)
+
+    loop.add_reader(fd, on_exit)
+    try:
+        await asyncio.wait_for(exited, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+
+
+def namespace_thread_pool(max_workers, proc_path="/proc"):
+    """Create a thread pool which also works after an inline PID namespace unshare.
+
+    After an inline unshare of a PID namespace the kernel does not allow creating
+    threads (see EINVAL in clone(2)). To work around this our PID namespace for
+    children is set back to our active PID namespace while the pool threads are
+    created, and each pool thread then sets its PID namespace for children to the
+    unshared one so the processes it runs are created there.
+
+    All the threads are created before returning, and since processes such as mutini
+    are killed when the thread which created them exits (see PR_SET_PDEATHSIG in
+    prctl(2)) the pool must not be shutdown until those processes are gone.
+
+    Args:
+        max_workers: number of threads in the pool.
+        proc_path: path of a /proc which shows our process (i.e., `unet.proc_path`).
+
+    Returns:
+        ThreadPoolExecutor: the thread pool.
+    """
+    nspath = f"{proc_path}/{our_pid}/ns"
+    if os.readlink(f"{nspath}/pid") == os.readlink(f"{nspath}/pid_for_children"):
+        initializer, initargs, afd, cfd = None, (), None, None
+    else:
+        afd = os.open(f"{nspath}/pid", os.O_RDONLY)
+        cfd = os.open(f"{nspath}/pid_for_children", os.O_RDONLY)
+        initializer, initargs = linux.setns, (cfd, linux.CLONE_NEWPID)
+
+    pool = ThreadPoolExecutor(
+        max_workers,
+        thread_name_prefix="munet",
+        initializer=initializer,
+        initargs=initargs,
+    )
+    try:
+        if afd is not None:
+            linux.setns(afd, linux.CLONE_NEWPID)
+        try:
+            # Threads are created on submit, use a barrier to create them all now.
+            barrier = threading.Barrier(max_workers, timeout=30)
+            try:
+                futures = [pool.submit(barrier.wait) for _ in range(max_workers)]
+            except Exception:
+                barrier.abort()
+                raise
+        finally:
+            if cfd is not None:
+                linux.setns(cfd, linux.CLONE_NEWPID)
+        for future in futures:
+            future.result()
+    except Exception:
+        pool.shutdown(cancel_futures=True)
+        raise
+    finally:
+        if afd is not None:
+            os.close(afd)
+            os.close(cfd)
+    return pool
+
+
+class CmdBatch:
+    """A batch of `ip` or `tc` commands run using a single process.
+
+    Commands are queued with :py:meth:`add` and then all run by :py:meth:`flush`
+    using ``<tool> -force -batch -``. Normally this object is obtained using the
+    :py:meth:`Commander.ip_batch` or :py:meth:`Commander.tc_batch` context managers
+    which flush the batch on exit.
+    """
+
+    def __init__(self, cmdr, tool="ip", ns_only=True, netns=None):
+        """Create a batch.
+
+        Args:
+            cmdr: the commander to run the batch with.
+            tool: "ip" or "tc".
+            ns_only: run the tool in the namespace only (i.e., not in a container).
+            netns: a nested network namespace name to run the commands in.
+        """
+        assert tool in ("ip", "tc")
+        self.commander = cmdr
+        self.tool = tool
+        self.ns_only = ns_only
+        self.netns = netns
+        self.lines = []
+
+    def __len__(self):
+        return len(self.lines)
+
+    def add(self, cmd, ignore_error=False):
+        """Queue a command to run in the batch.
+
+        Args:
+            cmd: `str` or `list` of the command arguments, a leading tool name
+                (e.g., "ip") is removed. Global options (e.g., "-6") are not
+                supported, the address family is inferred from the addresses.
+            ignore_error: do not consider this command failing as an error.
+        """
+        if not isinstance(cmd, str):
+            cmd = shlex.join(str(x) for x in cmd)
+        first, _, rest = cmd.strip().partition(" ")
+        if os.path.basename(first) == self.tool:
+            cmd = rest.strip()
+        if cmd.startswith("-"):
+            # Global options (e.g., `-6`) are not valid per-line in batch mode.
+            raise ValueError(f"batch command can not have options: {cmd}")
+        assert "\n" not in cmd
+        self.lines.append((cmd, ignore_error))
+
+    def get_cmd(self):
+        if self.ns_only:
+            path = self.commander.get_exec_path_host(self.tool)
+        else:
+            path = self.tool
+        cmd = [path]
+        if self.netns:
+            cmd += ["-n", self.netns]
+        return cmd + ["-force", "-batch", "-"]
+
+    def _finish(self, cmd, rc, o, e, raises):
+        lines, self.lines = self.lines, []
+        if not rc:
+            return rc, o, e
+        failed = []
+        ignored = 0
+        for m in re.finditer(r"Command failed \S+:(\d+)", e if e else ""):
+            lineno = int(m.group(1))
+            line, ignore_error = lines[lineno - 1]
+            if ignore_error:
+                ignored += 1
+            else:
+                failed.append((lineno, line))
+        if not failed and ignored:
+            return 0, o, e
+
+        error = BatchCmdError(rc, cmd, o, e, failed)
+        self.commander.logger.warning("%s: batch failed: %s", self.commander, error)
+        if raises:
+            raise error
+        return rc, o, e
+
+    def flush(self, raises=True):
+        """Run all the queued commands.
+
+        Args:
+            raises: raise an exception if any (non-ignored) command failed.
+
+        Returns:
+            (status, output, error) of the batch run.
+
+        Raises:
+            BatchCmdError: a command failed, the exception lists the failed commands.
+        """
+        if not self.lines:
+            return 0, "", ""
+        cmd = self.get_cmd()
+        pinput = "".join(x[0] + "\n" for x in self.lines)
+        rc, o, e = self.commander.cmd_status(
+            cmd, stdin=pinput, ns_only=self.ns_only, warn=False
+        )
+        return self._finish(cmd, rc, o, e, raises)
+
+    async def async_flush(self, raises=True):
+        """Run all the queued commands, see :py:meth:`flush`."""
+        if not self.lines:
+            return 0, "", ""
+        cmd = self.get_cmd()
+        pinput = "".join(x[0] + "\n" for x in self.lines)
+        rc, o, e = await self.commander.async_cmd_status(
+            cmd, stdin=pinput, ns_only=self.ns_only, warn=False
+        )
+        return self._finish(cmd, rc, o, e, raises)
+
+
 class Commander:  # pylint: disable=R0904
     """An object that can execute commands."""
 
@@ -345,6 +619,9 @@ class Commander:  # pylint: disable=R0904
         self.deleting = False
         self.last = None
         self.exec_paths = {}
+        self.executor = None
+        # The CGroup new processes are placed in, see `munet.cgroup`.
+        self.cgroup = None
 
         # For running commands one time only (deals with asyncio)
         self.cmd_once_done = {}
@@ -437,8 +714,23 @@ class Commander:  # pylint: disable=R0904
         """Check if path exists."""
         return self.test("-e", path)
 
-    async def cleanup_pid(self, pid, kill_pid=None):
-        """Signal a pid to exit with escalating forcefulness."""
+    @property
+    def kill_grace(self):
+        """Seconds to wait for a process to exit after SIGHUP before SIGKILL."""
+        unet = self.unet if self.unet else self
+        cfgopt = getattr(unet, "cfgopt", None)
+        grace = cfgopt.getoption("--kill-grace") if cfgopt else None
+        return float(grace) if grace is not None else KILL_GRACE
+
+    async def cleanup_pid(self, pid, kill_pid=None, reap=True):
+        """Signal a pid to exit with escalating forcefulness.
+
+        Args:
+            pid: the process to wait on to exit.
+            kill_pid: the process to signal, if None then `pid`.
+            reap: if True reap `pid` after it exits, pass False if the owner of
+                the process (e.g., a Popen object) will reap it.
+        """
         if kill_pid is None:
             kill_pid = pid
 
@@ -447,33 +739,33 @@ class Commander:  # pylint: disable=R0904
                 "%s: %s %s (wait %s)", self, signal.Signals(sn).name, kill_pid, pid
             )
 
-            os.kill(kill_pid, sn)
+            try:
+                os.kill(kill_pid, sn)
+            except ProcessLookupError:
+                self.logger.debug("%s: pid %s already exited", self, kill_pid)
 
             # No need to wait after this.
             if sn == signal.SIGKILL:
                 return
 
-            # try each signal, waiting 15 seconds for exit before advancing
-            wait_sec = 30
+            wait_sec = self.kill_grace
             self.logger.debug("%s: waiting %ss for pid to exit", self, wait_sec)
-            for _ in Timeout(wait_sec):
-                try:
-                    status = os.waitpid(pid, os.WNOHANG)
-                    if status == (0, 0):
-                        await asyncio.sleep(0.1)
-                    else:
-                        self.logger.debug("pid %s exited status %s", pid, status)
-                        return
-                except OSError as error:
-                    if error.errno == errno.ECHILD:
-                        self.logger.debug("%s: pid %s was reaped", self, pid)
-                    else:
-                        self.logger.warning(
-                            "%s: error waiting on pid %s: %s", self, pid, error
-                        )
-                    return
+            if await async_wait_pid_exit(pid, wait_sec):
+                break
             self.logger.debug("%s: timeout waiting on pid %s to exit", self, pid)
 
+        if not reap:
+            self.logger.debug("%s: pid %s exited", self, pid)
+            return
+        try:
+            status = os.waitpid(pid, os.WNOHANG)
+            self.logger.debug("pid %s exited status %s", pid, status)
+        except OSError as error:
+            if error.errno == errno.ECHILD:
+                self.logger.debug("%s: pid %s was reaped", self, pid)
+            else:
+                self.logger.warning("%s: error waiting on pid %s: %s", self, pid, error)
+
     def _get_sub_args(self, cmd_list, defaults, use_pty=False, ns_only=False, **kwargs):
         """Returns pre-command, cmd, and default keyword args."""
         assert not isinstance(cmd_list, str)
@@ -496,6 +788,7 @@ class Commander:  # pylint: disable=R0904
         return pre_cmd_list, cmd_list, defaults
 
     def _common_prologue(self, async_exec, method, cmd, skip_pre_cmd=False, **kwargs):
+        count_subprocess()
         cmd_list = self._get_cmd_as_list(cmd)
         if method == "_spawn":
             defaults = {
@@ -546,6 +839,13 @@ class Commander:  # pylint: disable=R0904
             )
 
         actual_cmd_list = cmd_list if skip_pre_cmd else pre_cmd_list + cmd_list
+        cgroup = self.cgroup if self.cgroup else getattr(self.unet, "cgroup", None)
+        # Only long-lived processes are placed in the cgroup. Short commands are run
+        # by the executor helper (which is in the cgroup), or have exited by the time
+        # the cgroup is used, and the extra exec would slow every one of them.
+        if cgroup and method not in ("cmd_status", "async_cmd_status"):
+            enter_cmd = cgroup.get_enter_cmd(get_exec_path_host("sh"))
+            actual_cmd_list = enter_cmd + actual_cmd_list
         return actual_cmd_list, defaults
 
     async def _async_popen(self, method, cmd, **kwargs):
@@ -936,26 +1236,119 @@ class Commander:  # pylint: disable=R0904
         if not is_bourne:
             return ShellWrapper(p, prompt, will_echo=will_echo)
 
-        ps1 = PEXPECT_PROMPT
-        ps2 = PEXPECT_CONTINUATION_PROMPT
-
-        # Avoid problems when =/usr/bin/env= prints the values
-        ps1p = ps1[:5] + "${UNSET_V}" + ps1[5:]
-        ps2p = ps2[:5] + "${UNSET_V}" + ps2[5:]
-
-        ps1 = re.escape(ps1)
-        ps2 = re.escape(ps2)
-        extra = [
-            "TERM=dumb",
-            "set +o emacs",
-            "set +o vi",
-            "unset HISTFILE",
-            "PAGER=cat",
-            "export PAGER",
-        ]
-        pchg = "PS1='{0}' PS2='{1}' PROMPT_COMMAND=''\n".format(ps1p, ps2p)
+        ps1, ps2, pchg, extra = get_bourne_shell_init()
         p.send(pchg)
-        return ShellWrapper(p, ps1, ps2, extra_init_cmd=extra, will_echo=will_echo)
+        return ShellWrapper(
+            p, ps1, ps2, extra_init_cmd=extra, will_echo=will_echo, framed=True
+        )
+
+    async def async_shell_spawn(
+        self,
+        cmd,
+        prompt,
+        expects=(),
+        sends=(),
+        use_pty=False,
+        will_echo=False,
+        is_bourne=True,
+        logfile=None,
+        logfile_read=None,
+        logfile_send=None,
+        trace=None,
+        timeout=120,
+        **kwargs,
+    ):
+        """Create an asyncio shell REPL (read-eval-print-loop).
+
+        This is the same as `shell_spawn` except the send/expect is asyncio native
+        so waiting for output never blocks the event loop.
+
+        Args:
+            cmd: shell and list of args to exec with, or an already connected UNIX
+                socket.
+            prompt: the REPL prompt to look for, the function returns when seen
+            expects: a list of regex other than `prompt` to look for.
+            sends: what to send when an element of `expects` matches.
+            use_pty: true to run `cmd` on a pty, otherwise uses pipes.
+            will_echo: True if the shell echoes its input.
+            is_bourne: if False then do not modify shell prompt for internal
+                parser friently format, and do not expect continuation prompts.
+            logfile: file to log all I/O to.
+            logfile_read: file to log output to.
+            logfile_send: file to log input to.
+            trace: if true then log send/expects
+            timeout: seconds to wait for the prompt, and the default expect timeout.
+            **kwargs - kwargs passed on to `asyncio.create_subprocess_exec`.
+
+        Returns:
+            An `AsyncShellWrapper`.
+        """
+        if is_file_like(cmd):
+            assert not use_pty
+            ac = "*socket*"
+            p = await open_unix_spawn(cmd, timeout=timeout, name=str(self))
+        else:
+            ac, defaults = self._common_prologue(
+                True, "_async_shell_spawn", cmd, use_pty=use_pty, **kwargs
+            )
+            for key in ("shell", "stdout", "stderr"):
+                defaults.pop(key, None)
+            defaults["env"]["PS1"] = "$ "
+            p = await create_process_spawn(
+                ac, use_pty=use_pty, timeout=timeout, name=str(self), **defaults
+            )
+        p.logfile = logfile
+        p.logfile_read = logfile_read
+        p.logfile_send = logfile_send
+
+        combined_prompt = r"({}|{})".format(re.escape(PEXPECT_PROMPT), prompt)
+        patterns = [combined_prompt, *expects]
+        try:
+            # Check for the prompt right away, otherwise we may be at a console so
+            # we send a \n to re-issue the prompt
+            try:
+                index = await p.expect(combined_prompt, timeout=0.1)
+            except ExpectTimeout:
+                p.send("\n")
+                index = await p.expect(patterns)
+            while index:
+                if trace:
+                    self.logger.debug(
+                        "%s: got expect: '%s' matching %d '%s', sending '%s'",
+                        self,
+                        p.match.group(0),
+                        index,
+                        patterns[index],
+                        sends[index - 1],
+                    )
+                if sends[index - 1]:
+                    p.send(sends[index - 1])
+                index = await p.expect(patterns)
+        except ExpectTimeout:
+            self.logger.error(
+                "%s: TIMEOUT looking for prompt '%s' expect buffer so far:\n%s",
+                self,
+                prompt,
+                indent(p.buffer),
+            )
+            await p.close()
+            raise
+        except ExpectEOF as eoferr:
+            before = indent(p.before)
+            self.logger.error(
+                "%s: EOF looking for prompt '%s' before EOF:\n%s", self, prompt, before
+            )
+            await p.close()
+            rc = p.proc.returncode if p.proc else 255
+            raise CalledProcessError(rc, ac, output=before) from eoferr
+
+        if not is_bourne:
+            return await AsyncShellWrapper(p, prompt, will_echo=will_echo).init()
+
+        ps1, ps2, pchg, extra = get_bourne_shell_init()
+        p.send(pchg)
+        repl = AsyncShellWrapper(p, ps1, ps2, will_echo=will_echo, framed=True)
+        return await repl.init(extra)
 
     def popen(self, cmd, **kwargs):
         """Creates a pipe with the given `command`.
@@ -1052,7 +1445,7 @@ class Commander:  # pylint: disable=R0904
         )
         try:
             # This will SIGHUP and wait a while then SIGKILL and return immediately
-            await self.cleanup_pid(p.pid, pid)
+            await self.cleanup_pid(p.pid, pid, reap=False)
 
             # Wait another 2 seconds after the possible SIGKILL above for the
             # parent nsenter to cleanup and exit
@@ -1102,6 +1495,71 @@ class Commander:  # pylint: disable=R0904
                 raise CalledProcessError(rc, ac, o, e)
         return rc, o, e
 
+    def _get_executor_request(self, method, cmds, stdin, pinput, kwargs):
+        """Get the executor request arguments for a command.
+
+        A command is given to the executor only if one is running and the command
+        would otherwise be run using the plain namespace pre-command (i.e., not
+        inside a container or VM) with Popen arguments the executor supports.
+
+        Returns:
+            None if the command should not use the executor, otherwise a dict of
+            keyword arguments for :py:meth:`Executor.run`.
+        """
+        if self.executor is None or not self.executor.running:
+            return None
+        if set(kwargs) - executor_kwargs:
+            return None
+        if kwargs.get("stdout", subprocess.PIPE) != subprocess.PIPE:
+            return None
+        stderr = kwargs.get("stderr", subprocess.PIPE)
+        if stderr not in (subprocess.PIPE, subprocess.STDOUT):
+            return None
+        if stdin not in (None, subprocess.PIPE, subprocess.DEVNULL):
+            return None
+
+        ns_only = kwargs.get("ns_only", False)
+        pre_cmd = self._get_pre_cmd(False, False, ns_only=True)
+        if not ns_only and self._get_pre_cmd(False, False) != pre_cmd:
+            return None
+
+        cwd = kwargs.get("cwd")
+        if cwd is None:
+            for arg in pre_cmd:
+                if arg.startswith("--wd="):
+                    cwd = arg[5:]
+
+        subkw = {"env": kwargs["env"]} if "env" in kwargs else {}
+        _, cmd_list, defaults = self._get_sub_args(
+            self._get_cmd_as_list(cmds), {}, ns_only=ns_only, **subkw
+        )
+        self.logger.debug('%s("%s") [executor]', method, shlex.join(cmd_list))
+
+        if isinstance(pinput, str):
+            pinput = pinput.encode(kwargs.get("encoding") or "utf-8")
+        return {
+            "args": cmd_list,
+            "env": defaults["env"],
+            "cwd": cwd,
+            "stdin": pinput if stdin == subprocess.PIPE else None,
+            "stderr_to_stdout": stderr == subprocess.STDOUT,
+            "new_session": bool(kwargs.get("start_new_session")),
+        }
+
+    def _executor_cmd_status_finish(self, cmds, req, result, raises, warn, encoding):
+        count_subprocess()
+        r, o, e = result
+        if encoding is not None:
+            o = o.decode(encoding)
+            e = e.decode(encoding)
+        if req["stderr_to_stdout"]:
+            e = None
+        return self._cmd_status_finish(r, cmds, req["args"], o, e, raises, warn)
+
+    def _executor_failed(self, error):
+        self.logger.warning("%s: executor failed, using nsenter: %s", self, error)
+        self.executor.close()
+
     def _cmd_status(self, cmds, raises=False, warn=True, stdin=None, **kwargs):
         """Execute a command."""
         timeout = None
@@ -1110,6 +1568,19 @@ class Commander:  # pylint: disable=R0904
             del kwargs["timeout"]
 
         pinput, stdin = Commander._cmd_status_input(stdin)
+
+        req = self._get_executor_request("cmd_status", cmds, stdin, pinput, kwargs)
+        if req is not None:
+            try:
+                result = self.executor.run(**req, timeout=timeout)
+            except ExecutorError as error:
+                self._executor_failed(error)
+            else:
+                encoding = kwargs.get("encoding", "utf-8")
+                return self._executor_cmd_status_finish(
+                    cmds, req, result, raises, warn, encoding
+                )
+
         p, actual_cmd = self._popen("cmd_status", cmds, stdin=stdin, **kwargs)
         o, e = p.communicate(pinput, timeout=timeout)
         return self._cmd_status_finish(p, cmds, actual_cmd, o, e, raises, warn)
@@ -1124,19 +1595,33 @@ class Commander:  # pylint: disable=R0904
             del kwargs["timeout"]
 
         pinput, stdin = Commander._cmd_status_input(stdin)
-        p, actual_cmd = await self._async_popen(
-            "async_cmd_status", cmds, stdin=stdin, **kwargs
-        )
 
         if text is False:
             encoding = None
         else:
             encoding = kwargs.get("encoding", "utf-8")
 
+        req = self._get_executor_request(
+            "async_cmd_status", cmds, stdin, pinput, kwargs
+        )
+        if req is not None:
+            try:
+                result = await self.executor.async_run(**req, timeout=timeout)
+            except ExecutorError as error:
+                self._executor_failed(error)
+            else:
+                return self._executor_cmd_status_finish(
+                    cmds, req, result, raises, warn, encoding
+                )
+
+        p, actual_cmd = await self._async_popen(
+            "async_cmd_status", cmds, stdin=stdin, **kwargs
+        )
+
         if encoding is not None and isinstance(pinput, str):
             pinput = pinput.encode(encoding)
         try:
-            o, e = await asyncio.wait_for(p.communicate(), timeout=timeout)
+            o, e = await asyncio.wait_for(p.communicate(pinput), timeout=timeout)
         except (TimeoutError, asyncio.TimeoutError) as error:
             raise subprocess.TimeoutExpired(
                 cmd=actual_cmd, timeout=timeout, output=None, stderr=None
@@ -1343,6 +1828,43 @@ class Commander:  # pylint: disable=R0904
         )
         return stdout
 
+    @contextlib.contextmanager
+    def ip_batch(self, ns_only=True, netns=None):
+        """Batch `ip` commands to run using a single `ip -batch` process.
+
+        The commands are run when the context is exited without an exception.
+
+        Example::
+
+            with node.ip_batch() as b:
+                b.add(f"link set {ifname} mtu 9000")
+                b.add(f"link set {ifname} up")
+
+        Args:
+            ns_only: run the commands in the namespace only (i.e., not in a
+                container or VM).
+            netns: a nested network namespace name to run the commands in.
+
+        Yields:
+            CmdBatch: the batch to add commands to.
+
+        Raises:
+            BatchCmdError: a command in the batch failed.
+        """
+        batch = CmdBatch(self, "ip", ns_only=ns_only, netns=netns)
+        yield batch
+        batch.flush()
+
+    @contextlib.contextmanager
+    def tc_batch(self, ns_only=True, netns=None):
+        """Batch `tc` commands to run using a single `tc -batch` process.
+
+        See :py:meth:`ip_batch`.
+        """
+        batch = CmdBatch(self, "tc", ns_only=ns_only, netns=netns)
+        yield batch
+        batch.flush()
+
     def cmd_legacy(self, cmd, **kwargs):
         """Execute a command with stdout and stderr joined, *IGNORES ERROR*."""
         defaults = {"stderr": subprocess.STDOUT}
@@ -1628,6 +2150,7 @@ class InterfaceMixin:
         self.next_intf_index = 0
         self.basename = "eth"
         # self.basename = name + "-eth"
+        self.netlink = None
         super().__init__(*args, **kwargs)
 
     @property
@@ -1686,6 +2209,40 @@ class InterfaceMixin:
         """
         return ifname
 
+    @property
+    def netns_path(self):
+        """The path of the network namespace file for this object."""
+        unet = self.unet if self.unet else self
+        return f"{unet.proc_path}/{self.pid}/ns/net"
+
+    @property
+    def root_path(self):
+        """The path of the root directory of the mount namespace of this object."""
+        unet = self.unet if self.unet else self
+        return f"{unet.proc_path}/{self.pid}/root"
+
+    def get_netlink(self):
+        """Get a netlink socket in the network namespace of this object.
+
+        Returns:
+            A `RtNetlink` object, or None if the iproute2 commands should be used.
+        """
+        unet = self.unet if self.unet else self
+        if self.netlink is None and getattr(unet, "use_netlink", False):
+            try:
+                self.netlink = RtNetlink(self.netns_path, logger=self.logger)
+            except OSError as error:
+                self.logger.warning(
+                    "%s: netlink unavailable, using iproute2: %s", self, error
+                )
+                unet.use_netlink = False
+        return self.netlink
+
+    def close_netlink(self):
+        if self.netlink:
+            self.netlink.close()
+            self.netlink = None
+
     def register_interface(self, ifname):
         if ifname not in self._intf_addrs:
             self._intf_addrs[ifname] = [None, None]
@@ -1805,17 +2362,16 @@ class InterfaceMixin:
         netem_args, tbf_args = self.get_linux_tc_args(nsifname, constraints)
         count = 1
         selector = f"root handle {count}:"
-        if netem_args:
-            self.cmd_raises(
-                f"tc qdisc add dev {nsifname} {selector} netem {netem_args}"
-            )
-            count += 1
-            selector = f"parent {count-1}: handle {count}"
-        # Place rate limit after delay otherwise limit/burst too complex
-        if tbf_args:
-            self.cmd_raises(f"tc qdisc add dev {nsifname} {selector} tbf {tbf_args}")
+        with self.tc_batch() as b:
+            if netem_args:
+                b.add(f"qdisc add dev {nsifname} {selector} netem {netem_args}")
+                count += 1
+                selector = f"parent {count-1}: handle {count}"
+            # Place rate limit after delay otherwise limit/burst too complex
+            if tbf_args:
+                b.add(f"qdisc add dev {nsifname} {selector} tbf {tbf_args}")
 
-        self.cmd_raises(f"tc qdisc show dev {nsifname}")
+            b.add(f"qdisc show dev {nsifname}")
 
 
 class LinuxNamespace(Commander, InterfaceMixin):
@@ -1838,6 +2394,8 @@ class LinuxNamespace(Commander, InterfaceMixin):
         unshare_inline=False,
         set_hostname=True,
         private_mounts=None,
+        executor=False,
+        use_pool=True,
         **kwargs,
     ):
         """Create a new linux namespace.
@@ -1858,6 +2416,10 @@ class LinuxNamespace(Commander, InterfaceMixin):
                 tmpfs is mounted on the internal path. Any paths specified are first
                 passed to `mkdir -p`.
             unshare_inline: Unshare the process itself rather than using a proxy.
+            executor: Run a persistent command executor inside the namespace and use
+                it to run commands rather than using `nsenter` for each command.
+            use_pool: Adopt a matching pre-created namespace from the unet's
+                `NamespacePool` if one is available.
             logger: Passed to superclass.
         """
         # logging.warning("LinuxNamespace: name %s kwargs %s", name, kwargs)
@@ -1879,6 +2441,17 @@ class LinuxNamespace(Commander, InterfaceMixin):
         self.init_pid = None
         self.unshare_inline = unshare_inline
         self.nsenter_fork = True
+        self.use_executor = executor
+
+        if use_pool and unet and unet.ns_pool and not unshare_inline:
+            key = NamespacePool.get_key(
+                net, mount, uts, cgroup, ipc, pid, time, user, executor
+            )
+            if pooled := unet.ns_pool.get(key):
+                self._adopt_namespace(pooled)
+                self._setup_namespace(uts, set_hostname, private_mounts)
+                self.logger.info("%s: created from pooled %s", self, pooled.name)
+                return
 
         #
         # Collect the namespaces to unshare
@@ -2395,6 +2968,11 @@ class LinuxNamespace(Commander, InterfaceMixin):
 
         self.__pre_cmd = list(self.__base_pre_cmd)
 
+        # Start the executor now so the remaining setup commands can use it. There's
+        # nothing to gain for inline unshare as no nsenter is used.
+        if executor and self.__base_pre_cmd:
+            self.start_executor()
+
         # Always mark new mount namespaces as recursive private
         if mount:
             # if self.p is None and not pid:
@@ -2444,11 +3022,33 @@ class LinuxNamespace(Commander, InterfaceMixin):
             #     "-t cgroup2 cgroup /sys/fs/cgroup"
             # )
 
+        self._setup_namespace(uts, set_hostname, private_mounts)
+
+        # this will fail if running inside the namespace with PID
+        if self.pid_ns:
+            o = self.cmd_nostatus_nsonly("ls -l /proc/1/ns")
+        else:
+            o = self.cmd_nostatus_nsonly("ls -l /proc/self/ns")
+
+        self.logger.debug("namespaces:\n %s", o)
+
+        # will cache the path, which is important in delete to avoid running a shell
+        # which can hang during cleanup
+        self.ip_path = get_exec_path_host("ip")
+        if net:
+            self.cmd_status_nsonly([self.ip_path, "link", "set", "lo", "up"])
+
+        self.logger.info("%s: created", self)
+
+    def _setup_namespace(self, uts, set_hostname, private_mounts):
+        """Setup the parts of a new namespace specific to this object."""
+        unet = self.unet
+
         # Set the hostname to the namespace name
         if uts and set_hostname:
             self.cmd_status_nsonly("hostname " + self.name)
             nroot = subprocess.check_output("hostname")
-            if unshare_inline or (unet and unet.unshare_inline):
+            if self.unshare_inline or (unet and unet.unshare_inline):
                 assert (
                     root_hostname != nroot
                 ), f'hostname unchanged from "{nroot}" wanted "{self.name}"'
@@ -2468,21 +3068,98 @@ class LinuxNamespace(Commander, InterfaceMixin):
                 else:
                     self.bind_mount(s[0], s[1])
 
-        # this will fail if running inside the namespace with PID
-        if self.pid_ns:
-            o = self.cmd_nostatus_nsonly("ls -l /proc/1/ns")
-        else:
-            o = self.cmd_nostatus_nsonly("ls -l /proc/self/ns")
+    def get_nsenter_cmds(self):
+        """Get the root base, root, base and regular commands to enter namespace."""
+        return (
+            self.__root_base_pre_cmd,
+            self.__root_pre_cmd,
+            self.__base_pre_cmd,
+            self.__pre_cmd,
+        )
 
-        self.logger.debug("namespaces:\n %s", o)
+    def _adopt_namespace(self, ns):
+        """Take over the namespaces and processes of the pre-created `ns`."""
+        self.logger.debug("%s: adopting pooled namespace %s", self, ns)
+        for attr in (
+            "cwd",
+            "nsflags",
+            "ifnetns",
+            "uflags",
+            "p_ns_fds",
+            "p_ns_fnames",
+            "pid_ns",
+            "init_pid",
+            "nsenter_fork",
+            "p",
+            "pid",
+            "pids",
+            "executor",
+            "ip_path",
+        ):
+            setattr(self, attr, getattr(ns, attr))
+        (
+            self.__root_base_pre_cmd,
+            self.__root_pre_cmd,
+            self.__base_pre_cmd,
+            self.__pre_cmd,
+        ) = ns.get_nsenter_cmds()
+        if self.executor:
+            self.executor.name = self.name
+            self.executor.logger = self.logger
+
+        rundir = self.unet.rundir
+        for suffix in ("-mutini.log", "-muexec.log"):
+            try:
+                os.rename(
+                    rundir.joinpath(fsafe_name(ns.name) + suffix),
+                    rundir.joinpath(fsafe_name(self.name) + suffix),
+                )
+            except OSError:
+                pass
 
-        # will cache the path, which is important in delete to avoid running a shell
-        # which can hang during cleanup
-        self.ip_path = get_exec_path_host("ip")
-        if net:
-            self.cmd_status_nsonly([self.ip_path, "link", "set", "lo", "up"])
+        # The pooled object no longer owns anything.
+        ns.p = None
+        ns.executor = None
 
-        self.logger.info("%s: created", self)
+    def start_executor(self):
+        """Start a persistent command executor inside the namespace.
+
+        Once started, commands that would otherwise be run using `nsenter` from the
+        munet process are instead run by the executor, which saves at least one
+        fork/exec per command.
+        """
+        if self.executor is not None:
+            return
+        executor = Executor(self.name, logger=self.logger)
+        fname = (self.unet or self).rundir.joinpath(
+            fsafe_name(self.name) + "-muexec.log"
+        )
+        with open(fname, "w", encoding="utf-8") as logf:
+            p = self.popen_nsonly(
+                executor.get_cmd(),
+                stdin=subprocess.DEVNULL,
+                stdout=logf,
+                stderr=subprocess.STDOUT,
+                pass_fds=(executor.child_fd,),
+                # new session so signals don't propagate
+                start_new_session=True,
+            )
+        executor.started(p)
+        self.logger.debug("%s: started executor: %s", self, proc_str(p))
+        self.executor = executor
+
+    async def stop_executor(self):
+        """Stop the command executor if running."""
+        executor = self.executor
+        if executor is None:
+            return
+        self.executor = None
+        executor.close()
+        if executor.p is not None:
+            try:
+                executor.p.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                await self.async_cleanup_proc(executor.p)
 
     def _get_pre_cmd(self, use_str, use_pty, ns_only=False, root_level=False, **kwargs):
         """Get the pre-user-command values.
@@ -2555,8 +3232,15 @@ class LinuxNamespace(Commander, InterfaceMixin):
         self.logger.debug("Moving interface %s to default namespace", intf)
         self.set_intf_netns(intf, str(self.pid))
 
-    def intf_ip_cmd(self, intf, cmd):
-        """Run an ip command, considering an interface's possible namespace."""
+    def intf_ip_cmd(self, intf, cmd, batch=None):
+        """Run an ip command, considering an interface's possible namespace.
+
+        If `batch` is given and the interface is not in a nested namespace then the
+        command is added to the batch rather than run immediately.
+        """
+        if batch is not None and intf not in self.ifnetns:
+            batch.add(cmd)
+            return
         if intf in self.ifnetns:
             if isinstance(cmd, list):
                 assert cmd[0].endswith("ip")
@@ -2566,8 +3250,15 @@ class LinuxNamespace(Commander, InterfaceMixin):
                 cmd = "ip -n " + self.ifnetns[intf] + cmd[2:]
         self.cmd_raises_nsonly(cmd)
 
-    def intf_tc_cmd(self, intf, cmd):
-        """Run a tc command, considering an interface's possible namespace."""
+    def intf_tc_cmd(self, intf, cmd, batch=None):
+        """Run a tc command, considering an interface's possible namespace.
+
+        If `batch` is given and the interface is not in a nested namespace then the
+        command is added to the batch rather than run immediately.
+        """
+        if batch is not None and intf not in self.ifnetns:
+            batch.add(cmd)
+            return
         if intf in self.ifnetns:
             if isinstance(cmd, list):
                 assert cmd[0].endswith("tc")
@@ -2577,6 +3268,28 @@ class LinuxNamespace(Commander, InterfaceMixin):
                 cmd = "tc -n " + self.ifnetns[intf] + cmd[2:]
         self.cmd_raises_nsonly(cmd)
 
+    def intf_addr_add(self, intf, ifaddr, peer=None, batch=None):
+        """Add an address to an interface, considering its possible namespace.
+
+        The netlink backend is used if enabled, otherwise an `ip` command is run (or
+        added to `batch`, see :py:meth:`intf_ip_cmd`).
+
+        Args:
+            intf: the interface name.
+            ifaddr: the address with prefix length (e.g., "10.0.0.1/24").
+            peer: the network of the peer for a point-to-point address.
+            batch: an optional `CmdBatch` to add an `ip` command to.
+        """
+        if intf not in self.ifnetns and (nl := self.get_netlink()):
+            nl.addr_add(intf, ifaddr, peer)
+            return
+        if peer is not None:
+            ifaddr = ipaddress.ip_interface(ifaddr)
+            cmd = f"ip addr add {ifaddr.ip} peer {peer} dev {intf}"
+        else:
+            cmd = f"ip addr add {ifaddr} dev {intf}"
+        self.intf_ip_cmd(intf, cmd, batch=batch)
+
     def set_ns_cwd(self, cwd: Union[str, Path]):
         """Common code for changing pre_cmd and pre_nscmd."""
         self.logger.debug("%s: new CWD %s", self, cwd)
@@ -2592,6 +3305,9 @@ class LinuxNamespace(Commander, InterfaceMixin):
         else:
             self.logger.debug("%s: LinuxNamespace sub-class deleting", self)
 
+        await self.stop_executor()
+        self.close_netlink()
+
         # Signal pid namespace proc to exit
         if (
             (self.p is None or self.p.pid != self.pid)
@@ -2603,11 +3319,16 @@ class LinuxNamespace(Commander, InterfaceMixin):
                 self.pid,
                 self.p.pid if self.p else None,
             )
-            await self.cleanup_pid(self.pid)
+            cleanups = [self.cleanup_pid(self.pid)]
+        else:
+            cleanups = []
 
         if self.p is not None:
             self.logger.debug("cleanup namespace proc pid %s", self.p.pid)
-            await self.async_cleanup_proc(self.p)
+            cleanups.append(self.async_cleanup_proc(self.p))
+
+        # Signal the processes together so the wait is for the slowest to exit.
+        await asyncio.gather(*cleanups)
 
         # return to the previous namespace, need to do this in case anothe munet
         # is being created, especially when it plans to inherit the parent's (host)
@@ -2740,6 +3461,9 @@ class Bridge(SharedNamespace, InterfaceMixin):
 
         super().__init__(name, pid=unet_pid, nsflags=unet.nsflags, unet=unet, **kwargs)
 
+        # We run in the unet namespaces so we can share its executor
+        self.executor = unet.executor
+
         self.set_intf_basename(self.name + "-e")
 
         self.mtu = mtu
@@ -2747,11 +3471,20 @@ class Bridge(SharedNamespace, InterfaceMixin):
         self.logger.debug("Bridge: Creating")
 
         # assert len(self.name) <= 16  # Make sure fits in IFNAMSIZE
-        self.cmd_raises(f"ip link delete {name} || true")
-        self.cmd_raises(f"ip link add {name} type bridge")
-        if self.mtu:
-            self.cmd_raises(f"ip link set {name} mtu {self.mtu}")
-        self.cmd_raises(f"ip link set {name} up")
+        if nl := self.get_netlink():
+            try:
+                nl.link_del(name)
+            except NetlinkError as error:
+                if error.errno != errno.ENODEV:
+                    raise
+            nl.link_add(name, "bridge", mtu=self.mtu, up=True)
+        else:
+            with self.ip_batch() as b:
+                b.add(f"link delete {name}", ignore_error=True)
+                b.add(f"link add {name} type bridge")
+                if self.mtu:
+                    b.add(f"link set {name} mtu {self.mtu}")
+                b.add(f"link set {name} up")
 
         self.logger.debug("%s: Created, Running", self)
 
@@ -2765,29 +3498,147 @@ class Bridge(SharedNamespace, InterfaceMixin):
         else:
             self.logger.debug("%s: Bridge sub-class deleting", self)
 
-        rc, o, e = await self.async_cmd_status(
-            [self.ip_path, "link", "show", self.name],
-            stdin=subprocess.DEVNULL,
-            start_new_session=True,
-            warn=False,
-        )
-        if not rc:
+        if nl := self.get_netlink():
+            try:
+                nl.link_del(self.name)
+            except NetlinkError as error:
+                if error.errno != errno.ENODEV:
+                    self.logger.error(
+                        "%s: error deleting bridge %s: %s", self, self.name, error
+                    )
+            self.close_netlink()
+        else:
             rc, o, e = await self.async_cmd_status(
-                [self.ip_path, "link", "delete", self.name],
+                [self.ip_path, "link", "show", self.name],
                 stdin=subprocess.DEVNULL,
                 start_new_session=True,
                 warn=False,
             )
-        if rc:
-            self.logger.error(
-                "%s: error deleting bridge %s: %s",
-                self,
-                self.name,
-                cmd_error(rc, o, e),
-            )
+            if not rc:
+                rc, o, e = await self.async_cmd_status(
+                    [self.ip_path, "link", "delete", self.name],
+                    stdin=subprocess.DEVNULL,
+                    start_new_session=True,
+                    warn=False,
+                )
+            if rc:
+                self.logger.error(
+                    "%s: error deleting bridge %s: %s",
+                    self,
+                    self.name,
+                    cmd_error(rc, o, e),
+                )
         await super()._async_delete()
 
 
+class NamespacePool:
+    """A pool of pre-created namespaces for a munet.
+
+    Creating a namespace (see `LinuxNamespace`) requires starting a namespace process,
+    waiting for it to unshare and then a number of commands to setup the namespace.
+    The pool creates blank namespaces in the background using its own thread pool
+    so that nodes can adopt one rather than creating their own during the build.
+    Creating nodes using the munet thread pool doesn't wait behind the pool.
+    """
+
+    def __init__(self, unet):
+        self.unet = unet
+        self.lock = threading.Lock()
+        self.futures = defaultdict(list)
+        self.count = 0
+        self.thread_pool = None
+
+    @staticmethod
+    def get_key(
+        net=True,
+        mount=True,
+        uts=True,
+        cgroup=False,
+        ipc=False,
+        pid=False,
+        time=False,
+        user=False,
+        executor=False,
+    ):
+        """Get the key used to match pooled namespaces to `LinuxNamespace` args."""
+        return (net, mount or pid, uts, cgroup, ipc, pid, time, user, bool(executor))
+
+    def fill(self, count, max_workers, **kwargs):
+        """Start creating `count` namespaces using `LinuxNamespace` args `kwargs`.
+
+        Args:
+            count: number of namespaces to create.
+            max_workers: maximum threads to use if creating the pool's thread pool.
+            **kwargs: namespace args (e.g., `pid`, `executor`) see `get_key`.
+        """
+        key = self.get_key(**kwargs)
+        if self.thread_pool is None:
+            self.thread_pool = namespace_thread_pool(
+                max(1, min(count, max_workers)), self.unet.proc_path
+            )
+        pool = self.thread_pool
+        for _ in range(count):
+            with self.lock:
+                self.count += 1
+                name = f"pool{self.count}"
+                self.futures[key].append(pool.submit(self._create, name, kwargs))
+
+    def _create(self, name, kwargs):
+        with self.unet.profiler.span("namespace-pool", name):
+            return LinuxNamespace(
+                name, unet=self.unet, set_hostname=False, use_pool=False, **kwargs
+            )
+
+    def get(self, key):
+        """Get a pre-created namespace matching `key` if available, otherwise None.
+
+        Namespaces which have not started being created are not returned so nodes
+        don't wait for the pool to get to them.
+        """
+        with self.lock:
+            futures = self.futures.get(key, [])
+            for future in futures:
+                if future.running() or future.done():
+                    futures.remove(future)
+                    break
+            else:
+                return None
+        try:
+            return future.result()
+        except Exception as error:
+            self.unet.logger.warning(
+                "%s: pooled namespace failed: %s", self.unet, error
+            )
+            return None
+
+    async def async_delete(self):
+        """Delete any namespaces which were not adopted."""
+        with self.lock:
+            futures = [x for y in self.futures.values() for x in y]
+            self.futures.clear()
+        nses = []
+        for future in futures:
+            if future.cancel():
+                continue
+            try:
+                nses.append(await asyncio.wrap_future(future))
+            except Exception as error:
+                self.unet.logger.debug(
+                    "%s: pooled namespace failed: %s", self.unet, error
+                )
+        await asyncio.gather(*(x.async_delete() for x in nses), return_exceptions=True)
+
+    def shutdown(self):
+        """Shutdown the thread pool, after any adopted namespaces are deleted.
+
+        Like the munet thread pool, processes created by the pool threads are killed
+        when the threads exit, see `namespace_thread_pool`.
+        """
+        if self.thread_pool:
+            self.thread_pool.shutdown(cancel_futures=True)
+            self.thread_pool = None
+
+
 class BaseMunet(LinuxNamespace):
     """Munet."""
 
@@ -2798,11 +3649,28 @@ class BaseMunet(LinuxNamespace):
         pid=True,
         rundir=None,
         pytestconfig=None,
+        netlink=True,
         **kwargs,
     ):
-        """Create a Munet."""
+        """Create a Munet.
+
+        Args:
+            name: name of the munet.
+            isolated: create new network and UTS namespaces.
+            pid: create a new PID namespace.
+            rundir: directory for run time files.
+            pytestconfig: pytest config object if running under pytest.
+            netlink: use netlink rather than iproute2 commands to create links and
+                set addresses.
+        """
         # logging.warning("BaseMunet: %s", name)
 
+        self.cfgopt = munet_config.ConfigOptionsProxy(pytestconfig)
+        self.profiler = BuildProfiler(bool(self.cfgopt.getoption("--profile-build")))
+
+        self.use_netlink = netlink
+        self.thread_pool = None
+        self.ns_pool = None
         self.hosts = {}
         self.switches = {}
         self.links = {}
@@ -2868,8 +3736,6 @@ class BaseMunet(LinuxNamespace):
 
         roothost = self.rootcmd
 
-        self.cfgopt = munet_config.ConfigOptionsProxy(pytestconfig)
-
         # This allows us to cleanup any leftover running munet's
         if "MUNET_PID" in os.environ:
             if os.environ["MUNET_PID"] != str(our_pid):
@@ -2880,9 +3746,16 @@ class BaseMunet(LinuxNamespace):
                 )
         os.environ["MUNET_PID"] = str(our_pid)
 
-        super().__init__(
-            name, mount=True, net=isolated, uts=isolated, pid=pid, unet=None, **kwargs
-        )
+        with self.profiler.span("unet"):
+            super().__init__(
+                name,
+                mount=True,
+                net=isolated,
+                uts=isolated,
+                pid=pid,
+                unet=None,
+                **kwargs,
+            )
 
         # this is for testing purposes do not use
         if not BaseMunet.g_unet:
@@ -2895,13 +3768,42 @@ class BaseMunet(LinuxNamespace):
             return self.switches[key]
         return self.hosts[key]
 
+    async def async_profile_span(self, aw, name, node=None):
+        """Await `aw` inside a profiler span, see `BuildProfiler.span`."""
+        with self.profiler.span(name, node):
+            return await aw
+
+    def fill_namespace_pool(self, count, max_workers, **kwargs):
+        """Pre-create namespaces for hosts to adopt, see `NamespacePool.fill`."""
+        if self.ns_pool is None:
+            self.ns_pool = NamespacePool(self)
+        self.ns_pool.fill(count, max_workers, **kwargs)
+
+    def get_thread_pool(self, max_workers):
+        """Get the munet thread pool for running blocking work concurrently.
+
+        The pool is created on first use with `max_workers` threads and is kept until
+        munet is deleted, see `namespace_thread_pool`.
+        """
+        if self.thread_pool is None:
+            self.thread_pool = namespace_thread_pool(max_workers, self.proc_path)
+        return self.thread_pool
+
     def add_host(self, name, cls=LinuxNamespace, **kwargs):
         """Add a host to munet."""
-        self.logger.debug("%s: add_host %s(%s)", self, cls.__name__, name)
+        self.hosts[name] = self.create_host(name, cls, **kwargs)
+        return self.hosts[name]
 
-        self.hosts[name] = cls(name, unet=self, **kwargs)
+    def create_host(self, name, cls=LinuxNamespace, **kwargs):
+        """Create a host for munet without adding it to `hosts`.
 
-        return self.hosts[name]
+        This may be called from multiple threads concurrently, see `add_host`.
+        """
+        self.logger.debug("%s: add_host %s(%s)", self, cls.__name__, name)
+
+        if self.use_executor and issubclass(cls, LinuxNamespace):
+            kwargs.setdefault("executor", True)
+        return cls(name, unet=self, **kwargs)
 
     def add_dummy(self, node1, if1, mtu=None, **intf_constraints):
         """Add a dummy for an interface with no link."""
@@ -2919,11 +3821,14 @@ class BaseMunet(LinuxNamespace):
         lhost = self.hosts[name1]
 
         nsif1 = lhost.get_ns_ifname(if1)
-        lhost.cmd_raises_nsonly(f"ip link add name {nsif1} type dummy")
-
-        if mtu:
-            lhost.cmd_raises_nsonly(f"ip link set {nsif1} mtu {mtu}")
-        lhost.cmd_raises_nsonly(f"ip link set {nsif1} up")
+        if nl := lhost.get_netlink():
+            nl.link_add(nsif1, "dummy", mtu=mtu, up=True)
+        else:
+            with lhost.ip_batch() as b:
+                b.add(f"link add name {nsif1} type dummy")
+                if mtu:
+                    b.add(f"link set {nsif1} mtu {mtu}")
+                b.add(f"link set {nsif1} up")
         lhost.register_interface(if1)
 
         # Setup interface constraints if provided
@@ -2981,22 +3886,39 @@ class BaseMunet(LinuxNamespace):
             nsif1 = lhost.get_ns_ifname(if1)
             nsif2 = rhost.get_ns_ifname(if2)
 
-            # Use pids[-1] to get the unet scoped pid for hosts
-            self.cmd_raises_nsonly(
-                f"ip link add {lifname} type veth peer name {nsif2}"
-                f" netns {rhost.pids[-1]}"
-            )
-            self.cmd_raises_nsonly(f"ip link set {lifname} netns {lhost.pids[-1]}")
-
-            lhost.cmd_raises_nsonly("ip link set {} name {}".format(lifname, nsif1))
-            if mtu:
-                lhost.cmd_raises_nsonly("ip link set {} mtu {}".format(nsif1, mtu))
-            lhost.cmd_raises_nsonly("ip link set {} up".format(nsif1))
+            if (lnl := lhost.get_netlink()) and (rnl := rhost.get_netlink()):
+                # Create directly in the host namespaces, no temporary name needed.
+                link = lnl.link_add(
+                    nsif1,
+                    "veth",
+                    mtu=mtu,
+                    up=True,
+                    peer=nsif2,
+                    peer_netns=rhost.netns_path,
+                    peer_mtu=mtu,
+                )
+                self.set_mac(name1, nsif1, link["address"])
+                rnl.link_set(nsif2, up=True)
+            else:
+                # Use pids[-1] to get the unet scoped pid for hosts
+                with self.ip_batch() as b:
+                    b.add(
+                        f"link add {lifname} type veth peer name {nsif2}"
+                        f" netns {rhost.pids[-1]}"
+                    )
+                    b.add(f"link set {lifname} netns {lhost.pids[-1]}")
+
+                with lhost.ip_batch() as b:
+                    b.add(f"link set {lifname} name {nsif1}")
+                    if mtu:
+                        b.add(f"link set {nsif1} mtu {mtu}")
+                    b.add(f"link set {nsif1} up")
+
+                with rhost.ip_batch() as b:
+                    if mtu:
+                        b.add(f"link set {nsif2} mtu {mtu}")
+                    b.add(f"link set {nsif2} up")
             lhost.register_interface(if1)
-
-            if mtu:
-                rhost.cmd_raises_nsonly("ip link set {} mtu {}".format(nsif2, mtu))
-            rhost.cmd_raises_nsonly("ip link set {} up".format(nsif2))
             rhost.register_interface(if2)
         else:
             switch = self.switches[name1]
@@ -3016,31 +3938,45 @@ class BaseMunet(LinuxNamespace):
 
             self.logger.debug("%s: Creating veth pair for link %s", self, lname)
 
-            # Use pids[-1] to get the unet scoped pid for hosts
-            # switch is already in our namespace so nothing to convert.
-            self.cmd_raises_nsonly(
-                f"ip link add {nsif1} type veth peer name {nsif2}"
-                f" netns {rhost.pids[-1]}"
-            )
+            if (snl := switch.get_netlink()) and (rnl := rhost.get_netlink()):
+                link = snl.link_add(
+                    nsif1,
+                    "veth",
+                    mtu=mtu,
+                    up=True,
+                    master=switch.name,
+                    peer=nsif2,
+                    peer_netns=rhost.netns_path,
+                    peer_mtu=mtu,
+                )
+                self.set_mac(name1, nsif1, link["address"])
+                rnl.link_set(nsif2, up=True)
+            else:
+                # Use pids[-1] to get the unet scoped pid for hosts
+                # switch is already in our namespace so nothing to convert.
+                self.cmd_raises_nsonly(
+                    f"ip link add {nsif1} type veth peer name {nsif2}"
+                    f" netns {rhost.pids[-1]}"
+                )
+
+                with switch.ip_batch() as b:
+                    if mtu:
+                        # if switch.mtu:
+                        #     # the switch interface should match the switch config
+                        #     b.add(f"link set {if1} mtu {switch.mtu}")
+                        b.add(f"link set {nsif1} mtu {mtu}")
+                    b.add(f"link set {nsif1} master {switch.name}")
+                    b.add(f"link set {nsif1} up")
 
-            if mtu:
-                # if switch.mtu:
-                #     # the switch interface should match the switch config
-                #     switch.cmd_raises_nsonly(
-                #         "ip link set {} mtu {}".format(if1, switch.mtu)
-                #     )
-                switch.cmd_raises_nsonly("ip link set {} mtu {}".format(nsif1, mtu))
-                rhost.cmd_raises_nsonly("ip link set {} mtu {}".format(nsif2, mtu))
+                with rhost.ip_batch() as b:
+                    if mtu:
+                        b.add(f"link set {nsif2} mtu {mtu}")
+                    b.add(f"link set {nsif2} up")
 
             switch.register_interface(if1)
             rhost.register_interface(if2)
             rhost.register_network(switch.name, if2)
 
-            switch.cmd_raises_nsonly(f"ip link set {nsif1} master {switch.name}")
-
-            switch.cmd_raises_nsonly(f"ip link set {nsif1} up")
-            rhost.cmd_raises_nsonly(f"ip link set {nsif2} up")
-
         # Cache the MAC values, and reverse mapping
         self.get_mac(name1, nsif1)
         self.get_mac(name2, nsif2)
@@ -3065,20 +4001,33 @@ class BaseMunet(LinuxNamespace):
         nsifname = self.get_ns_ifname(ifname)
 
         if (name, ifname) not in self.macs:
-            _, output, _ = dev.cmd_status_nsonly("ip -o link show " + nsifname)
-            m = re.match(".*link/(loopback|ether) ([0-9a-fA-F:]+) .*", output)
-            mac = m.group(2)
-            self.macs[(name, ifname)] = mac
-            self.rmacs[mac] = (name, ifname)
+            if nl := dev.get_netlink():
+                mac = nl.get_link(nsifname)["address"]
+            else:
+                _, output, _ = dev.cmd_status_nsonly("ip -o link show " + nsifname)
+                m = re.match(".*link/(loopback|ether) ([0-9a-fA-F:]+) .*", output)
+                mac = m.group(2)
+            self.set_mac(name, ifname, mac)
 
         return self.macs[(name, ifname)]
 
+    def set_mac(self, name, ifname, mac):
+        """Cache the MAC value of an interface, and the reverse mapping."""
+        self.macs[(name, ifname)] = mac
+        self.rmacs[mac] = (name, ifname)
+
     async def _delete_link(self, lname):
         rname, rif = self.links[lname][2:4]
         host = self.hosts[rname]
         nsrif = host.get_ns_ifname(rif)
 
         self.logger.debug("%s: Deleting veth pair for link %s", self, lname)
+        if nl := host.get_netlink():
+            try:
+                nl.link_del(nsrif)
+            except NetlinkError as error:
+                self.logger.error("Err del veth pair %s: %s", lname, error)
+            return
         rc, o, e = await host.async_cmd_status_nsonly(
             [self.ip_path, "link", "delete", nsrif],
             stdin=subprocess.DEVNULL,
@@ -3104,16 +4053,26 @@ class BaseMunet(LinuxNamespace):
 
         logger.debug("Deleting links")
         try:
-            await self._delete_links()
+            with self.profiler.span("links-delete"):
+                await self._delete_links()
         except Exception as error:
             logger.error("%s: error deleting links: %s", self, error, exc_info=True)
 
+        if self.ns_pool:
+            await self.ns_pool.async_delete()
+
         logger.debug("Deleting hosts and bridges")
         try:
             # Delete hosts and switches, wait for them all to complete
             # even if there is an exception.
-            htask = [x.async_delete() for x in self.hosts.values()]
-            stask = [x.async_delete() for x in self.switches.values()]
+            htask = [
+                self.async_profile_span(x.async_delete(), "node-delete", x.name)
+                for x in self.hosts.values()
+            ]
+            stask = [
+                self.async_profile_span(x.async_delete(), "network-delete", x.name)
+                for x in self.switches.values()
+            ]
             await asyncio.gather(*htask, *stask, return_exceptions=True)
         except Exception as error:
             logger.error(
@@ -3124,6 +4083,13 @@ class BaseMunet(LinuxNamespace):
         self.hosts = {}
         self.switches = {}
 
+        if self.thread_pool:
+            self.thread_pool.shutdown(cancel_futures=True)
+            self.thread_pool = None
+        if self.ns_pool:
+            self.ns_pool.shutdown()
+            self.ns_pool = None
+
         try:
             if self.cli_server:
                 self.cli_server.cancel()
@@ -3188,13 +4154,110 @@ class BaseMunet(LinuxNamespace):
 
 BaseMunet.g_unet = None
 
+
+class ShellWrapperBase:
+    """The command framing and output parsing of the REPL interfaces.
+
+    The `ShellWrapper` and `AsyncShellWrapper` subclasses do the sending and
+    expecting, pexpect blocking or asyncio awaiting respectively.
+    """
+
+    def __init__(
+        self,
+        spawn,
+        prompt,
+        continuation_prompt=None,
+        will_echo=False,
+        escape_ansi=False,
+        framed=False,
+    ):
+        self.child = spawn
+        self.prompt = prompt
+        self.cont_prompt = continuation_prompt
+        self.echo = will_echo
+        self.framed = framed
+        self.frame_id = os.urandom(4).hex()
+        self.frame_count = 0
+        self.escape = (
+            re.compile(r"(\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]") if escape_ansi else None
+        )
+        self.expects = [prompt]
+        if continuation_prompt:
+            self.expects.append(continuation_prompt)
+
+    @staticmethod
+    def _get_lines(command):
+        """Get the lines of `command` to send, a trailing newline adds an empty one."""
+        lines = command.splitlines()
+        if command[-1] == "\n":
+            lines.append("")
+        return lines
+
+    def _get_output(self, output, cmd):
+        r"""Get the (strip/cleaned \r) output of `cmd` from the `run_command` output."""
+        output = output.replace("\r\n", "\n")
+        if self.echo:
+            # remove the command
+            idx = output.find(cmd)
+            if idx == -1:
+                logging.warning(
+                    "Didn't find command ('%s') in expected output ('%s')",
+                    cmd,
+                    output,
+                )
+            else:
+                # Remove up to and including the command from the output stream
+                output = output[idx + len(cmd) :]
+
+        return output.replace("\r", "").strip()
+
+    def _get_status(self, rcstr):
+        """Get the exit status from the output of `echo $?`."""
+        try:
+            return int(rcstr)
+        except ValueError as error:
+            logging.error(
+                "%s: error with expected status output: %s: %s",
+                self,
+                error,
+                rcstr,
+                exc_info=True,
+            )
+            return 255
+
+    def _send_framed(self, cmd, isolate=False):
+        """Send `cmd` framed by sentinels, returns the `Frame`."""
+        self.frame_count += 1
+        frame = Frame(f"{self.frame_id}-{self.frame_count}", cmd, isolate)
+        self.child.send(frame.text)
+        return frame
+
+    def _get_framed_result(self, frame, index):
+        """Get the status and output of a frame once its end (`index` 0) is seen.
+
+        A non-zero `index` is the prompt, seen when the shell failed to parse the
+        block. It will run any remaining lines by themselves.
+        """
+        output = self.child.before
+        rc = int(self.child.match.group(1)) if index == 0 else 2
+        output = frame.get_output(
+            output, self.cont_prompt, self.echo and index == 0, self.escape
+        )
+        return rc, output
+
+
 if True:  # pylint: disable=using-constant-test
 
-    class ShellWrapper:
+    class ShellWrapper(ShellWrapperBase):
         """A Read-Execute-Print-Loop (REPL) interface.
 
         A newline or prompt changing command should be sent to the
         spawned child prior to creation as the `prompt` will be `expect`ed
+
+        When `framed` is True (only for bourne shells) each command is sent as a
+        single block followed by a unique sentinel which includes the exit status,
+        so the output and status are read with one `expect`, and several commands
+        can be sent before reading any of the results (see `cmds_status`).
         """
 
         def __init__(
@@ -3205,10 +4268,15 @@ if True:  # pylint: disable=using-constant-test
             extra_init_cmd=None,
             will_echo=False,
             escape_ansi=False,
+            framed=False,
         ):
-            self.echo = will_echo
-            self.escape = (
-                re.compile(r"(\x9B|\x1B\[)[0-?]*[ -\/]*[@-~]") if escape_ansi else None
+            super().__init__(
+                spawn,
+                prompt,
+                continuation_prompt,
+                will_echo,
+                escape_ansi,
+                framed,
             )
 
             logging.debug(
@@ -3218,24 +4286,18 @@ if True:  # pylint: disable=using-constant-test
                 spawn.echo,
             )
 
-            self.child = spawn
             if self.child.echo:
                 logging.info("Setting child to echo")
                 self.child.setecho(False)
                 self.child.waitnoecho()
                 assert not self.child.echo
 
-            self.prompt = prompt
-            self.cont_prompt = continuation_prompt
-
             # Use expect_exact if we can as it should be faster
-            self.expects = [prompt]
             if re.escape(prompt) == prompt and hasattr(self.child, "expect_exact"):
                 self._expectf = self.child.expect_exact
             else:
                 self._expectf = self.child.expect
             if continuation_prompt:
-                self.expects.append(continuation_prompt)
                 if re.escape(continuation_prompt) != continuation_prompt:
                     self._expectf = self.child.expect
 
@@ -3260,12 +4322,9 @@ if True:  # pylint: disable=using-constant-test
                     newline will cause and empty line to be sent.
                 timeout: pexpect timeout value.
             """
-            lines = command.splitlines()
-            if command[-1] == "\n":
-                lines.append("")
             output = ""
             index = 0
-            for line in lines:
+            for line in self._get_lines(command):
                 self.child.sendline(line)
                 index = self.expect_prompt(timeout=timeout)
                 output += self.child.before
@@ -3289,22 +4348,45 @@ if True:  # pylint: disable=using-constant-test
             Returns:
                 (strip/cleaned \r) output
             """
-            output = self.run_command(cmd, timeout)
-            output = output.replace("\r\n", "\n")
-            if self.echo:
-                # remove the command
-                idx = output.find(cmd)
-                if idx == -1:
-                    logging.warning(
-                        "Didn't find command ('%s') in expected output ('%s')",
-                        cmd,
-                        output,
-                    )
-                else:
-                    # Remove up to and including the command from the output stream
-                    output = output[idx + len(cmd) :]
+            return self._get_output(self.run_command(cmd, timeout), cmd)
+
+        def _read_framed(self, frame, timeout=-1, last=True):
+            """Read the output and status of a command sent by `_send_framed`.
 
-            return output.replace("\r", "").strip()
+            Args:
+                frame: the value returned by `_send_framed`.
+                timeout: pexpect timeout value.
+                last: True if no other frames have been sent after this one.
+            """
+            self.child.expect(frame.begin_re, timeout=timeout)
+            self.child.expect(self.prompt, timeout=timeout)
+            index = self.child.expect([frame.end_re, self.prompt], timeout=timeout)
+            result = self._get_framed_result(frame, index)
+            if index == 0:
+                # Consume the prompt printed after the block.
+                self.child.expect(self.prompt, timeout=timeout)
+            elif last:
+                # Resync with the shell after the parse error.
+                self.child.send(frame.sync_text)
+                self.child.expect(frame.sync_re, timeout=timeout)
+                self.child.expect(self.prompt, timeout=timeout)
+            return result
+
+        def cmds_status(self, cmds, timeout=-1):
+            r"""Execute several shell commands, sending all of them before reading.
+
+            Without `framed` the commands are run one after another.
+
+            Returns:
+                list of status and (strip/cleaned \r) output for each command.
+            """
+            if not self.framed:
+                return [self.cmd_status(cmd, timeout) for cmd in cmds]
+            frames = [self._send_framed(cmd, len(cmds) > 1) for cmd in cmds]
+            return [
+                self._read_framed(x, timeout, i == len(frames) - 1)
+                for i, x in enumerate(frames)
+            ]
 
         def cmd_status(self, cmd, timeout=-1):
             r"""Execute a shell command.
@@ -3312,40 +4394,14 @@ if True:  # pylint: disable=using-constant-test
             Returns:
                 status and (strip/cleaned \r) output
             """
+            if self.framed:
+                return self._read_framed(self._send_framed(cmd), timeout)
+
             # Run the command getting the output
             output = self.cmd_nostatus(cmd, timeout)
 
             # Now get the status
-            scmd = "echo $?"
-            rcstr = self.run_command(scmd)
-            rcstr = rcstr.replace("\r\n", "\n")
-            if self.echo:
-                # remove the command
-                idx = rcstr.find(scmd)
-                if idx == -1:
-                    if self.echo:
-                        logging.warning(
-                            "Didn't find status ('%s') in expected output ('%s')",
-                            scmd,
-                            rcstr,
-                        )
-                    try:
-                        rc = int(rcstr)
-                    except Exception:
-                        rc = 255
-                else:
-                    rcstr = rcstr[idx + len(scmd) :].strip()
-            try:
-                rc = int(rcstr)
-            except ValueError as error:
-                logging.error(
-                    "%s: error with expected status output: %s: %s",
-                    self,
-                    error,
-                    rcstr,
-                    exc_info=True,
-                )
-                rc = 255
+            rc = self._get_status(self.cmd_nostatus("echo $?"))
             return rc, output
 
         def cmd_raises(self, cmd, timeout=-1):
@@ -3363,11 +4419,143 @@ if True:  # pylint: disable=using-constant-test
             return output
 
 
+class AsyncShellWrapper(ShellWrapperBase):
+    """An asyncio Read-Execute-Print-Loop (REPL) interface.
+
+    This is the asyncio counterpart of `ShellWrapper` using an `AsyncSpawn`, waiting
+    for output never blocks the event loop. Create using
+    `Commander.async_shell_spawn`.
+    """
+
+    async def init(self, extra_init_cmd=None):
+        """Send `extra_init_cmd` commands and wait for the prompt."""
+        if isinstance(extra_init_cmd, str):
+            extra_init_cmd = [extra_init_cmd]
+        for ecmd in extra_init_cmd if extra_init_cmd else []:
+            await self.expect_prompt()
+            self.child.sendline(ecmd)
+        await self.expect_prompt()
+        return self
+
+    async def expect_prompt(self, timeout=-1):
+        return await self.child.expect(self.expects, timeout=timeout)
+
+    async def run_command(self, command, timeout=-1):
+        """Feed each line of `command` to the shell, see `ShellWrapper.run_command`."""
+        output = ""
+        index = 0
+        for line in self._get_lines(command):
+            self.child.sendline(line)
+            index = await self.expect_prompt(timeout=timeout)
+            output += self.child.before
+
+        if index:
+            self.child.send("\x03")
+            await self.expect_prompt(timeout=30 if self.child.timeout is None else -1)
+            raise ValueError("Continuation prompt found at end of commands")
+
+        if self.escape:
+            output = self.escape.sub("", output)
+
+        return output
+
+    async def cmd_nostatus(self, cmd, timeout=-1):
+        r"""Execute a shell command.
+
+        Returns:
+            (strip/cleaned \r) output
+        """
+        return self._get_output(await self.run_command(cmd, timeout), cmd)
+
+    async def _read_framed(self, frame, timeout=-1, last=True):
+        """Read the output and status of a command, see `ShellWrapper._read_framed`."""
+        await self.child.expect(frame.begin_re, timeout=timeout)
+        await self.child.expect(self.prompt, timeout=timeout)
+        index = await self.child.expect([frame.end_re, self.prompt], timeout=timeout)
+        result = self._get_framed_result(frame, index)
+        if index == 0:
+            await self.child.expect(self.prompt, timeout=timeout)
+        elif last:
+            self.child.send(frame.sync_text)
+            await self.child.expect(frame.sync_re, timeout=timeout)
+            await self.child.expect(self.prompt, timeout=timeout)
+        return result
+
+    async def cmds_status(self, cmds, timeout=-1):
+        r"""Execute several shell commands, sending all of them before reading.
+
+        Returns:
+            list of status and (strip/cleaned \r) output for each command.
+        """
+        if not self.framed:
+            return [await self.cmd_status(cmd, timeout) for cmd in cmds]
+        frames = [self._send_framed(cmd, len(cmds) > 1) for cmd in cmds]
+        return [
+            await self._read_framed(x, timeout, i == len(frames) - 1)
+            for i, x in enumerate(frames)
+        ]
+
+    async def cmd_status(self, cmd, timeout=-1):
+        r"""Execute a shell command.
+
+        Returns:
+            status and (strip/cleaned \r) output
+        """
+        if self.framed:
+            return await self._read_framed(self._send_framed(cmd), timeout)
+        output = await self.cmd_nostatus(cmd, timeout)
+        rc = self._get_status(await self.cmd_nostatus("echo $?"))
+        return rc, output
+
+    async def cmd_raises(self, cmd, timeout=-1):
+        r"""Execute a shell command.
+
+        Returns:
+            (strip/cleaned \r) ouptut
+
+        Raises:
+           CalledProcessError: on non-zero exit status
+        """
+        rc, output = await self.cmd_status(cmd, timeout)
+        if rc:
+            raise CalledProcessError(rc, cmd, output)
+        return output
+
+    async def close(self):
+        await self.child.close()
+
+
 # ---------------------------
 # Root level utility function
 # ---------------------------
 
 
+def get_bourne_shell_init():
+    """Get the prompts and commands used to setup a bourne shell REPL.
+
+    Returns:
+        The PS1 and PS2 prompt regexes, the command to set them and a list of
+        other commands to run.
+    """
+    ps1 = PEXPECT_PROMPT
+    ps2 = PEXPECT_CONTINUATION_PROMPT
+
+    # Avoid problems when =/usr/bin/env= prints the values
+    ps1p = ps1[:5] + "${UNSET_V}" + ps1[5:]
+    ps2p = ps2[:5] + "${UNSET_V}" + ps2[5:]
+
+    extra = [
+        "TERM=dumb",
+        "set +o emacs",
+        "set +o vi",
+        "unset HISTFILE",
+        "PAGER=cat",
+        "export PAGER",
+    ]
+    pchg = "PS1='{0}' PS2='{1}' PROMPT_COMMAND=''\n".format(ps1p, ps2p)
+    return re.escape(ps1), re.escape(ps2), pchg, extra
+
+
 def get_exec_path(binary):
     return commander.get_exec_path(binary)
 
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""Track munet processes using a cgroup v2 subtree.
+
+A cgroup is created for each topology (under the cgroup munet is running in) and,
+optionally, a child cgroup for each node. Long-lived processes (namespaces, helpers,
+node commands and VMs) are placed in the cgroup when they are started so all their
+descendants are tracked as well. This allows all the
+processes of a topology to be found using `cgroup.procs` and killed atomically using
+`cgroup.kill`, and gives per-node resource limits and CPU, memory and I/O accounting.
+"""
+
+import contextlib
+import errno
+import functools
+import itertools
+import logging
+import os
+import re
+import signal
+import time
+
+from pathlib import Path
+
+CGROUP_FILE = "cgroup"
+CONTROLLERS = ("cpu", "cpuset", "io", "memory", "pids")
+CPU_MAX_PERIOD = 100000
+TOPOLOGY_NAME_RE = re.compile(r"munet-\d+-\d+")
+
+_topology_count = itertools.count(1)
+_our_cgroup_path = None
+
+
+@functools.lru_cache(maxsize=None)
+def get_cgroup2_root():
+    """Get the mount point of the cgroup v2 hierarchy, or None if not mounted."""
+    try:
+        with open("/proc/self/mounts", encoding="ascii") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[2] == "cgroup2":
+                    return Path(fields[1])
+    except OSError:
+        pass
+    return None
+
+
+def get_pid_cgroup(pid="self", proc_path="/proc"):
+    """Get the cgroup v2 path of `pid` relative to the cgroup v2 root."""
+    try:
+        with open(f"{proc_path}/{pid}/cgroup", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return None
+
+
+def get_our_cgroup_path():
+    """Get the absolute path of the cgroup munet is running in, or None.
+
+    The value is cached, as after an inline unshare of the PID namespace `/proc` no
+    longer has an entry for our own process.
+    """
+    global _our_cgroup_path  # pylint: disable=global-statement
+
+    if _our_cgroup_path is None:
+        root = get_cgroup2_root()
+        ours = get_pid_cgroup()
+        if root is not None and ours is not None:
+            _our_cgroup_path = root.joinpath(ours.lstrip("/"))
+    return _our_cgroup_path
+
+
+def get_delegatable_controllers(pids=(), controllers=CONTROLLERS):
+    """Get which of `controllers` `delegate_controllers` can give topology cgroups.
+
+    Args:
+        pids: munet's other processes which may be moved along with it.
+        controllers: the controllers wanted.
+    """
+    path = get_our_cgroup_path()
+    if path is None:
+        return []
+    cg = CGroup(path)
+    available = [c for c in controllers if c in cg.get_controllers()]
+    enabled = cg.get_controllers(subtree=True)
+    if all(c in enabled for c in available) or path == get_cgroup2_root():
+        return available
+    # The controllers can only be enabled once no other processes are left.
+    if set(cg.get_pids(recursive=False)) - {os.getpid(), *pids}:
+        return [c for c in available if c in enabled]
+    return available
+
+
+def delegate_controllers(pids=(), controllers=CONTROLLERS):
+    """Enable `controllers` in munet's own cgroup for the topology cgroups.
+
+    A cgroup v2 cgroup (other than the root) can only enable controllers for its
+    children when it has no processes of its own. So if munet is the only process
+    in its cgroup, it (and `pids`) are first moved into the leaf cgroup
+    `munet-main-PID`.
+
+    Args:
+        pids: munet's other processes (e.g., namespace processes) to move as well.
+        controllers: the controllers wanted.
+
+    Returns:
+        The controllers which are enabled.
+    """
+    wanted = get_delegatable_controllers(pids, controllers)
+    if not wanted:
+        return []
+    cg = CGroup(get_our_cgroup_path())
+    if missing := [c for c in wanted if c not in cg.get_controllers(subtree=True)]:
+        if cg.path != get_cgroup2_root():
+            # Remove the leaves of previous runs, they are empty once they exit.
+            for leaf in cg.path.glob("munet-main-*"):
+                if leaf.name != f"munet-main-{os.getpid()}":
+                    with contextlib.suppress(OSError):
+                        leaf.rmdir()
+            leaf = cg.child(f"munet-main-{os.getpid()}")
+            for pid in [os.getpid(), *pids]:
+                leaf.add_pid(pid)
+        cg.enable_controllers(missing)
+    return [c for c in wanted if c in cg.get_controllers(subtree=True)]
+
+
+def get_cpu_max(value):
+    """Convert a `cpu-max` resource value to a cgroup `cpu.max` value.
+
+    Args:
+        value: number of CPUs (e.g., 0.5) or a `cpu.max` string ("QUOTA PERIOD").
+    """
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+    return f"{int(value * CPU_MAX_PERIOD)} {CPU_MAX_PERIOD}"
+
+
+class CGroup:
+    """A cgroup v2 directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def __str__(self):
+        return f"CGroup({self.path})"
+
+    @classmethod
+    def create_topology(cls, name=None):
+        """Create a new cgroup for a topology under munet's own cgroup.
+
+        Returns:
+            The new CGroup, or None if cgroup v2 is not available to us.
+        """
+        parent = get_our_cgroup_path()
+        if parent is None:
+            logging.debug("cgroup v2 not available")
+            return None
+        if name is None:
+            name = f"munet-{os.getpid()}-{next(_topology_count)}"
+        try:
+            return cls(parent.joinpath(name)).create()
+        except OSError as error:
+            logging.debug("unable to create topology cgroup: %s", error)
+            return None
+
+    def create(self):
+        self.path.mkdir(exist_ok=True)
+        return self
+
+    def child(self, name):
+        """Create (if needed) and return the child cgroup `name`."""
+        return CGroup(self.path.joinpath(name)).create()
+
+    @classmethod
+    def from_pid(cls, pid, proc_path="/proc"):
+        """Get the CGroup the process `pid` is in, or None."""
+        root = get_cgroup2_root()
+        path = get_pid_cgroup(pid, proc_path)
+        if root is None or path is None:
+            return None
+        cg = cls(root.joinpath(path.lstrip("/")))
+        return cg if cg.exists else None
+
+    @property
+    def exists(self):
+        return self.path.joinpath("cgroup.procs").exists()
+
+    def get_controllers(self, subtree=False):
+        """Get the controllers available to (or `subtree` enabled in) this cgroup."""
+        name = "cgroup.subtree_control" if subtree else "cgroup.controllers"
+        try:
+            return self.path.joinpath(name).read_text(encoding="ascii").split()
+        except OSError:
+            return []
+
+    def enable_controllers(self, controllers=CONTROLLERS):
+        """Enable the available `controllers` for the children of this cgroup.
+
+        Once enabled this cgroup can no longer directly contain processes.
+        """
+        available = self.get_controllers()
+        enabled = []
+        for c in controllers:
+            if c not in available:
+                continue
+            try:
+                self.path.joinpath("cgroup.subtree_control").write_text(
+                    f"+{c}", encoding="ascii"
+                )
+                enabled.append(c)
+            except OSError as error:
+                logging.debug("%s: unable to enable %s controller: %s", self, c, error)
+        return enabled
+
+    def add_pid(self, pid):
+        """Move the process `pid` into this cgroup, returns True on success."""
+        try:
+            self.path.joinpath("cgroup.procs").write_text(str(pid), encoding="ascii")
+            return True
+        except OSError as error:
+            logging.debug("%s: unable to add pid %s: %s", self, pid, error)
+            return False
+
+    def get_enter_cmd(self, sh="/bin/sh"):
+        """Get a command prefix which runs the rest of the command in this cgroup.
+
+        The prefix is a shell which moves itself into the cgroup and then execs the
+        command, so the command keeps the pid of the process started. A
+        `preexec_fn` isn't used as it keeps `subprocess` from using vfork and isn't
+        safe to use with threads.
+
+        Args:
+            sh: path of the shell to use.
+        """
+        procs = str(self.path.joinpath("cgroup.procs"))
+        return [sh, "-c", '{ echo 0 > "$0"; } 2>/dev/null; exec "$@"', procs]
+
+    def set_limits(self, resources):
+        """Set resource limits on this cgroup.
+
+        Args:
+            resources: the node `resources` config, with keys `cpu-weight`,
+                `cpu-max`, `cpuset`, `memory-max` and `pids-max`.
+
+        Raises:
+            ValueError: if a limit is unknown, its controller isn't available, or
+                the kernel rejects its value.
+        """
+        for key, value in resources.items():
+            if key == "cpu-weight":
+                name, value = "cpu.weight", str(value)
+            elif key == "cpu-max":
+                name, value = "cpu.max", get_cpu_max(value)
+            elif key == "cpuset":
+                name, value = "cpuset.cpus", str(value)
+            elif key == "memory-max":
+                name, value = "memory.max", str(value)
+            elif key == "pids-max":
+                name, value = "pids.max", str(value)
+            else:
+                raise ValueError(f"{self}: unknown resource {key}")
+            path = self.path.joinpath(name)
+            if not path.exists():
+                # Don't silently run without the limit.
+                controller = name.split(".", maxsplit=1)[0]
+                raise ValueError(
+                    f"{self}: can't limit {key}, the {controller} controller"
+                    " is not available (it can only be delegated to munet's"
+                    " topology cgroup when munet is the only process in its"
+                    " cgroup, e.g., run munet using `systemd-run --scope`)"
+                )
+            try:
+                path.write_text(value, encoding="ascii")
+            except OSError as error:
+                raise ValueError(f"{self}: bad {key} value {value}: {error}") from error
+
+    def walk(self):
+        """Yield this cgroup and all its descendants, deepest first."""
+        for dirpath, _, _ in sorted(os.walk(self.path), key=lambda x: -len(x[0])):
+            yield CGroup(dirpath)
+
+    def get_pids(self, recursive=True):
+        """Get the pids of the processes in this cgroup (and its descendants)."""
+        pids = []
+        for cg in self.walk() if recursive else [self]:
+            try:
+                text = cg.path.joinpath("cgroup.procs").read_text(encoding="ascii")
+            except OSError:
+                continue
+            pids.extend(int(x) for x in text.split())
+        return pids
+
+    @property
+    def populated(self):
+        try:
+            for line in (
+                self.path.joinpath("cgroup.events")
+                .read_text(encoding="ascii")
+                .splitlines()
+            ):
+                key, value = line.split()
+                if key == "populated":
+                    return value == "1"
+        except OSError:
+            pass
+        return bool(self.get_pids())
+
+    def kill(self):
+        """Kill all the processes in this cgroup and its descendants.
+
+        `cgroup.kill` is used if supported (linux >= 5.14) otherwise each process
+        is sent SIGKILL.
+        """
+        try:
+            self.path.joinpath("cgroup.kill").write_text("1", encoding="ascii")
+            return
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            if error.errno != errno.ENOENT:
+                logging.debug("%s: cgroup.kill failed: %s", self, error)
+        ourpid = os.getpid()
+        for pid in self.get_pids():
+            if pid == ourpid:
+                continue
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def wait_empty(self, timeout=5.0):
+        """Wait up to `timeout` seconds for this cgroup to have no processes."""
+        end = time.monotonic() + timeout
+        while self.populated:
+            if time.monotonic() >= end:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def remove(self):
+        """Remove this cgroup and its descendants, they must have no processes."""
+        for cg in self.walk():
+            try:
+                cg.path.rmdir()
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                logging.warning("%s: unable to remove: %s", cg, error)
+
+    def kill_and_remove(self, timeout=5.0):
+        """Kill all the processes in this cgroup tree and then remove it."""
+        if not self.exists:
+            return
+        if self.populated:
+            self.kill()
+            if not self.wait_empty(timeout):
+                logging.warning("%s: processes remain after kill", self)
+        self.remove()
+
+    def get_stats(self):
+        """Get CPU, memory and I/O usage of this cgroup (and its descendants).
+
+        Returns:
+            A dict with the (flat keyed) values from `cpu.stat`, `memory.current`,
+            `memory.peak` and `pids.current`, and the `io.stat` values summed over
+            all devices (e.g., `io.rbytes`) when available.
+        """
+        stats = {}
+        try:
+            for line in (
+                self.path.joinpath("cpu.stat").read_text(encoding="ascii").splitlines()
+            ):
+                key, value = line.split()
+                stats[key] = int(value)
+        except OSError:
+            pass
+        for name in ("memory.current", "memory.peak", "pids.current"):
+            try:
+                stats[name] = int(self.path.joinpath(name).read_text(encoding="ascii"))
+            except (OSError, ValueError):
+                pass
+        try:
+            text = self.path.joinpath("io.stat").read_text(encoding="ascii")
+        except OSError:
+            text = ""
+        for line in text.splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                key = f"io.{key}"
+                stats[key] = stats.get(key, 0) + int(value)
+        return stats
+
+
+def get_topology_cgroups(pid):
+    """Get the topology cgroups created by munet process `pid` under our cgroup."""
+    parent = get_our_cgroup_path()
+    if parent is None:
+        return []
+    return [CGroup(x) for x in sorted(parent.glob(f"munet-{pid}-*")) if x.is_dir()]
+
+
+def read_rundir_cgroup(rundir):
+    """Get the CGroup recorded in `rundir` by a previous run, or None.
+
+    As the cgroup is killed the recorded path is only used if it is a munet
+    topology cgroup (i.e., created by `CGroup.create_topology`).
+    """
+    try:
+        path = Path(rundir, CGROUP_FILE).read_text(encoding="ascii").strip()
+    except OSError:
+        return None
+    root = get_cgroup2_root()
+    if root is None:
+        return None
+    path = Path(os.path.realpath(path))
+    if root not in path.parents or not TOPOLOGY_NAME_RE.fullmatch(path.name):
+        logging.warning(
+            "Ignoring %s in %s, not a munet topology cgroup: %s",
+            CGROUP_FILE,
+            rundir,
+            path,
+        )
+        return None
+    cg = CGroup(path)
+    return cg if cg.exists else None
+
+
+def write_rundir_cgroup(rundir, cg):
+    """Record the CGroup `cg` for the topology using `rundir`."""
+    Path(rundir, CGROUP_FILE).write_text(f"{cg.path}\n", encoding="ascii")
+
+
+# Lookup our cgroup now, before any inline unshare of the PID namespace.
+get_our_cgroup_path()
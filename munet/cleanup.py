@@ -12,6 +12,9 @@ import logging
 import os
 import signal
 
+from .cgroup import get_topology_cgroups
+from .cgroup import read_rundir_cgroup
+
 
 def get_pids_with_env(has_var, has_val=None):
     result = {}
@@ -107,21 +110,38 @@ def _cleanup_pids(ours, rundir):
     _kill_piddict(pids_by_upid, signal.SIGKILL)
 
 
+def _cleanup_cgroup(cg):
+    pids = cg.get_pids()
+    if pids:
+        logging.info(
+            "Killing munet processes (%s) in %s", ", ".join(map(str, pids)), cg
+        )
+    cg.kill_and_remove()
+
+
 def cleanup_current():
     """Attempt to cleanup preview runs.
 
     Currently this only scans for old processes.
     """
+    for cg in get_topology_cgroups(os.getpid()):
+        _cleanup_cgroup(cg)
     _cleanup_pids(True, None)
 
 
 def cleanup_previous(rundir=None):
     """Attempt to cleanup preview runs.
 
-    Currently this only scans for old processes.
+    If the run using `rundir` tracked its processes using a cgroup then they are
+    killed using the cgroup, otherwise this scans for old processes.
     """
+    if rundir and (cg := read_rundir_cgroup(rundir)):
+        _cleanup_cgroup(cg)
+        return
     _cleanup_pids(False, rundir)
 
 
 def is_running_in_rundir(rundir):
+    if cg := read_rundir_cgroup(rundir):
+        return cg.populated
     return bool(get_pids_with_env("MUNET_RUNDIR", str(rundir)))
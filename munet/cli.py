@@ -295,6 +295,7 @@ Basic Commands:
   help  :: this help
   hosts :: list hosts
   quit  :: quit the cli
+  resources :: show node CPU, memory and I/O usage
 
   HOST can be a host or one of the following:
     - '*' for all hosts
@@ -516,6 +517,24 @@ class Completer:
         return completes[state]
 
 
+def make_resources_str(unet):
+    if not hasattr(unet, "resource_sampler"):
+        return "% Resource usage not supported\n"
+    usage = unet.resource_sampler.sample()["nodes"]
+    if not usage:
+        return "% No node cgroups (see topology cgroup config)\n"
+    header = ("NODE", "CPU-SECS", "MEM-MiB", "READ-MiB", "WRITE-MiB")
+    lines = ["{:20} {:>10} {:>10} {:>10} {:>10}".format(*header)]
+    for name, stats in sorted(usage.items()):
+        lines.append(
+            f"{name:20} {stats.get('usage_usec', 0) / 1e6:10.2f}"
+            f" {stats.get('memory.current', 0) / 2**20:10.1f}"
+            f" {stats.get('io.rbytes', 0) / 2**20:10.1f}"
+            f" {stats.get('io.wbytes', 0) / 2**20:10.1f}"
+        )
+    return "\n".join(lines) + "\n"
+
+
 async def doline(
     unet, line, outf, background=False, notty=False
 ):  # pylint: disable=R0911
@@ -536,6 +555,9 @@ async def doline(
     if cmd in ("h", "hosts"):
         outf.write(f"% Hosts:\t{' '.join(sorted(unet.hosts.keys()))}\n")
         return True
+    if cmd == "resources":
+        outf.write(make_resources_str(unet))
+        return True
     if cmd == "cli":
         await remote_cli(
             unet,
@@ -12,6 +12,7 @@ import ctypes.util  # pylint: disable=C0415
 import errno
 import functools
 import os
+import struct
 
 libc = None
 
@@ -162,6 +163,89 @@ def unshare(flags):  # noqa: D402
         raise_oserror(ctypes.get_errno())
 
 
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+IN_ONESHOT = 0x80000000
+
+IN_CLOEXEC = os.O_CLOEXEC
+IN_NONBLOCK = os.O_NONBLOCK
+
+INOTIFY_EVENT_FMT = "iIII"
+INOTIFY_EVENT_SIZE = struct.calcsize(INOTIFY_EVENT_FMT)
+
+
+def inotify_init(flags=0):  # noqa: D402
+    """See inotify_init1(2) manpage."""
+    if not libc:
+        _load_libc()
+
+    fd = libc.inotify_init1(int(flags))
+    if fd == -1:
+        raise_oserror(ctypes.get_errno())
+    return fd
+
+
+def inotify_add_watch(fd, path, mask):  # noqa: D402
+    """See inotify_add_watch(2) manpage."""
+    if not libc:
+        _load_libc()
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+
+    wd = libc.inotify_add_watch(int(fd), os.fsencode(path), int(mask))
+    if wd == -1:
+        raise_oserror(ctypes.get_errno())
+    return wd
+
+
+def inotify_rm_watch(fd, wd):  # noqa: D402
+    """See inotify_rm_watch(2) manpage."""
+    if not libc:
+        _load_libc()
+
+    if libc.inotify_rm_watch(int(fd), int(wd)) == -1:
+        raise_oserror(ctypes.get_errno())
+
+
+def inotify_read(fd):
+    """Read the pending events from an inotify ``fd``.
+
+    Returns:
+        A list of (wd, mask, cookie, name) tuples, where ``name`` is bytes. If ``fd``
+        is non-blocking and there are no events an empty list is returned.
+    """
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return []
+    events = []
+    offset = 0
+    while offset + INOTIFY_EVENT_SIZE <= len(data):
+        wd, mask, cookie, nlen = struct.unpack_from(INOTIFY_EVENT_FMT, data, offset)
+        offset += INOTIFY_EVENT_SIZE
+        name = data[offset : offset + nlen].rstrip(b"\0")
+        offset += nlen
+        events.append((wd, mask, cookie, name))
+    return events
+
+
 CLONE_NEWTIME = 0x00000080
 CLONE_VM = 0x00000100
 CLONE_FS = 0x00000200
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""A persistent command executor for running commands inside a namespace.
+
+The executor is a small helper process which is started once inside a namespace
+(using the normal `nsenter` pre-command) and then runs commands on behalf of the
+munet process. This avoids the cost of a `nsenter` (and possibly `bash`) exec for
+every command run in the namespace.
+
+Requests are sent over a ``SOCK_SEQPACKET`` control socket as a JSON object along
+with one end of a new stream socketpair (passed using ``SCM_RIGHTS``). Any stdin
+data for the command is written to the stream socket, and the reply is read back
+from it. The reply is a 4 byte length followed by a JSON header, followed by the
+stdout and stderr data of the command. Using a new stream socket for each request
+allows requests to be run concurrently.
+
+This file is also run directly as the helper script so it must only use the
+python standard library.
+"""
+
+import argparse
+import asyncio
+import errno
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+
+MAX_REQUEST_SIZE = 1 << 20
+HDR_FMT = "!I"
+HDR_SIZE = struct.calcsize(HDR_FMT)
+
+
+class ExecutorError(Exception):
+    """An error communicating with the executor helper process."""
+
+
+class ExecResult:
+    """The result of a command run by the executor.
+
+    This object has ``args``, ``pid`` and ``returncode`` attributes so it can be
+    used in place of a ``subprocess.Popen`` object when logging results.
+    """
+
+    def __init__(self, args, pid, returncode):
+        self.args = args
+        self.pid = pid
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+# =============
+# Helper Server
+# =============
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return b"".join(chunks)
+        chunks.append(data)
+
+
+def _run_request(req, rsock):
+    args = req["args"]
+    pinput = None
+    try:
+        if req.get("stdin"):
+            pinput = _recv_all(rsock)
+        stderr = subprocess.STDOUT if req.get("stderr_to_stdout") else subprocess.PIPE
+        try:
+            p = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE if pinput is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env=req.get("env"),
+                cwd=req.get("cwd"),
+                start_new_session=bool(req.get("new_session")),
+            )
+        except OSError as error:
+            # Mimic the exit codes of a shell (and nsenter) on exec failure.
+            rc = 126 if error.errno == errno.EACCES else 127
+            e = f"muexec: failed to execute {args[0]}: {error.strerror}\n"
+            hdr = {"pid": 0, "rc": rc, "olen": 0, "elen": len(e.encode())}
+            _send_reply(rsock, hdr, b"", e.encode())
+            return
+
+        timed_out = False
+        try:
+            o, e = p.communicate(pinput, timeout=req.get("timeout"))
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            p.kill()
+            o, e = p.communicate()
+        o = o if o else b""
+        e = e if e else b""
+        hdr = {
+            "pid": p.pid,
+            "rc": p.returncode,
+            "olen": len(o),
+            "elen": len(e),
+            "timeout": timed_out,
+        }
+        _send_reply(rsock, hdr, o, e)
+    except OSError as error:
+        # Most likely the requester went away (e.g., it timed out).
+        logging.debug("error handling request %s: %s", args, error)
+    finally:
+        rsock.close()
+
+
+def _send_reply(rsock, hdr, o, e):
+    hdrb = json.dumps(hdr).encode("utf-8")
+    rsock.sendall(struct.pack(HDR_FMT, len(hdrb)) + hdrb + o + e)
+
+
+def serve(csock):
+    """Serve requests received on the control socket until it is closed."""
+    while True:
+        try:
+            msg, fds, _, _ = socket.recv_fds(csock, MAX_REQUEST_SIZE, 1)
+        except InterruptedError:
+            continue
+        if not msg:
+            logging.debug("control socket closed, exiting")
+            return
+        if not fds:
+            logging.warning("ignoring request without a reply socket")
+            continue
+        rsock = socket.socket(fileno=fds[0])
+        for fd in fds[1:]:
+            os.close(fd)
+        try:
+            req = json.loads(msg)
+        except ValueError as error:
+            logging.warning("ignoring bad request: %s", error)
+            rsock.close()
+            continue
+        t = threading.Thread(target=_run_request, args=(req, rsock), daemon=True)
+        t.start()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fd", type=int, required=True, help="control socket fd")
+    ap.add_argument("-v", dest="verbose", action="count", default=0, help="verbose")
+    args = ap.parse_args()
+
+    level = logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=level, format="muexec: %(levelname)s: %(message)s")
+
+    csock = socket.socket(fileno=args.fd)
+    try:
+        serve(csock)
+    finally:
+        csock.close()
+    return 0
+
+
+# =============
+# Client Object
+# =============
+
+
+class Executor:
+    """The munet side of a persistent command executor.
+
+    The owner is responsible for running the command returned by ``get_cmd()``
+    (with ``pass_fds=(executor.child_fd,)``) in the target namespace and then
+    passing the resulting process to ``started()``.
+    """
+
+    def __init__(self, name, logger=None):
+        """Create an executor.
+
+        Args:
+            name: name used in logging, normally the owning object.
+            logger: logger to use, if None the root logger is used.
+        """
+        self.name = name
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.p = None
+        self.csock, self.ssock = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+
+    def __str__(self):
+        return f"Executor({self.name})"
+
+    @property
+    def child_fd(self):
+        return self.ssock.fileno() if self.ssock else -1
+
+    def get_cmd(self, verbose=False):
+        """Get the command to run to start the helper process."""
+        cmd = [sys.executable, os.path.realpath(__file__), f"--fd={self.child_fd}"]
+        if verbose:
+            cmd.append("-v")
+        return cmd
+
+    def started(self, p):
+        """Record the helper process ``p`` which was started using ``get_cmd()``."""
+        self.p = p
+        if self.ssock:
+            self.ssock.close()
+            self.ssock = None
+
+    @property
+    def running(self):
+        return self.csock is not None and self.p is not None and self.p.poll() is None
+
+    def _submit(self, args, env, cwd, stdin, stderr_to_stdout, new_session, timeout):
+        if not self.running:
+            raise ExecutorError(f"{self}: not running")
+        req = {
+            "args": [str(x) for x in args],
+            "env": env,
+            "cwd": str(cwd) if cwd else None,
+            "stdin": stdin is not None,
+            "stderr_to_stdout": stderr_to_stdout,
+            "new_session": new_session,
+            "timeout": timeout,
+        }
+        rsock, rsock_child = socket.socketpair()
+        try:
+            msg = json.dumps(req).encode("utf-8")
+            socket.send_fds(self.csock, [msg], [rsock_child.fileno()])
+        except OSError as error:
+            rsock.close()
+            raise ExecutorError(f"{self}: error sending request: {error}") from error
+        finally:
+            rsock_child.close()
+        return rsock
+
+    @staticmethod
+    def _parse_reply(args, reply, timeout):
+        if len(reply) < HDR_SIZE:
+            raise ExecutorError(f"short reply running {args}")
+        (hlen,) = struct.unpack(HDR_FMT, reply[:HDR_SIZE])
+        hdr = json.loads(reply[HDR_SIZE : HDR_SIZE + hlen])
+        data = reply[HDR_SIZE + hlen :]
+        olen, elen = hdr["olen"], hdr["elen"]
+        if len(data) != olen + elen:
+            raise ExecutorError(f"truncated reply running {args}")
+        if hdr.get("timeout"):
+            raise subprocess.TimeoutExpired(args, timeout, data[:olen], data[olen:])
+        return ExecResult(args, hdr["pid"], hdr["rc"]), data[:olen], data[olen:]
+
+    def run(
+        self,
+        args,
+        env=None,
+        cwd=None,
+        stdin=None,
+        stderr_to_stdout=False,
+        new_session=False,
+        timeout=None,
+    ):
+        """Run a command using the helper process.
+
+        Args:
+            args: list of command arguments.
+            env: environment for the command, or None to inherit the helper's.
+            cwd: working directory for the command, or None for the helper's.
+            stdin: bytes to send to the command on stdin, or None for /dev/null.
+            stderr_to_stdout: if True stderr is combined with stdout.
+            new_session: if True the command is run in a new session.
+            timeout: seconds to wait for the command before killing it.
+
+        Returns:
+            (result, stdout, stderr): where ``result`` is an ``ExecResult``
+            and ``stdout`` and ``stderr`` are bytes.
+
+        Raises:
+            ExecutorError: if communication with the helper fails.
+            subprocess.TimeoutExpired: if the command times out.
+        """
+        rsock = self._submit(
+            args, env, cwd, stdin, stderr_to_stdout, new_session, timeout
+        )
+        try:
+            if stdin:
+                rsock.sendall(stdin)
+            rsock.shutdown(socket.SHUT_WR)
+            reply = _recv_all(rsock)
+        except OSError as error:
+            raise ExecutorError(f"{self}: error running {args}: {error}") from error
+        finally:
+            rsock.close()
+        return self._parse_reply(args, reply, timeout)
+
+    async def async_run(
+        self,
+        args,
+        env=None,
+        cwd=None,
+        stdin=None,
+        stderr_to_stdout=False,
+        new_session=False,
+        timeout=None,
+    ):
+        """Run a command using the helper process, see ``run()``."""
+        loop = asyncio.get_running_loop()
+        rsock = self._submit(
+            args, env, cwd, stdin, stderr_to_stdout, new_session, timeout
+        )
+        try:
+            rsock.setblocking(False)
+            if stdin:
+                await loop.sock_sendall(rsock, stdin)
+            rsock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while data := await loop.sock_recv(rsock, 65536):
+                chunks.append(data)
+        except OSError as error:
+            raise ExecutorError(f"{self}: error running {args}: {error}") from error
+        finally:
+            rsock.close()
+        return self._parse_reply(args, b"".join(chunks), timeout)
+
+    def close(self):
+        """Close the control socket which causes the helper to exit."""
+        if self.ssock:
+            self.ssock.close()
+            self.ssock = None
+        if self.csock:
+            self.csock.close()
+            self.csock = None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
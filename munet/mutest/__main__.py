@@ -8,14 +8,21 @@
 """Command to execute mutests."""
 
 import asyncio
+import importlib
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import pickle
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 
 from argparse import ArgumentParser
 from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 from pathlib import Path
 from typing import Union
@@ -36,6 +43,7 @@ from munet.parser import get_config
 logging.addLevelName(logging.WARNING, "WARN")
 root_logger = logging.getLogger("")
 exec_formatter = logging.Formatter("%(asctime)s %(levelname)5s: %(name)s: %(message)s")
+logging_config = {}
 
 
 async def get_unet(
@@ -68,6 +76,7 @@ async def get_unet(
                 args=args,
                 pytestconfig=PytestConfig(args),
                 unshare_inline=unshare,
+                wait_links=False,
             )
         except Exception as error:
             logging.debug("unet build failed: %s", error, exc_info=True)
@@ -274,6 +283,31 @@ def testname_from_path(path: Path) -> str:
     return str(Path(path).stem).replace("/", ".")
 
 
+def add_exec_handler(path: Path) -> logging.Handler:
+    """Add an exec file handler for ``path`` to the root logger.
+
+    Args:
+       path: path to the exec log file, the parent directory is created if needed.
+
+    Returns:
+       logging.Handler: the new handler, which the caller should remove when done.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    exec_handler = logging.FileHandler(path, "w")
+    exec_handler.setFormatter(exec_formatter)
+    root_logger.addHandler(exec_handler)
+    return exec_handler
+
+
+def set_exec_formatter(config: dict):
+    """Grab the exec formatter from the logging config."""
+    if fconfig := config.get("formatters", {}).get("exec"):
+        global exec_formatter  # pylint: disable=W291,W0603
+        exec_formatter = logging.Formatter(
+            fconfig.get("format"), fconfig.get("datefmt")
+        )
+
+
 def print_header(reslog, unet):
     targets = dict(unet.hosts.items())
     nmax = max(len(x) for x in targets)
@@ -283,46 +317,55 @@ def print_header(reslog, unet):
     reslog.info("-" * 70)
 
 
-async def run_tests(args):
-    reslog = logging.getLogger("mutest.results")
+async def run_tests_reuse(
+    common, dirpath, config, test_files, args, tnum, results, printed_header
+):
+    """Run all the test scripts of a directory using a single shared topology.
 
-    common, tests, configs = await collect(args)
-    results = []
+    The topology is built once and reset using ``Munet.async_reset`` between test
+    scripts, rather than being deleted and rebuilt for each script.
+
+    Args:
+        common: common root of all tests.
+        dirpath: the directory containing the test scripts and config.
+        config: the config for the directory, it is not modified.
+        test_files: the test script paths.
+        args: argparse results.
+        tnum: the number of the last test case run.
+        results: list of results to append to.
+        printed_header: True if the results header has been printed.
+
+    Returns:
+        (tnum, printed_header): updated values.
+    """
     errlog = logging.getLogger("mutest.error")
     reslog = logging.getLogger("mutest.results")
-    printed_header = False
-    tnum = 0
-    start_time = time.time()
-    try:
-        for dirpath in tests:
-            if args.validate_only:
-                parser.validate_config(configs[dirpath], reslog, args)
-                continue
 
-            test_files = tests[dirpath]
-            for test in test_files:
+    # Build and delete output is logged to the shared topology's exec log.
+    rundir = args.rundir.joinpath("topology", dirpath)
+    topo_handler = add_exec_handler(rundir.joinpath("mutest-exec.log"))
+    pending = list(test_files)
+    try:
+        async for unet in get_unet(deepcopy(config), common, rundir, args):
+            if not printed_header:
+                print_header(reslog, unet)
+                printed_header = True
+
+            reset = False
+            while pending:
+                test = pending.pop(0)
                 tnum += 1
-                config = deepcopy(configs[dirpath])
                 test_name = testname_from_path(test)
-                rundir = args.rundir.joinpath(test_name)
-
-                # Add an test case exec file handler to the root logger and result
-                # logger
-                exec_path = rundir.joinpath("mutest-exec.log")
-                exec_path.parent.mkdir(parents=True, exist_ok=True)
-                exec_handler = logging.FileHandler(exec_path, "w")
-                exec_handler.setFormatter(exec_formatter)
-                root_logger.addHandler(exec_handler)
-
+                exec_handler = add_exec_handler(
+                    args.rundir.joinpath(test_name, "mutest-exec.log")
+                )
                 try:
-                    async for unet in get_unet(config, common, rundir, args):
-                        if not printed_header:
-                            print_header(reslog, unet)
-                            printed_header = True
-
-                        passed, failed, e = await execute_test(
-                            unet, test, args, tnum, exec_handler
-                        )
+                    if reset:
+                        await unet.async_reset()
+                    reset = True
+                    passed, failed, e = await execute_test(
+                        unet, test, args, tnum, exec_handler
+                    )
                 except KeyboardInterrupt as error:
                     errlog.warning("KeyboardInterrupt while running test %s", test_name)
                     passed, failed, e = 0, 0, error
@@ -336,10 +379,325 @@ async def run_tests(args):
                     )
                     passed, failed, e = 0, 0, error
                 finally:
-                    # Remove the test case exec file handler form the root logger.
                     root_logger.removeHandler(exec_handler)
                     results.append((test_name, passed, failed, e))
+    except KeyboardInterrupt:
+        raise
+    except Exception as error:
+        logging.error("Error with topology for %s: %s", dirpath, error, exc_info=True)
+        errlog.error("Error with topology for %s: %s", dirpath, error, exc_info=True)
+        # Any tests not yet run fail with the topology error.
+        for test in pending:
+            tnum += 1
+            results.append((testname_from_path(test), 0, 0, error))
+    finally:
+        root_logger.removeHandler(topo_handler)
+
+    return tnum, printed_header
+
+
+async def run_dir_tests(
+    common, dirpath, config, test_files, args, tnum, results, printed_header
+):
+    """Run all the test scripts of a directory.
+
+    Each test script is run on a newly built topology unless ``--reuse-topology``
+    was given.
+
+    Args:
+        common: common root of all tests.
+        dirpath: the directory containing the test scripts and config.
+        config: the config for the directory, it is not modified.
+        test_files: the test script paths.
+        args: argparse results.
+        tnum: the number of the last test case run.
+        results: list of results to append to.
+        printed_header: True if the results header has been printed.
+
+    Returns:
+        (tnum, printed_header): updated values.
+    """
+    if args.reuse_topology:
+        return await run_tests_reuse(
+            common, dirpath, config, test_files, args, tnum, results, printed_header
+        )
+
+    errlog = logging.getLogger("mutest.error")
+    reslog = logging.getLogger("mutest.results")
+
+    for test in test_files:
+        tnum += 1
+        tconfig = deepcopy(config)
+        test_name = testname_from_path(test)
+        rundir = args.rundir.joinpath(test_name)
+
+        # Add an test case exec file handler to the root logger and result
+        # logger
+        exec_handler = add_exec_handler(rundir.joinpath("mutest-exec.log"))
+
+        try:
+            async for unet in get_unet(tconfig, common, rundir, args):
+                if not printed_header:
+                    print_header(reslog, unet)
+                    printed_header = True
+
+                passed, failed, e = await execute_test(
+                    unet, test, args, tnum, exec_handler
+                )
+        except KeyboardInterrupt as error:
+            errlog.warning("KeyboardInterrupt while running test %s", test_name)
+            passed, failed, e = 0, 0, error
+            raise
+        except Exception as error:
+            logging.error("Error executing test %s: %s", test, error, exc_info=True)
+            errlog.error("Error executing test %s: %s", test, error, exc_info=True)
+            passed, failed, e = 0, 0, error
+        finally:
+            # Remove the test case exec file handler form the root logger.
+            root_logger.removeHandler(exec_handler)
+            results.append((test_name, passed, failed, e))
+
+    return tnum, printed_header
+
+
+# The index of the test directory being run by a ``-j`` worker process.
+worker_dir_index = None
+worker_queue = None
+
+
+def _tag_record(record):
+    record.mutest_dir = worker_dir_index
+    return True
+
+
+def worker_init(logconf: dict, queue):
+    """Initialize a ``-j`` worker process.
 
+    All log records are sent to the parent process over ``queue``, tagged with the
+    index of the test directory being run, to be collated by ``LogCollator``. The
+    logger levels from the logging config ``logconf`` are kept so that filtering
+    is the same as when running in the parent.
+
+    Args:
+        logconf: the logging config dictionary used by the parent.
+        queue: a multiprocessing queue for the log records.
+    """
+    global worker_queue  # pylint: disable=W0603
+    worker_queue = queue
+    set_exec_formatter(logconf)
+
+    qhandler = logging.handlers.QueueHandler(queue)
+    qhandler.addFilter(_tag_record)
+    lconfs = [("", logconf.get("root", {}))] + list(logconf.get("loggers", {}).items())
+    for name, lconf in lconfs:
+        logger = logging.getLogger(name)
+        if "level" in lconf:
+            logger.setLevel(lconf["level"])
+        if "propagate" in lconf:
+            logger.propagate = lconf["propagate"]
+        if lconf.get("handlers"):
+            logger.addHandler(qhandler)
+
+
+def _picklable_error(error):
+    if error is None:
+        return None
+    try:
+        return pickle.loads(pickle.dumps(error))
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def run_dir_worker(index, common, dirpath, config, test_files, args, tnum):
+    """Run the test scripts of a directory in a ``-j`` worker process.
+
+    Args:
+        index: the index of the directory in the run, used to collate the output.
+        common: common root of all tests.
+        dirpath: the directory containing the test scripts and config.
+        config: the config for the directory.
+        test_files: the test script paths.
+        args: argparse results.
+        tnum: the number of the last test case run before this directory.
+
+    Returns:
+        list: the results of the test scripts.
+    """
+    global worker_dir_index  # pylint: disable=W0603
+    worker_dir_index = index
+    results = []
+    try:
+        asyncio.run(
+            run_dir_tests(
+                common, dirpath, config, test_files, args, tnum, results, index > 0
+            )
+        )
+    finally:
+        worker_queue.put(("done", index))
+    return [(name, p, f, _picklable_error(e)) for name, p, f, e in results]
+
+
+class LogCollator:
+    """Log the records from ``-j`` workers in test directory order.
+
+    Records for the earliest unfinished directory are logged as they arrive,
+    records for later directories are held until all earlier directories finish.
+    Held records are spooled to a temporary file per directory rather than kept in
+    memory.
+    """
+
+    def __init__(self, queue, count):
+        self.queue = queue
+        self.count = count
+        self.next = 0
+        self.done = [False] * count
+        self.held = [None] * count
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _handle(self, record):
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+    def _hold(self, record):
+        index = record.mutest_dir
+        if self.held[index] is None:
+            self.held[index] = tempfile.TemporaryFile()
+        pickle.dump(record, self.held[index])
+
+    def _release(self, index):
+        spool = self.held[index]
+        if spool is None:
+            return
+        self.held[index] = None
+        with spool:
+            spool.seek(0)
+            while True:
+                try:
+                    record = pickle.load(spool)
+                except EOFError:
+                    break
+                self._handle(record)
+
+    def _run(self):
+        while self.next < self.count:
+            item = self.queue.get()
+            if isinstance(item, logging.LogRecord):
+                if item.mutest_dir == self.next:
+                    self._handle(item)
+                else:
+                    self._hold(item)
+                continue
+
+            _, index = item
+            self.done[index] = True
+            while self.next < self.count and self.done[self.next]:
+                self.next += 1
+                if self.next < self.count:
+                    self._release(self.next)
+
+    def finish(self, failed):
+        """Wait for all records to be logged.
+
+        Args:
+            failed: indexes of the directories whose worker failed and so may never
+                send their done marker.
+        """
+        for index in failed:
+            self.queue.put(("done", index))
+        self.thread.join()
+
+
+async def run_tests_parallel(common, tests, configs, args, results):
+    """Run the test directories concurrently in ``args.jobs`` worker processes.
+
+    Each worker process has its own class counters (e.g., ``L3NodeMixin.next_ord``)
+    and each topology is created in its own namespaces, so topologies run in
+    different workers do not collide. The output is collated in test directory
+    order.
+
+    Args:
+        common: common root of all tests.
+        tests: dictionary of lists of test files keyed on directory path.
+        configs: dictionary of configs keyed on directory path.
+        args: argparse results.
+        results: list of results to append to, in test directory order.
+    """
+    errlog = logging.getLogger("mutest.error")
+
+    # Workers must find the functions by module name, which is not possible using
+    # `__main__` when run as `python -m munet.mutest`.
+    module = importlib.import_module("munet.mutest.__main__")
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    collator = LogCollator(queue, len(tests))
+    pool = ProcessPoolExecutor(
+        max_workers=args.jobs,
+        mp_context=ctx,
+        initializer=module.worker_init,
+        initargs=(logging_config, queue),
+    )
+    futures = []
+    tnum = 0
+    for index, dirpath in enumerate(tests):
+        future = pool.submit(
+            module.run_dir_worker,
+            index,
+            common,
+            dirpath,
+            configs[dirpath],
+            tests[dirpath],
+            args,
+            tnum,
+        )
+        futures.append(asyncio.wrap_future(future))
+        tnum += len(tests[dirpath])
+
+    failed = []
+    try:
+        dir_results = await asyncio.gather(*futures, return_exceptions=True)
+        for index, (dirpath, dresults) in enumerate(zip(tests, dir_results)):
+            if not isinstance(dresults, BaseException):
+                results.extend(dresults)
+                continue
+            failed.append(index)
+            errlog.error("Error running tests in %s: %s", dirpath, dresults)
+            for test in tests[dirpath]:
+                results.append((testname_from_path(test), 0, 0, dresults))
+    finally:
+        pool.shutdown(cancel_futures=True)
+    collator.finish(failed)
+
+
+async def run_tests(args):
+    reslog = logging.getLogger("mutest.results")
+
+    common, tests, configs = await collect(args)
+    results = []
+    printed_header = False
+    tnum = 0
+    start_time = time.time()
+    try:
+        if args.jobs > 1 and not args.validate_only:
+            await run_tests_parallel(common, tests, configs, args, results)
+        else:
+            for dirpath in tests:
+                if args.validate_only:
+                    parser.validate_config(configs[dirpath], reslog, args)
+                    continue
+
+                tnum, printed_header = await run_dir_tests(
+                    common,
+                    dirpath,
+                    configs[dirpath],
+                    tests[dirpath],
+                    args,
+                    tnum,
+                    results,
+                    printed_header,
+                )
     except KeyboardInterrupt:
         pass
 
@@ -424,6 +782,14 @@ def main():
     rap.add_argument(
         "-d", "--rundir", help="runtime directory for tempfiles, logs, etc"
     )
+    rap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="run up to N test directories (topologies) concurrently",
+        metavar="N",
+    )
     add_testing_args(rap.add_argument)
 
     eap = ap.add_argument_group(title="Uncommon", description="uncommonly used options")
@@ -436,6 +802,11 @@ def main():
         help="print full summary headers from docstrings",
     )
     eap.add_argument("--log-config", help="logging config file (yaml, toml, json, ...)")
+    eap.add_argument(
+        "--reuse-topology",
+        action="store_true",
+        help="run the tests in a directory on one topology, reset between tests",
+    )
     eap.add_argument(
         "--validate-only",
         action="store_true",
@@ -456,13 +827,9 @@ def main():
     os.environ["MUNET_RUNDIR"] = str(rundir)
     subprocess.run(f"mkdir -p {rundir} && chmod 755 {rundir}", check=True, shell=True)
 
-    config = parser.setup_logging(args, config_base="logconf-mutest")
-    # Grab the exec formatter from the logging config
-    if fconfig := config.get("formatters", {}).get("exec"):
-        global exec_formatter  # pylint: disable=W291,W0603
-        exec_formatter = logging.Formatter(
-            fconfig.get("format"), fconfig.get("datefmt")
-        )
+    global logging_config  # pylint: disable=W0603
+    logging_config = parser.setup_logging(args, config_base="logconf-mutest")
+    set_exec_formatter(logging_config)
 
     if not hasattr(sys.stderr, "isatty") or not sys.stderr.isatty():
         mulog.do_color = False
@@ -10,16 +10,24 @@
 
 import asyncio
 import base64
+import contextlib
+import contextvars
 import errno
+import functools
 import getpass
 import glob
+import hashlib
 import ipaddress
+import json
 import logging
 import os
+import pwd
 import random
 import re
 import shlex
+import shutil
 import socket
+import stat
 import subprocess
 import time
 
@@ -33,8 +41,10 @@ except ImportError:
     pass
 
 from . import cli
+from . import ready
 from .base import BaseMunet
 from .base import Bridge
+from .base import CalledProcessError
 from .base import Commander
 from .base import InterfaceMixin
 from .base import LinuxNamespace
@@ -47,21 +57,49 @@ from .base import cmd_error
 from .base import commander
 from .base import fsafe_name
 from .base import get_exec_path_host
+from .base import our_pid
+from .cgroup import CGROUP_FILE
+from .cgroup import CGroup
+from .cgroup import delegate_controllers
+from .cgroup import get_cgroup2_root
+from .cgroup import get_cpu_max
+from .cgroup import write_rundir_cgroup
 from .config import config_subst
 from .config import config_to_dict_with_key
 from .config import find_matching_net_config
 from .config import find_with_kv
 from .config import merge_kind_config
+from .watchlog import FileNotifier
+from .watchlog import LogScanner
 from .watchlog import WatchLog
 
 AUTO_LOOPBACK_IPV4_BASE = ipaddress.ip_interface("10.255.0.0/32")
 AUTO_LOOPBACK_IPV6_BASE = ipaddress.ip_interface("fcfe::0/128")
+QEMU_SNAPSHOT_DIR = "/var/tmp/munet-qemu-snapshots"
+# Least recently used snapshots are removed to keep their total size under this.
+QEMU_SNAPSHOT_MAX_SIZE = 8 * 2**30
+# Snapshot directory names are keys, `save()` uses a temporary name while writing.
+QEMU_SNAPSHOT_NAME_RE = re.compile(r"([0-9a-f]{32})(\.tmp-(\d+))?")
+
+# Container image IDs found by `podman image inspect`, kept for the process lifetime.
+image_ids = {}
+# `podman run` errors for an image which isn't present (e.g., removed after caching).
+IMAGE_MISSING_RE = re.compile(r"image not known|no such image", re.IGNORECASE)
 
 
 class L3ContainerNotRunningError(MunetError):
     """Exception if no running container exists."""
 
 
+class QMPError(MunetError):
+    """Exception for an error reply to a QMP command."""
+
+    def __init__(self, command, error):
+        self.command = command
+        self.error = error
+        super().__init__(f"QMP {command}: {error.get('class')}: {error.get('desc')}")
+
+
 def get_loopback_ips(c, nid):
     ips = []
     if ip := c.get("ip"):
@@ -198,7 +236,7 @@ class L3Bridge(Bridge):
         if hasattr(self.ip_interface, "network"):
             self.ip_address = self.ip_interface.ip
             self.ip_network = self.ip_interface.network
-            self.cmd_raises(f"ip addr add {self.ip_interface} dev {name}")
+            self.addr_add(name, self.ip_interface)
         else:
             self.ip_address = None
             self.ip_network = self.ip_interface
@@ -212,7 +250,7 @@ class L3Bridge(Bridge):
             if hasattr(self.ip6_interface, "network"):
                 self.ip6_address = self.ip6_interface.ip
                 self.ip6_network = self.ip6_interface.network
-                self.cmd_raises(f"ip addr add {self.ip6_interface} dev {name}")
+                self.addr_add(name, self.ip6_interface)
             else:
                 self.ip6_address = None
                 self.ip6_network = self.ip6_interface
@@ -230,6 +268,12 @@ class L3Bridge(Bridge):
                 f"! -o {self.name} -j MASQUERADE"
             )
 
+    def addr_add(self, ifname, ifaddr):
+        if nl := self.get_netlink():
+            nl.addr_add(ifname, ifaddr)
+        else:
+            self.cmd_raises(f"ip addr add {ifaddr} dev {ifname}")
+
     def get_intf_addr(self, ifname, ipv6=False):
         # None is a valid interface, we have the same address for all interfaces
         # just make sure they aren't asking for something we don't have.
@@ -261,14 +305,25 @@ class NodeMixin:
         L3NodeMixin.next_ord = n + 1
         return n
 
-    def __init__(self, *args, config=None, **kwargs):
-        """Create a Node."""
+    def __init__(self, *args, config=None, ordinal=None, **kwargs):
+        """Create a Node.
+
+        Args:
+            config: the node's config.
+            ordinal: the node's id if not given in `config`, if None the next ordinal
+                is allocated.
+        """
         super().__init__(*args, **kwargs)
 
         self.config = config if config else {}
         config = self.config
 
-        self.id = int(config["id"]) if "id" in config else self._get_next_ord()
+        if "id" in config:
+            self.id = int(config["id"])
+        elif ordinal is not None:
+            self.id = ordinal
+        else:
+            self.id = self._get_next_ord()
 
         self.cmd_p = None
         self.container_id = None
@@ -280,6 +335,34 @@ class NodeMixin:
         commander.cmd_raises(f"rm -rf {self.rundir}")
         commander.cmd_raises(f"mkdir -p {self.rundir}")
 
+        # Track our namespace processes, new processes are placed when started.
+        if hasattr(self.unet, "get_node_cgroup"):
+            self.cgroup = self.unet.get_node_cgroup(self.name)
+        if self.cgroup:
+            p = getattr(self, "p", None)
+            pids = {p.pid if p else None, getattr(self, "pid", None)}
+            for pid in pids - {None, our_pid}:
+                self.cgroup.add_pid(pid)
+        self.set_resource_limits()
+
+    def set_resource_limits(self):
+        """Enforce the `resources` config using the node's cgroup."""
+        if not (resources := self.config.get("resources")):
+            return
+        if cgroup := self.get_resource_cgroup():
+            cgroup.set_limits(resources)
+        else:
+            self.logger.warning(
+                "%s: no node cgroup (topology cgroup: node), not limiting resources",
+                self,
+            )
+
+    def get_resource_cgroup(self):
+        """Get the cgroup holding only this node's processes, or None."""
+        if getattr(self.unet, "cgroup_mode", None) == "node":
+            return self.cgroup
+        return None
+
     def _shebang_prep(self, config_key, is_file=False):
         shell_cmd = "/bin/bash"  # default shell
         if not is_file:
@@ -465,6 +548,27 @@ class NodeMixin:
         """Run the configured ready commands for this node."""
         return not await self._async_shebang_cmd("ready-cmd", warn=False)
 
+    def has_ready(self) -> bool:
+        return self.has_ready_cmd() or bool(self.config.get("ready"))
+
+    async def async_wait_ready(self, marks=None):
+        """Wait for the `ready-cmd` and `ready` probes of this node to succeed.
+
+        Args:
+            marks: the `ready.ResetMarks` of this node if it is being reset.
+
+        Returns:
+            The number of seconds it took for the node to become ready.
+        """
+        return await ready.async_wait_ready(self, marks)
+
+    def has_reset_cmd(self) -> bool:
+        return bool(self.config.get("reset-cmd", "").strip())
+
+    async def async_reset_cmd(self):
+        """Run the configured reset commands for this node."""
+        return await self._async_shebang_cmd("reset-cmd")
+
     def cmd_completed(self, future):
         self.logger.debug("%s: cmd completed callback", self)
         try:
@@ -640,6 +744,144 @@ class HostnetNode(NodeMixin, LinuxNamespace):
         await super()._async_delete()
 
 
+class SSHControlMaster:
+    """A managed ssh ControlMaster shared by all of a node's ssh commands.
+
+    The master connection is started in the background on first use, commands
+    connect directly until it is up. It is re-started if it exits or its socket goes
+    away, and is checked with the master every `CHECK_INTERVAL` seconds. Commands
+    using it skip the TCP connect, key exchange and authentication, and connect
+    directly if the master has died since. If the master can't be started, starting
+    it is retried after `RETRY_DELAY` seconds.
+    """
+
+    CHECK_INTERVAL = 30
+    RETRY_DELAY = 5
+
+    def __init__(self, node, runner, ssh_cmd, dest, sudo_user=None):
+        """Create a SSHControlMaster.
+
+        Args:
+            node: the node the connection is for, used for logging and its rundir.
+            runner: the Commander to run ssh with (i.e., in the right namespace).
+            ssh_cmd: the ssh command and options (without the destination).
+            dest: the ssh destination (user@host).
+            sudo_user: if ssh is run as this user, the control socket directory is
+                given to them.
+        """
+        self.node = node
+        self.runner = runner
+        self.ssh_cmd = list(ssh_cmd)
+        self.dest = dest
+        self.logger = node.logger
+        self.proc = None
+        self.connected = False
+        self.checked_at = None
+        self.failed_at = None
+
+        sockdir = Path(node.rundir, "_ssh")
+        # Leave room for the temporary suffix ssh adds to the socket name.
+        if len(str(sockdir)) > 80:
+            sockdir = Path("/tmp", f"munet-ssh-{our_pid}-{fsafe_name(node.name)}")
+        sockdir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if sudo_user:
+            pw = pwd.getpwnam(sudo_user)
+            os.chown(sockdir, pw.pw_uid, pw.pw_gid)
+        self.sockdir = sockdir
+        self.path = sockdir.joinpath("ctl")
+
+    def __str__(self):
+        return f"SSHControlMaster({self.node.name})"
+
+    def _control_cmd(self, *args):
+        return [*self.ssh_cmd, f"-oControlPath={self.path}", *args]
+
+    def start(self):
+        """Start the master connection in the background."""
+        if self.path.exists():
+            self.path.unlink()
+        cmd = self._control_cmd("-MN", "-oConnectTimeout=5", self.dest)
+        # The master must not hold our output pipes open.
+        self.proc = self.runner.popen_nsonly(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.connected = False
+        self.logger.debug("%s: starting on %s", self, self.path)
+
+    def _kill(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+        self.connected = False
+
+    def check(self):
+        """Check with the master that it is running."""
+        if not self.proc or not self.path.exists():
+            return False
+        cmd = shlex.join(self._control_cmd("-Ocheck", self.dest))
+        rc, _, _ = self.runner.cmd_status_nsonly(cmd, warn=False)
+        return rc == 0
+
+    def get_args(self):
+        """Get the ssh options for a command to use the master, starting it if needed.
+
+        Returns:
+            The options, or an empty list if the master is not available (yet).
+        """
+        if self.proc and (rc := self.proc.poll()) is not None:
+            if self.connected:
+                self.logger.info("%s: master connection has gone away", self)
+            else:
+                self.logger.debug("%s: failed to start (rc %s)", self, rc)
+                self.failed_at = time.monotonic()
+            self.proc = None
+            self.connected = False
+        if not self.proc:
+            if self.failed_at and time.monotonic() - self.failed_at < self.RETRY_DELAY:
+                return []
+            self.start()
+            return []
+        if not self.path.exists():
+            if self.connected:
+                self.logger.info("%s: control socket has gone away, restarting", self)
+                self._kill()
+                self.start()
+            # Otherwise still connecting.
+            return []
+        # Checking runs ssh, so only do it once connected and then periodically.
+        now = time.monotonic()
+        if not self.connected or now - self.checked_at >= self.CHECK_INTERVAL:
+            if not self.check():
+                self.logger.info("%s: master check failed, restarting", self)
+                self._kill()
+                self.start()
+                return []
+            self.checked_at = now
+        if not self.connected:
+            self.logger.debug("%s: started on %s", self, self.path)
+            self.connected = True
+            self.failed_at = None
+        return ["-oControlMaster=no", f"-oControlPath={self.path}"]
+
+    async def async_stop(self):
+        """Stop the master connection and remove the control socket directory."""
+        if self.proc:
+            if self.path.exists():
+                cmd = shlex.join(self._control_cmd("-Oexit", self.dest))
+                await self.runner.async_cmd_status_nsonly(cmd, warn=False)
+            await self.runner.async_cleanup_proc(self.proc)
+            self.proc = None
+        self.connected = False
+        shutil.rmtree(self.sockdir, ignore_errors=True)
+
+
 class SSHRemote(NodeMixin, Commander):
     """SSHRemote a node representing an ssh connection to something."""
 
@@ -694,12 +936,14 @@ class SSHRemote(NodeMixin, Commander):
             self.__base_cmd.append(f"-i{self.idfile}")
         # Would be nice but has to be accepted by server config so not very useful.
         # self.__base_cmd.append("-oSendVar='TEST'")
+        self.__ssh_cmd = list(self.__base_cmd)
         self.__base_cmd_pty = list(self.__base_cmd)
         self.__base_cmd_pty.append("-t")
         server_str = f"{self.user}@{self.server}"
         self.__base_cmd.append(server_str)
         self.__base_cmd_pty.append(server_str)
         # self.set_pre_cmd(pre_cmd, pre_cmd_tty)
+        self.control_master = None
 
         self.logger.info("%s: created", self)
 
@@ -728,12 +972,21 @@ class SSHRemote(NodeMixin, Commander):
         if ns_only:
             return pre_cmd
 
+        if self.control_master is None:
+            self.control_master = SSHControlMaster(
+                self,
+                commander if self.use_host_network else self.unet,
+                self.__ssh_cmd,
+                f"{self.user}@{self.server}",
+                sudo_user=self.sudo_user if self.idfile else None,
+            )
+        ctl_args = self.control_master.get_args()
+
         # XXX grab the env from kwargs and add to podman exec
         # env = kwargs.get("env", {})
-        if use_pty:
-            pre_cmd = pre_cmd + self.__base_cmd_pty
-        else:
-            pre_cmd = pre_cmd + self.__base_cmd
+        base_cmd = self.__base_cmd_pty if use_pty else self.__base_cmd
+        n = len(self.__ssh_cmd)
+        pre_cmd = pre_cmd + base_cmd[:n] + ctl_args + base_cmd[n:]
         return shlex.join(pre_cmd) if use_str else list(pre_cmd)
 
     def _get_cmd_as_list(self, cmd):
@@ -752,6 +1005,20 @@ class SSHRemote(NodeMixin, Commander):
         """
         return [cmd] if isinstance(cmd, str) else cmd
 
+    def get_resource_cgroup(self):
+        # Our processes are only the local ssh clients.
+        return None
+
+    async def _async_delete(self):
+        self.logger.debug("%s: deleting", self)
+        if self.control_master:
+            try:
+                await self.control_master.async_stop()
+            except Exception as error:
+                self.logger.warning("%s: error stopping ssh master: %s", self, error)
+            self.control_master = None
+        await super()._async_delete()
+
 
 # Would maybe like to refactor this into L3 and Node
 class L3NodeMixin(NodeMixin):
@@ -777,20 +1044,22 @@ class L3NodeMixin(NodeMixin):
 
         # super().__init__(name=name, **kwargs)
 
-        self.mount_volumes()
+        with unet.profiler.span("mounts", self.name):
+            self.mount_volumes()
 
         # -----------------------
         # Setup node's networking
         # -----------------------
-        if not unet.ipv6_enable:
-            # Disable IPv6
-            self.cmd_raises("sysctl -w net.ipv6.conf.all.autoconf=0")
-            self.cmd_raises("sysctl -w net.ipv6.conf.all.disable_ipv6=1")
-            self.cmd_raises("sysctl -w net.ipv6.conf.all.forwarding=0")
-        else:
-            self.cmd_raises("sysctl -w net.ipv6.conf.all.autoconf=1")
-            self.cmd_raises("sysctl -w net.ipv6.conf.all.disable_ipv6=0")
-            self.cmd_raises("sysctl -w net.ipv6.conf.all.forwarding=1")
+        with unet.profiler.span("sysctls", self.name):
+            if not unet.ipv6_enable:
+                # Disable IPv6
+                self.cmd_raises("sysctl -w net.ipv6.conf.all.autoconf=0")
+                self.cmd_raises("sysctl -w net.ipv6.conf.all.disable_ipv6=1")
+                self.cmd_raises("sysctl -w net.ipv6.conf.all.forwarding=0")
+            else:
+                self.cmd_raises("sysctl -w net.ipv6.conf.all.autoconf=1")
+                self.cmd_raises("sysctl -w net.ipv6.conf.all.disable_ipv6=0")
+                self.cmd_raises("sysctl -w net.ipv6.conf.all.forwarding=1")
 
         assert self.id < 0x7FFF  # Limited to 10.254.0.0/16 block
         self.next_p2p_network = ipaddress.ip_network(
@@ -845,13 +1114,18 @@ ff02::2\tip6-allrouters
     def add_watch_log(self, path, watchfor_re=None):
         """Add a WatchLog to this nodes watched logs.
 
+        The log is scanned for ``watchfor_re`` by the topology's `LogScanner` which
+        reads each watched log once per change for all the regular expressions
+        being watched for.
+
         Args:
             path: If relative is relative to the nodes ``rundir``
             watchfor_re: Regular expression to watch the log for and raise an exception
                          if found.
 
         Return:
-            The watching task if request or None otherwise.
+            A future which raises `MatchFoundError` when awaited after a match is
+            found if requested or None otherwise.
         """
         path = Path(path)
         if not path.is_absolute():
@@ -859,8 +1133,18 @@ ff02::2\tip6-allrouters
 
         wl = WatchLog(path)
         self.watched_logs[wl.path] = wl
-        task = wl.raise_if_match_task(watchfor_re) if watchfor_re else None
-        return task
+        if not watchfor_re:
+            return None
+        return self.unet.log_scanner.watch_for(wl, watchfor_re)
+
+    def reset_watched_logs(self):
+        """Move the snapshot and user marks of all watched logs to the end of file.
+
+        Content logged before this call will not be matched by later waits.
+        """
+        for wl in self.watched_logs.values():
+            wl.snapshot()
+            wl.set_mark()
 
     async def console(
         self,
@@ -875,6 +1159,7 @@ ff02::2\tip6-allrouters
         will_echo=False,
         logfile_prefix="console",
         trace=True,
+        use_async=False,
         **kwargs,
     ):
         """Create a REPL (read-eval-print-loop) driving a console.
@@ -894,6 +1179,8 @@ ff02::2\tip6-allrouters
                 sh/ksh, set this value to true if running back
             logfile_prefix: prefix for 3 logfiles opened to track the console i/o
             trace: trace the send/expect sequence
+            use_async: return an `AsyncShellWrapper`, with awaitable methods which
+                don't block the event loop, instead of a `ShellWrapper`.
             **kwargs: kwargs passed on the _spawn.
         """
         lfname = os.path.join(self.rundir, f"{logfile_prefix}-log.txt")
@@ -916,7 +1203,8 @@ ff02::2\tip6-allrouters
         if password is not None:
             expects.append("assword:")
             sends.append(password + "\n")
-        repl = await self.shell_spawn(
+        spawnf = self.async_shell_spawn if use_async else self.shell_spawn
+        repl = await spawnf(
             concmd,
             prompt,
             expects=expects,
@@ -1000,13 +1288,15 @@ ff02::2\tip6-allrouters
             return
 
         ifname = cconf["name"]
-        for ip in (ipaddr, ip6addr):
-            if ip is None:
-                continue
-            self.set_intf_addr(ifname, ip)
-            ipcmd = "ip " if ip.version == 4 else "ip -6 "
-            self.logger.debug("%s: adding %s to unconnected intf %s", self, ip, ifname)
-            self.intf_ip_cmd(ifname, ipcmd + f"addr add {ip} dev {ifname}")
+        with self.ip_batch() as b:
+            for ip in (ipaddr, ip6addr):
+                if ip is None:
+                    continue
+                self.set_intf_addr(ifname, ip)
+                self.logger.debug(
+                    "%s: adding %s to unconnected intf %s", self, ip, ifname
+                )
+                self.intf_addr_add(ifname, ip, batch=b)
 
     def set_lan_addr(self, switch, cconf):
         if ip := cconf.get("ip"):
@@ -1040,27 +1330,31 @@ ff02::2\tip6-allrouters
             ip6addr = None
 
         dns_network = self.unet.topoconf.get("dns-network")
-        for ip in (ipaddr, ip6addr):
-            if not ip:
-                continue
-            ipcmd = "ip " if ip.version == 4 else "ip -6 "
-            if dns_network and dns_network == switch.name:
-                if ip.version == 4:
-                    self.mgmt_ip = ip.ip
-                else:
-                    self.mgmt_ip6 = ip.ip
-            ifname = cconf["name"]
-            self.set_intf_addr(ifname, ip)
-            self.logger.debug("%s: adding %s to lan intf %s", self, ip, ifname)
-            if not self.is_vm:
-                self.intf_ip_cmd(ifname, ipcmd + f"addr add {ip} dev {ifname}")
-                if hasattr(switch, "is_nat") and switch.is_nat:
-                    swaddr = (
-                        switch.ip_address if ip.version == 4 else switch.ip6_address
-                    )
-                    self.cmd_raises(ipcmd + f"route add default via {swaddr}")
+        # The address family is inferred from the addresses in the commands.
+        with self.ip_batch() as b:
+            for ip in (ipaddr, ip6addr):
+                if not ip:
+                    continue
+                if dns_network and dns_network == switch.name:
+                    if ip.version == 4:
+                        self.mgmt_ip = ip.ip
+                    else:
+                        self.mgmt_ip6 = ip.ip
+                ifname = cconf["name"]
+                self.set_intf_addr(ifname, ip)
+                self.logger.debug("%s: adding %s to lan intf %s", self, ip, ifname)
+                if not self.is_vm:
+                    self.intf_addr_add(ifname, ip, batch=b)
+                    if hasattr(switch, "is_nat") and switch.is_nat:
+                        swaddr = (
+                            switch.ip_address if ip.version == 4 else switch.ip6_address
+                        )
+                        if nl := self.get_netlink():
+                            nl.route_add(swaddr)
+                        else:
+                            b.add(f"route add default via {swaddr}")
 
-    def _set_p2p_addr(self, other, cconf, occonf, ipv6=False):
+    def _set_p2p_addr(self, other, cconf, occonf, ipv6=False, batch=None, obatch=None):
         ipkey = "ipv6" if ipv6 else "ip"
         ipaddr = ipaddress.ip_interface(cconf[ipkey]) if cconf.get(ipkey) else None
         oipaddr = ipaddress.ip_interface(occonf[ipkey]) if occonf.get(ipkey) else None
@@ -1094,12 +1388,11 @@ ff02::2\tip6-allrouters
             if "physical" not in cconf and not self.is_vm:
                 if set_peer:
                     self.logger.debug("%s: setting peer address %s", self, oipaddr)
-                    self.intf_ip_cmd(
-                        ifname,
-                        f"ip addr add {ipaddr.ip} peer {oipaddr.network} dev {ifname}",
+                    self.intf_addr_add(
+                        ifname, ipaddr, peer=oipaddr.network, batch=batch
                     )
                 else:
-                    self.intf_ip_cmd(ifname, f"ip addr add {ipaddr} dev {ifname}")
+                    self.intf_addr_add(ifname, ipaddr, batch=batch)
 
         if oipaddr:
             set_peer = False
@@ -1113,17 +1406,17 @@ ff02::2\tip6-allrouters
             if "physical" not in occonf and not other.is_vm:
                 if set_peer:
                     other.logger.debug("%s: setting peer address %s", other, ipaddr)
-                    other.intf_ip_cmd(
-                        oifname,
-                        f"ip addr add {oipaddr.ip} peer {ipaddr.network} dev {oifname}",
+                    other.intf_addr_add(
+                        oifname, oipaddr, peer=ipaddr.network, batch=obatch
                     )
                 else:
-                    other.intf_ip_cmd(oifname, f"ip addr add {oipaddr} dev {oifname}")
+                    other.intf_addr_add(oifname, oipaddr, batch=obatch)
 
     def set_p2p_addr(self, other, cconf, occonf):
-        self._set_p2p_addr(other, cconf, occonf, ipv6=False)
-        if self.unet.ipv6_enable:
-            self._set_p2p_addr(other, cconf, occonf, ipv6=True)
+        with self.ip_batch() as batch, other.ip_batch() as obatch:
+            self._set_p2p_addr(other, cconf, occonf, False, batch, obatch)
+            if self.unet.ipv6_enable:
+                self._set_p2p_addr(other, cconf, occonf, True, batch, obatch)
 
     async def add_host_intf(self, hname, lname, mtu=None):
         if hname in self.host_intfs:
@@ -1349,6 +1642,7 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
         """Create a Container Node."""
         self.cont_exec_paths = {}
         self.container_id = None
+        self.container_cgroup = None
         self.container_image = config["image"]
         self.extra_mounts = []
         assert self.container_image
@@ -1357,6 +1651,7 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
         self.cmd_pid = None
         self.__base_cmd = []
         self.__base_cmd_pty = []
+        self.__direct_cmd = None
 
         # don't we have a mutini or cat process?
         super().__init__(
@@ -1372,6 +1667,28 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
     def is_container(self):
         return True
 
+    def set_resource_limits(self):
+        # The limits are given to podman when the container is run.
+        pass
+
+    def get_resource_cgroup(self):
+        """Get the cgroup podman created for the container, or None."""
+        if self.container_cgroup or not self.container_id:
+            return self.container_cgroup
+        rc, o, _ = self.cmd_status_nsonly(
+            [
+                get_exec_path_host("podman"),
+                "inspect",
+                "--format={{.State.CgroupPath}}",
+                self.container_id,
+            ],
+            warn=False,
+        )
+        if not rc and (root := get_cgroup2_root()) and o.strip():
+            cgroup = CGroup(root.joinpath(o.strip().lstrip("/")))
+            self.container_cgroup = cgroup if cgroup.exists else None
+        return self.container_cgroup
+
     def get_exec_path(self, binary):
         """Return the full path to the binary executable inside the image.
 
@@ -1418,12 +1735,81 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
 
         # XXX grab the env from kwargs and add to podman exec
         # env = kwargs.get("env", {})
-        if use_pty:
+        if self.__direct_cmd:
+            pre_cmd = pre_cmd + self.__direct_cmd
+        elif use_pty:
             pre_cmd = pre_cmd + self.__base_cmd_pty
         else:
             pre_cmd = pre_cmd + self.__base_cmd
         return shlex.join(pre_cmd) if use_str else pre_cmd
 
+    def get_direct_exec_cmd(self):
+        """Get a command prefix which runs commands directly in the container.
+
+        The container's init pid and environment are looked up once using `podman
+        inspect`. The prefix then joins the container's cgroup and enters its
+        namespaces, root and working directory using `nsenter`, which is much
+        faster than `podman exec`.
+
+        Returns:
+            The command prefix list, or None if `podman exec` must be used.
+        """
+        rc, o, e = self.cmd_status_nsonly(
+            [
+                get_exec_path_host("podman"),
+                "inspect",
+                "--format=json",
+                self.container_id,
+            ],
+            warn=False,
+        )
+        if rc:
+            self.logger.warning("%s: can't inspect container: %s", self, e.strip())
+            return None
+        try:
+            info = json.loads(o)[0]
+            pid = int(info["State"]["Pid"])
+            config = info["Config"]
+        except (ValueError, LookupError, TypeError) as error:
+            self.logger.warning("%s: bad container inspect output: %s", self, error)
+            return None
+        user = config.get("User") or ""
+        if not pid or user.split(":")[0] not in ("", "root", "0"):
+            self.logger.info(
+                "%s: using podman exec (container pid %s user '%s')", self, pid, user
+            )
+            return None
+
+        env = [
+            x
+            for x in config.get("Env") or []
+            if not x.startswith(("MUNET_RUNDIR=", "MUNET_NODENAME="))
+        ]
+        env += [f"MUNET_RUNDIR={self.unet.rundir}", f"MUNET_NODENAME={self.name}"]
+        cmd = [
+            get_exec_path_host("env"),
+            "-i",
+            *env,
+            get_exec_path_host("nsenter"),
+            f"--target={pid}",
+            "--mount",
+            "--pid",
+            "--net",
+            "--uts",
+            "--ipc",
+            "--cgroup",
+            "--root",
+            "--wd",
+        ]
+
+        proc_path = self.unet.proc_path if self.unet else "/proc"
+        cgroup = CGroup.from_pid(pid, proc_path) or self.get_resource_cgroup()
+        if cgroup:
+            # Join the container's cgroup before entering its namespaces.
+            cmd = cgroup.get_enter_cmd(get_exec_path_host("sh")) + cmd
+        self.logger.debug("%s: using direct exec into container pid %s", self, pid)
+        return cmd
+
     def tmpfs_mount(self, inner):
         # eventually would be nice to support live mounting
         assert not self.container_id
@@ -1487,6 +1873,63 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
     def has_run_cmd(self) -> bool:
         return True
 
+    async def _async_start_container(self, cmds, conmon_pidfile):
+        """Start the container using `podman run` and wait for it to be running.
+
+        Returns:
+            The `Timeout` used waiting for the container.
+        """
+        conmon_pidfile.unlink(missing_ok=True)
+        stdout = open(os.path.join(self.rundir, "cmd.out"), "wb")
+        stderr = open(os.path.join(self.rundir, "cmd.err"), "wb")
+        # Watch for the conmon pidfile before starting so its creation isn't missed.
+        notifier = FileNotifier.create(conmon_pidfile)
+        # Using nsonly avoids using `podman exec` to execute the cmds.
+        self.cmd_p = await self.async_popen_nsonly(
+            cmds,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            start_new_session=True,  # keeps main tty signals away from podman
+        )
+
+        # If our process is actually the child of an nsenter fetch its pid.
+        if self.nsenter_fork:
+            self.cmd_pid = await self.get_proc_child_pid(self.cmd_p)
+
+        self.logger.debug(
+            "%s: async_popen => %s (%s)", self, self.cmd_p.pid, self.cmd_pid
+        )
+
+        # ---------------------------------------
+        # Now let's wait until container shows up
+        # ---------------------------------------
+        # Rather than polling `podman ps` wait for conmon to write its pidfile (using
+        # inotify when available) and then check the container is running.
+        timeout = Timeout(30)
+        backoff = ready.Backoff()
+        try:
+            while self.cmd_p.returncode is None and not timeout:
+                if conmon_pidfile.exists():
+                    o = await self.async_cmd_raises_nsonly(
+                        f"podman ps -q -f name={self.container_id}"
+                    )
+                    if o.strip():
+                        break
+                    await backoff.sleep()
+                elif notifier:
+                    # Wake periodically to notice podman exiting early.
+                    await notifier.async_wait(backoff.maximum)
+                else:
+                    await backoff.sleep()
+                elapsed = int(timeout.elapsed())
+                if elapsed > 3:
+                    self.logger.info("%s: run_cmd taking more than %ss", self, elapsed)
+        finally:
+            if notifier:
+                notifier.close()
+        return timeout
+
     async def run_cmd(self):
         """Run the configured commands for this node."""
         self.logger.debug("%s: starting container", self.name)
@@ -1496,10 +1939,13 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
 
         self.container_id = f"{self.name}-{os.getpid()}"
         proc_path = self.unet.proc_path if self.unet else "/proc"
+        # conmon writes this file as the container is started.
+        conmon_pidfile = Path(self.rundir, "conmon.pid")
         cmds = [
             get_exec_path_host("podman"),
             "run",
             f"--name={self.container_id}",
+            f"--conmon-pidfile={conmon_pidfile}",
             # f"--net=ns:/proc/{self.pid}/ns/net",
             f"--net=ns:{proc_path}/{self.pid}/ns/net",
             f"--hostname={self.name}",
@@ -1542,6 +1988,17 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
         # cmds += [f"--expose={x.split(':')[0]}" for x in self.config.get("ports", [])]
         cmds += [f"--publish={x}" for x in self.config.get("ports", [])]
 
+        cmds += get_podman_resource_args(self.config.get("resources", {}))
+
+        # Have podman create the container's cgroup in the topology's cgroup tree.
+        # The node's cgroup can't be used as the parent, it has processes.
+        tcg = getattr(self.unet, "cgroup_topology", None)
+        if tcg and self.unet.cgroup_mode == "node":
+            parent = tcg.child(f"{self.name}-podman")
+            cgpath = parent.path.relative_to(get_cgroup2_root())
+            cmds.insert(1, "--cgroup-manager=cgroupfs")
+            cmds.append(f"--cgroup-parent=/{cgpath}")
+
         # Add extra flags from user:
         if "podman" in self.config:
             for x in self.config["podman"].get("extra-args", []):
@@ -1556,7 +2013,7 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
                 shell_cmd = ""
 
         # Create shebang files, filled later on
-        for key in ("cleanup-cmd", "ready-cmd"):
+        for key in ("cleanup-cmd", "ready-cmd", "reset-cmd"):
             shebang_cmd = self.config.get(key, "").strip()
             if shell_cmd and shebang_cmd:
                 script_name = fsafe_name(key)
@@ -1615,43 +2072,20 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
             cmds = [x.replace("%RUNDIR%", str(self.rundir)) for x in cmds]
             cmds = [x.replace("%NAME%", str(self.name)) for x in cmds]
 
-        stdout = open(os.path.join(self.rundir, "cmd.out"), "wb")
-        stderr = open(os.path.join(self.rundir, "cmd.err"), "wb")
-        # Using nsonly avoids using `podman exec` to execute the cmds.
-        self.cmd_p = await self.async_popen_nsonly(
-            cmds,
-            stdin=subprocess.DEVNULL,
-            stdout=stdout,
-            stderr=stderr,
-            start_new_session=True,  # keeps main tty signals away from podman
-        )
-
-        # If our process is actually the child of an nsenter fetch its pid.
-        if self.nsenter_fork:
-            self.cmd_pid = await self.get_proc_child_pid(self.cmd_p)
-
-        self.logger.debug(
-            "%s: async_popen => %s (%s)", self, self.cmd_p.pid, self.cmd_pid
-        )
-
-        self.pytest_hook_run_cmd(stdout, stderr)
-
-        # ---------------------------------------
-        # Now let's wait until container shows up
-        # ---------------------------------------
-        timeout = Timeout(30)
-        while self.cmd_p.returncode is None and not timeout:
-            o = await self.async_cmd_raises_nsonly(
-                f"podman ps -q -f name={self.container_id}"
+        timeout = await self._async_start_container(cmds, conmon_pidfile)
+        errpath = Path(self.rundir, "cmd.err")
+        if self.cmd_p.returncode is not None and IMAGE_MISSING_RE.search(
+            errpath.read_text(encoding="utf-8", errors="replace")
+        ):
+            # The cached image ID is stale, check for (or pull) the image again.
+            self.logger.warning(
+                "%s: image %s not found, reloading", self, self.container_image
             )
-            if o.strip():
-                break
-            elapsed = int(timeout.elapsed())
-            if elapsed <= 3:
-                await asyncio.sleep(0.1)
-            else:
-                self.logger.info("%s: run_cmd taking more than %ss", self, elapsed)
-                await asyncio.sleep(1)
+            image_ids.pop(self.container_image, None)
+            await self.unet.load_images({self.container_image})
+            timeout = await self._async_start_container(cmds, conmon_pidfile)
+        self.pytest_hook_run_cmd(Path(self.rundir, "cmd.out"), errpath)
+
         if self.cmd_p.returncode is not None:
             # leave self.container_id set to cause exception on use
             self.logger.warning(
@@ -1683,6 +2117,9 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
         self.__base_cmd_pty.append("-t")  # add pty flags
         self.__base_cmd_pty.append(self.container_id)  # end pty list
         # self.set_pre_cmd(self.__base_cmd, self.__base_cmd_pty)  # set both pre_cmd
+        podman_config = self.config.get("podman", {})
+        if self.cmd_p.returncode is None and podman_config.get("direct-exec"):
+            self.__direct_cmd = self.get_direct_exec_cmd()
 
         self.logger.info("%s: started container", self.name)
 
@@ -1778,6 +2215,564 @@ class L3ContainerNode(L3NodeMixin, LinuxNamespace):
         await super()._async_delete()
 
 
+class QMPClient:
+    """A QEMU Machine Protocol (QMP) client using asyncio streams.
+
+    Commands are sent with `execute()`, which may be called concurrently, and the
+    replies are matched using the command `id`. Asynchronous events (e.g.,
+    SHUTDOWN, RESET) are delivered to the queues returned by `subscribe()`.
+    """
+
+    def __init__(self, sockpath, logger=None, logpath=None):
+        self.sockpath = sockpath
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.logpath = logpath
+        self.logfile = None
+        self.greeting = None
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        self.pending = {}
+        self.subscribers = []
+        self.next_id = 0
+
+    def __str__(self):
+        return f"QMPClient({self.sockpath})"
+
+    async def connect(self, timeout=30):
+        """Connect to QEMU, retrying until the socket is ready, and negotiate."""
+        timeo = Timeout(timeout)
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(
+                    self.sockpath, limit=2**20
+                )
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if timeo.is_expired():
+                    raise
+                await asyncio.sleep(0.1)
+        if self.logpath:
+            self.logfile = open(self.logpath, "a", encoding="utf-8")
+        await self._negotiate(timeo)
+        return self
+
+    async def _negotiate(self, timeo):
+        self.greeting = await asyncio.wait_for(self._read_msg(), timeo.remaining())
+        if self.greeting is None or "QMP" not in self.greeting:
+            raise MunetError(f"{self}: bad QMP greeting: {self.greeting}")
+        self.read_task = asyncio.create_task(self._read_msgs(), name=f"{self}-read")
+        await self.execute("qmp_capabilities", timeout=timeo.remaining())
+
+    async def _read_msg(self):
+        line = await self.reader.readline()
+        if not line:
+            return None
+        if self.logfile:
+            self.logfile.write(f"<- {line.decode('utf-8', 'replace')}")
+            self.logfile.flush()
+        return json.loads(line)
+
+    async def _read_msgs(self):
+        try:
+            while (msg := await self._read_msg()) is not None:
+                if "event" in msg:
+                    self.logger.debug("%s: event: %s", self, msg)
+                    for events, queue in self.subscribers:
+                        if not events or msg["event"] in events:
+                            queue.put_nowait(msg)
+                elif (future := self.pending.pop(msg.get("id"), None)) is not None:
+                    if not future.done():
+                        future.set_result(msg)
+                else:
+                    # e.g., the late reply to a timed out command
+                    self.logger.debug("%s: unexpected message: %s", self, msg)
+        except (OSError, ValueError) as error:
+            self.logger.debug("%s: read failed: %s", self, error)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(EOFError(f"{self}: connection closed"))
+            self.pending = {}
+            for _, queue in self.subscribers:
+                queue.put_nowait(None)
+
+    async def execute(self, command, arguments=None, timeout=None):
+        """Execute a QMP command returning the result.
+
+        Args:
+            command: the QMP command (e.g., "query-status").
+            arguments: dict of arguments for the command, if any.
+            timeout: seconds to wait for the reply, None to wait forever.
+
+        Returns:
+            The "return" value of the reply.
+
+        Raises:
+            QMPError: if QEMU replies with an error.
+            EOFError: if the connection is closed before the reply.
+        """
+        if self.read_task is not None and self.read_task.done():
+            raise EOFError(f"{self}: connection closed")
+        self.next_id += 1
+        msgid = self.next_id
+        msg = {"execute": command, "id": msgid}
+        if arguments:
+            msg["arguments"] = arguments
+        line = json.dumps(msg) + "\n"
+        if self.logfile:
+            self.logfile.write(f"-> {line}")
+        future = asyncio.get_running_loop().create_future()
+        self.pending[msgid] = future
+        try:
+            self.writer.write(line.encode("utf-8"))
+            await self.writer.drain()
+            reply = await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(msgid, None)
+        if "error" in reply:
+            raise QMPError(command, reply["error"])
+        return reply.get("return")
+
+    def subscribe(self, events=None):
+        """Get a queue which receives QMP events.
+
+        Args:
+            events: list of event names (e.g., ["SHUTDOWN", "RESET"]) to receive,
+                all events if None.
+
+        Returns:
+            An `asyncio.Queue` of event dicts, None is queued when the connection
+            closes.
+        """
+        queue = asyncio.Queue()
+        self.subscribers.append((set(events) if events else None, queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers = [x for x in self.subscribers if x[1] is not queue]
+
+    async def wait_event(self, event, timeout=None):
+        """Wait for the next `event` returning it."""
+        queue = self.subscribe([event])
+        try:
+            msg = await asyncio.wait_for(queue.get(), timeout)
+        finally:
+            self.unsubscribe(queue)
+        if msg is None:
+            raise EOFError(f"{self}: connection closed")
+        return msg
+
+    async def query_status(self):
+        return await self.execute("query-status")
+
+    async def query_kvm(self):
+        return await self.execute("query-kvm")
+
+    async def query_cpus_fast(self):
+        return await self.execute("query-cpus-fast")
+
+    async def human_monitor_command(self, cmd):
+        """Run the HMP command `cmd` returning its output."""
+        output = await self.execute("human-monitor-command", {"command-line": cmd})
+        return output.replace("\r\n", "\n").strip()
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            with contextlib.suppress(OSError):
+                await self.writer.wait_closed()
+            self.writer = None
+        if self.read_task:
+            await self.read_task
+            self.read_task = None
+        if self.logfile:
+            self.logfile.close()
+            self.logfile = None
+
+
+class GuestProcess:
+    """A process run to completion in a VM by `GuestAgentClient.exec()`."""
+
+    def __init__(self, pid, returncode, stdout, stderr):
+        self.pid = pid
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+    async def wait(self):
+        return self.returncode
+
+
+class GuestAgentClient(QMPClient):
+    """A qemu-guest-agent (QGA) client for running commands in a VM.
+
+    The agent runs in the guest and is reached over a virtio-serial port, so
+    commands are framed (JSON) with their exit status and output, can be issued
+    concurrently, and files can be copied in either direction without going
+    through a console.
+    """
+
+    CHUNK_SIZE = 48 * 1024
+
+    def __str__(self):
+        return f"GuestAgentClient({self.sockpath})"
+
+    async def _read_msg(self):
+        # Unlike QMP the channel isn't reset on connect, so skip the remains of
+        # replies to a previous connection (or other noise) rather than failing.
+        while True:
+            try:
+                msg = await super()._read_msg()
+            except ValueError as error:
+                self.logger.debug("%s: skipping bad message: %s", self, error)
+                continue
+            if msg is None or isinstance(msg, dict):
+                return msg
+            self.logger.debug("%s: skipping bad message: %s", self, msg)
+
+    async def _negotiate(self, timeo):
+        # There's no greeting, the agent may not be running yet and may have
+        # partial input from a previous connection, so sync until it replies.
+        self.read_task = asyncio.create_task(self._read_msgs(), name=f"{self}-read")
+        backoff = ready.Backoff()
+        while True:
+            self.writer.write(b"\xff")
+            syncid = random.randint(0, 2**31)
+            try:
+                timeout = min(backoff.delay + 1, max(timeo.remaining(), 0.1))
+                if await self.execute("guest-sync", {"id": syncid}, timeout) == syncid:
+                    return
+            except asyncio.TimeoutError:
+                if timeo.is_expired():
+                    raise
+            await backoff.sleep()
+
+    async def exec(self, cmd, stdin=None, timeout=None):
+        """Run `cmd` in the guest to completion.
+
+        Args:
+            cmd: shell command string, or list of the program and its arguments.
+            stdin: str or bytes to give the command as input.
+            timeout: seconds to wait for the command to complete.
+
+        Returns:
+            A `GuestProcess` with the `returncode` and the `stdout` and `stderr`
+            output as strings.
+        """
+        if isinstance(cmd, str):
+            cmd = ["/bin/sh", "-c", cmd]
+        args = {"path": cmd[0], "arg": list(cmd[1:]), "capture-output": True}
+        if stdin is not None:
+            if isinstance(stdin, str):
+                stdin = stdin.encode("utf-8")
+            args["input-data"] = base64.b64encode(stdin).decode("ascii")
+        pid = (await self.execute("guest-exec", args, timeout))["pid"]
+
+        timeo = Timeout(timeout) if timeout else None
+        backoff = ready.Backoff(maximum=0.5)
+        while True:
+            status = await self.execute("guest-exec-status", {"pid": pid}, timeout)
+            if status["exited"]:
+                break
+            if timeo and timeo.is_expired():
+                raise asyncio.TimeoutError(f"{self}: timeout running: {cmd}")
+            await backoff.sleep()
+
+        def output(key):
+            data = base64.b64decode(status.get(key, ""))
+            return data.decode("utf-8", "replace")
+
+        if "signal" in status:
+            rc = -status["signal"]
+        else:
+            rc = status.get("exitcode", 0)
+        return GuestProcess(pid, rc, output("out-data"), output("err-data"))
+
+    async def cmd_status(self, cmd, stdin=None, timeout=None):
+        """Run `cmd` in the guest returning the exit status, stdout and stderr."""
+        p = await self.exec(cmd, stdin, timeout)
+        return p.returncode, p.stdout, p.stderr
+
+    async def cmd_raises(self, cmd, stdin=None, timeout=None):
+        """Run `cmd` in the guest returning stdout, raise an exception on failure.
+
+        Raises:
+            CalledProcessError: if the command exits with a non-zero status.
+        """
+        p = await self.exec(cmd, stdin, timeout)
+        if p.returncode:
+            raise CalledProcessError(p.returncode, cmd, p.stdout, p.stderr)
+        return p.stdout
+
+    async def push(self, data, path, mode=None):
+        """Write `data` (str or bytes) to the file `path` in the guest."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        handle = await self.execute("guest-file-open", {"path": path, "mode": "wb"})
+        try:
+            for i in range(0, len(data), self.CHUNK_SIZE):
+                chunk = base64.b64encode(data[i : i + self.CHUNK_SIZE])
+                args = {"handle": handle, "buf-b64": chunk.decode("ascii")}
+                await self.execute("guest-file-write", args)
+        finally:
+            await self.execute("guest-file-close", {"handle": handle})
+        if mode is not None:
+            await self.cmd_raises(["chmod", f"{mode:o}", path])
+
+    async def pull(self, path):
+        """Read the file `path` from the guest returning the contents as bytes."""
+        handle = await self.execute("guest-file-open", {"path": path, "mode": "rb"})
+        data = []
+        try:
+            while True:
+                args = {"handle": handle, "count": self.CHUNK_SIZE}
+                reply = await self.execute("guest-file-read", args)
+                data.append(base64.b64decode(reply["buf-b64"]))
+                if reply["eof"]:
+                    break
+        finally:
+            await self.execute("guest-file-close", {"handle": handle})
+        return b"".join(data)
+
+
+class QemuSnapshot:
+    """A boot snapshot of a qemu VM.
+
+    The VM state is saved once the VM has booted, and restored on later launches
+    using the same qemu arguments, config and images instead of booting. The state
+    and disk overlay are kept in a directory named by a hash of those inputs.
+    """
+
+    def __init__(self, vm, path):
+        self.vm = vm
+        self.path = path
+        self.statepath = vm.rundir / "snapshot-state"
+        self.restored = False
+
+    def __str__(self):
+        return str(self.path)
+
+    @staticmethod
+    def get_dir(vm, args):
+        """Get the boot snapshot directory for launching `vm` with qemu `args`.
+
+        The directory name is a hash of the node name, the qemu args (with per-run
+        values normalized), the node's qemu config, the generated cloud-init data
+        and the identity of the qemu binary and the images used, so any change
+        results in a new snapshot.
+
+        Returns:
+            The `Path` of the directory, which may not exist yet, or None if a
+            snapshot can't be used.
+        """
+        qc = vm.qemu_config
+        if vm.diskpath and not vm.disk_created:
+            vm.logger.warning(
+                "%s: not using snapshot with persistent disk %s", vm, vm.diskpath
+            )
+            return None
+
+        def normalize(arg):
+            arg = arg.replace(str(vm.rundir), "%RUNDIR%")
+            arg = re.sub(r"\bifname=tap\d+", "ifname=tapN", arg)
+            return re.sub(r"\bfd=\d+", "fd=N", arg)
+
+        def file_id(path):
+            if path[0] != "/":
+                path = os.path.join(vm.unet.config_dirname, path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                return [path]
+            return [path, st.st_size, st.st_mtime_ns]
+
+        files = [file_id(args[0])]
+        keys = ("bios", "cloud-init-disk", "disk-template", "initrd", "iso", "kernel")
+        for key in keys:
+            if qc.get(key) and not re.match("(https|http|ftp|tftp):.*", qc[key]):
+                files.append(file_id(qc[key]))
+        # The generated cloud-init image differs every run (timestamps, volume
+        # serial) so use the data it is generated from.
+        cloud_init = {}
+        cidir = vm.rundir.joinpath("ci-data")
+        if cidir.is_dir():
+            for path in sorted(cidir.iterdir()):
+                data = path.read_bytes()
+                cloud_init[path.name] = hashlib.sha256(data).hexdigest()
+        keydata = {
+            "name": vm.name,
+            "args": [normalize(x) for x in args[1:]],
+            "config": qc,
+            "files": files,
+            "cloud-init": cloud_init,
+        }
+        keyjson = json.dumps(keydata, sort_keys=True, default=str)
+        key = hashlib.sha256(keyjson.encode("utf-8")).hexdigest()[:32]
+        snapdir = qc["snapshot"]
+        if not isinstance(snapdir, str):
+            snapdir = QEMU_SNAPSHOT_DIR
+        return Path(snapdir, key)
+
+    def exists(self):
+        return self.path.exists()
+
+    def setup_dir(self):
+        """Create the directory holding the snapshots, if it doesn't exist.
+
+        The VM state is loaded by qemu, so the directory must not be writable by
+        other users (e.g., the default is in the world writable /var/tmp).
+
+        Returns:
+            True if the directory is safe to use.
+        """
+        vm = self.vm
+        parent = self.path.parent
+        try:
+            parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            st = os.lstat(parent)
+        except OSError as error:
+            vm.logger.warning("%s: not using snapshots in %s: %s", vm, parent, error)
+            return False
+        if (
+            not stat.S_ISDIR(st.st_mode)
+            or st.st_uid != os.geteuid()
+            or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        ):
+            vm.logger.warning(
+                "%s: not using snapshots in %s, it must be a directory owned by uid %s"
+                " and not writable by others",
+                vm,
+                parent,
+                os.geteuid(),
+            )
+            return False
+        return True
+
+    def prepare_restore(self):
+        """Put the snapshot's VM state (and disk) in place before starting qemu."""
+        vm = self.vm
+        vm.logger.info("%s: restoring from snapshot %s", vm, self)
+        if vm.diskpath:
+            # Keep the new overlay in case the restore fails and the VM must boot.
+            os.replace(vm.diskpath, f"{vm.diskpath}.boot")
+            shutil.copyfile(self.path / "disk.qcow2", vm.diskpath)
+        # The state is read by qemu so must be in the node's run directory.
+        with contextlib.suppress(FileNotFoundError):
+            self.statepath.unlink()
+        try:
+            os.link(self.path / "state", self.statepath)
+        except OSError:
+            shutil.copyfile(self.path / "state", self.statepath)
+        # Mark the snapshot as recently used for `prune()`.
+        with contextlib.suppress(OSError):
+            os.utime(self.path)
+        self.restored = True
+
+    def abort_restore(self):
+        """Remove the (bad) snapshot and put back the disk for a normal boot."""
+        vm = self.vm
+        with contextlib.suppress(FileNotFoundError):
+            self.statepath.unlink()
+        if vm.diskpath:
+            os.replace(f"{vm.diskpath}.boot", vm.diskpath)
+        # Remove the bad snapshot so this launch creates a new one.
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.restored = False
+
+    async def _async_wait_migration(self):
+        backoff = ready.Backoff(maximum=0.25)
+        while True:
+            status = await self.vm.qmp.execute("query-migrate")
+            if status.get("status") in ("completed", "failed", "cancelled"):
+                return status
+            await backoff.sleep()
+
+    async def restore(self):
+        """Load the VM state from the snapshot into the waiting qemu.
+
+        Returns:
+            True if the VM is running from the snapshot state, False if the restore
+            failed, in which case qemu must be restarted to boot normally.
+        """
+        vm = self.vm
+        uri = f"exec:cat {shlex.quote(str(self.statepath))}"
+        try:
+            await vm.qmp.execute("migrate-incoming", {"uri": uri})
+            status = await self._async_wait_migration()
+            if status["status"] != "completed":
+                vm.logger.warning("%s: snapshot restore failed: %s", vm, status)
+                return False
+            # Qemu continues running the VM after the incoming migration completes.
+            backoff = ready.Backoff(maximum=0.25)
+            while (await vm.qmp.query_status())["status"] != "running":
+                await backoff.sleep()
+        except (MunetError, OSError, EOFError) as error:
+            vm.logger.warning("%s: snapshot restore failed: %s", vm, error)
+            return False
+        self.statepath.unlink()
+        if vm.diskpath:
+            os.unlink(f"{vm.diskpath}.boot")
+        vm.logger.info("%s: restored from snapshot %s", vm, self)
+        return True
+
+    async def save(self):
+        """Save the VM state (and disk) as a boot snapshot for later launches."""
+        vm = self.vm
+        tmpdir = Path(f"{self.path}.tmp-{os.getpid()}")
+        vm.logger.info("%s: saving snapshot %s", vm, self)
+        uri = f"exec:cat > {shlex.quote(str(self.statepath))}"
+        await vm.qmp.execute("migrate", {"uri": uri})
+        status = await self._async_wait_migration()
+        try:
+            if status["status"] != "completed":
+                vm.logger.warning("%s: saving snapshot failed: %s", vm, status)
+                return
+            # The VM is paused with its disk flushed, so the copy is consistent.
+            tmpdir.mkdir(parents=True, exist_ok=True)
+            shutil.move(self.statepath, tmpdir / "state")
+            if vm.diskpath:
+                shutil.copyfile(vm.diskpath, tmpdir / "disk.qcow2")
+            with contextlib.suppress(OSError):
+                # Fails if another munet saved the same snapshot first.
+                tmpdir.rename(self.path)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            with contextlib.suppress(FileNotFoundError):
+                self.statepath.unlink()
+            if status["status"] == "completed":
+                await vm.qmp.execute("cont")
+        if self.path.exists():
+            self.prune()
+
+    def prune(self, max_size=QEMU_SNAPSHOT_MAX_SIZE):
+        """Remove the least recently used snapshots over `max_size` bytes in total.
+
+        Temporary directories left by munet processes which no longer exist are
+        removed too. This snapshot is always kept.
+        """
+        snapshots = []
+        for path in self.path.parent.iterdir():
+            # Only ever remove our own snapshot directories.
+            m = QEMU_SNAPSHOT_NAME_RE.fullmatch(path.name)
+            if not m or not path.is_dir() or path == self.path:
+                continue
+            if pid := m.group(3):
+                if not os.path.exists(f"/proc/{pid}"):
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            with contextlib.suppress(OSError):
+                size = sum(x.stat().st_size for x in path.iterdir())
+                snapshots.append((path.stat().st_mtime, size, path))
+
+        total = sum(x.stat().st_size for x in self.path.iterdir())
+        for _, size, path in sorted(snapshots, reverse=True):
+            total += size
+            if total > max_size:
+                self.vm.logger.info("%s: removing old snapshot %s", self.vm, path)
+                shutil.rmtree(path, ignore_errors=True)
+
+
 class L3QemuVM(L3NodeMixin, LinuxNamespace):
     """An VM (qemu) based L3 node."""
 
@@ -1792,13 +2787,15 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
         self.cmdrepl = None
         self.conrepl = None
         self.is_kvm = False
-        self.monrepl = None
+        self.qmp = None
+        self.qga = None
         self.tapfds = {}
         self.cpu_thread_map = {}
 
         self.tapnames = {}
 
         self.use_ssh = False
+        self.control_master = None
         self.__base_cmd = []
         self.__base_cmd_pty = []
 
@@ -1822,6 +2819,8 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
             self.ssh_user = self.qemu_config.get("sshuser", "root")
 
         self.disk_created = False
+        self.diskpath = None
+        self.snapshot = None
 
     @property
     def is_vm(self):
@@ -1859,6 +2858,9 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
         self.__base_cmd.append("-oUserKnownHostsFile=/dev/null")
         # Would be nice but has to be accepted by server config so not very useful.
         # self.__base_cmd.append("-oSendVar='TEST'")
+        self.control_master = SSHControlMaster(
+            self, self.unet, self.__base_cmd, f"{self.ssh_user}@{mgmt_ip}"
+        )
         self.__base_cmd_pty = list(self.__base_cmd)
         self.__base_cmd_pty.append("-t")
 
@@ -1914,14 +2916,44 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
         #
         # XXX grab the env from kwargs and add to podman exec
         # env = kwargs.get("env", {})
-        if use_pty:
-            pre_cmd = pre_cmd + self.__base_cmd_pty
-        else:
-            pre_cmd = pre_cmd + self.__base_cmd
+        base_cmd = self.__base_cmd_pty if use_pty else self.__base_cmd
+        n = len(self.control_master.ssh_cmd)
+        ctl_args = self.control_master.get_args()
+        pre_cmd = pre_cmd + base_cmd[:n] + ctl_args + base_cmd[n:]
         return shlex.join(pre_cmd) if use_str else pre_cmd
 
-    async def moncmd(self):
-        """Uses internal REPL to send cmmand to qemu monitor and get reply."""
+    async def connect_guest_agent(self, timeout):
+        """Connect to the qemu-guest-agent in the VM, falling back to the console."""
+        self.qga = GuestAgentClient(
+            os.path.join(self.sockdir, "_qga"),
+            logger=self.logger,
+            logpath=os.path.join(self.rundir, "_qga-log.txt"),
+        )
+        try:
+            await self.qga.connect(timeout)
+        except (OSError, EOFError, asyncio.TimeoutError, MunetError) as error:
+            self.logger.warning(
+                "%s: no guest agent (%s), using console for commands", self, error
+            )
+            await self.qga.close()
+            self.qga = None
+
+    async def guest_cmd_raises(self, cmd):
+        """Run `cmd` in the VM using the guest agent if connected, else the console.
+
+        Returns:
+            The stdout of the command.
+
+        Raises:
+            CalledProcessError: if the command fails.
+        """
+        if self.qga:
+            return await self.qga.cmd_raises(cmd)
+        return self.conrepl.cmd_raises(cmd)
+
+    async def moncmd(self, cmd):
+        """Send the (HMP) command `cmd` to the qemu monitor and return the reply."""
+        return await self.qmp.human_monitor_command(cmd)
 
     def tmpfs_mount(self, inner):
         # eventually would be nice to support live mounting
@@ -2040,10 +3072,15 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
             commander.cmd_raises(f"chmod 755 {cmdpath}")
 
             # Now write a copy inside the VM
-            self.conrepl.cmd_status(
-                f"cat > /tmp/{cmd_node}.shebang << EOF\n" + cmd + "\nEOF"
-            )
-            self.conrepl.cmd_status(f"chmod 755 /tmp/{cmd_node}.shebang")
+            if self.qga:
+                await self.qga.push(cmd, f"/tmp/{cmd_node}.shebang", 0o755)
+            else:
+                self.conrepl.cmds_status(
+                    [
+                        f"cat > /tmp/{cmd_node}.shebang << EOF\n" + cmd + "\nEOF",
+                        f"chmod 755 /tmp/{cmd_node}.shebang",
+                    ]
+                )
             cmds = f"/tmp/{cmd_node}.shebang"
         else:
             cmd = cmd.replace("%CONFIGDIR%", str(self.unet.config_dirname))
@@ -2072,7 +3109,15 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
             async def wait(self):
                 return self.output
 
-        if self.cmdrepl:
+        if self.qga:
+            # Run to completion as with the consoles, but keep the exit status and
+            # separate output.
+            self.cmd_p = await self.qga.exec(cmds, timeout=120)
+            for ext in ("out", "err"):
+                path = os.path.join(self.rundir, f"{cmd_node}.{ext}")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(getattr(self.cmd_p, f"std{ext}"))
+        elif self.cmdrepl:
             # self.cmd_p = future_proc(
             #     # We need our own console here b/c this is async and not returning
             #     # immediately
@@ -2100,8 +3145,12 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
         else:
             await self._run_cmd("cmd")
 
+        if self.qga:
+            stdout = os.path.join(self.rundir, "cmd.out")
+            stderr = os.path.join(self.rundir, "cmd.err")
+            self.pytest_hook_run_cmd(stdout, stderr)
         # stdout and err both combined into logfile from the spawned repl
-        if self.cmdrepl:
+        elif self.cmdrepl:
             stdout = os.path.join(self.rundir, "_cmdcon-log.txt")
             self.pytest_hook_run_cmd(stdout, None)
 
@@ -2178,17 +3227,27 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
         mac = f"02:aa:aa:aa:{index:02x}:{self.id:02x}"
         # nic = "tap,model=virtio-net-pci"
         # qemu -net nic,model=virtio,addr=1a:46:0b:ca:bc:7b -net tap,fd=3 3<>/dev/tap11
-        self.cmd_raises(f"ip address flush dev {ifname}")
-        self.cmd_raises(f"ip tuntap add tap{tapindex} mode tap")
-        self.cmd_raises(f"ip link add name {brname} type bridge")
-        self.cmd_raises(f"ip link set dev {ifname} master {brname}")
-        self.cmd_raises(f"ip link set dev tap{tapindex} master {brname}")
-        if mtu:
-            self.cmd_raises(f"ip link set dev tap{tapindex} mtu {mtu}")
-            self.cmd_raises(f"ip link set dev {ifname} mtu {mtu}")
-        self.cmd_raises(f"ip link set dev tap{tapindex} up")
-        self.cmd_raises(f"ip link set dev {ifname} up")
-        self.cmd_raises(f"ip link set dev {brname} up")
+        # The VM is not running yet so these all run in the node's namespace.
+        if nl := self.get_netlink():
+            tapname = f"tap{tapindex}"
+            nl.addr_flush(ifname)
+            nl.tuntap_add(tapname)
+            nl.link_add(brname, "bridge", up=True)
+            nl.link_set(ifname, mtu=mtu, master=brname, up=True)
+            nl.link_set(tapname, mtu=mtu, master=brname, up=True)
+        else:
+            with self.ip_batch() as b:
+                b.add(f"address flush dev {ifname}")
+                b.add(f"tuntap add tap{tapindex} mode tap")
+                b.add(f"link add name {brname} type bridge")
+                b.add(f"link set dev {ifname} master {brname}")
+                b.add(f"link set dev tap{tapindex} master {brname}")
+                if mtu:
+                    b.add(f"link set dev tap{tapindex} mtu {mtu}")
+                    b.add(f"link set dev {ifname} mtu {mtu}")
+                b.add(f"link set dev tap{tapindex} up")
+                b.add(f"link set dev {ifname} up")
+                b.add(f"link set dev {brname} up")
         dev = f"{driver},netdev=n{index},mac={mac}"
         return [
             "-netdev",
@@ -2200,13 +3259,13 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
     async def mount_mounts(self):
         """Mount any shared directories."""
         self.logger.info("Mounting shared directories")
-        con = self.conrepl
+        gcmd = self.guest_cmd_raises
 
         # Mount (unordered) emulated USB devices
         usb_devices = [d for d in self.extra_mounts if d[3] == "usb"]
         if usb_devices:
             # Retreive a list of ready QEMU USB blocks
-            rv = con.cmd_raises('lsblk -f | grep "QEMU.*FAT"')
+            rv = (await gcmd('lsblk -f | grep "QEMU.*FAT"')).strip()
             devs = []
             blks = rv.split("\n")
             for blk in blks:
@@ -2218,24 +3277,24 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
             for dev in devs:
                 # Investigatory mount
                 self.logger.info("Temp. mounting USB dev %s to %s", dev, tmp_mnt)
-                con.cmd_raises(f"mkdir -p {tmp_mnt}")
-                con.cmd_raises(f"mount /dev/{dev} {tmp_mnt}")
-                dest = con.cmd_raises(f"cat {tmp_mnt}/.munet")
-                con.cmd_raises(f"rm -f {tmp_mnt}/.munet")
+                await gcmd(f"mkdir -p {tmp_mnt}")
+                await gcmd(f"mount /dev/{dev} {tmp_mnt}")
+                dest = (await gcmd(f"cat {tmp_mnt}/.munet")).strip()
+                await gcmd(f"rm -f {tmp_mnt}/.munet")
                 # Real mount
                 self.logger.info("Mounting USB dev %s to %s", dev, dest)
-                con.cmd_raises(f"umount {tmp_mnt}")
-                con.cmd_raises(f"mkdir -p {dest}")
-                con.cmd_raises(f"mount /dev/{dev} {dest}")
+                await gcmd(f"umount {tmp_mnt}")
+                await gcmd(f"mkdir -p {dest}")
+                await gcmd(f"mount /dev/{dev} {dest}")
 
         # Mount remaining directories
         for i, m in enumerate(self.extra_mounts):
             outer, mp, uargs, mtype = m
             if mtype == "tmpfs":
-                con.cmd_raises(f"mkdir -p {mp}")
+                await gcmd(f"mkdir -p {mp}")
                 margs = f"-o {uargs}" if uargs else ""
                 self.logger.info("Mounting tmpfs on %s with %s", mp, margs)
-                con.cmd_raises(f"mount {margs} -t tmpfs tmpfs {mp}")
+                await gcmd(f"mount {margs} -t tmpfs tmpfs {mp}")
             elif mtype == "bind":
                 uargs = "" if uargs is None else uargs
                 margs = "trans=virtio"
@@ -2244,10 +3303,10 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
                 self.logger.info(
                     "Mounting bind (9p) %s on %s with %s", outer, mp, margs
                 )
-                con.cmd_raises(f"mkdir -p {mp}")
-                con.cmd_raises(f"mount -t 9p -o {margs} shared{i} {mp}")
+                await gcmd(f"mkdir -p {mp}")
+                await gcmd(f"mount -t 9p -o {margs} shared{i} {mp}")
             elif mtype == "usb":
-                con.cmd_raises(f"test -d {mp}")  # Directory should already exist!
+                await gcmd(f"test -d {mp}")  # Directory should already exist!
             else:
                 assert False, "Unknown L3QemuVM mount option"
 
@@ -2257,8 +3316,7 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
         After VM comes up need to renumber the interfaces now on the inside.
         """
         self.logger.info("Renumbering interfaces")
-        con = self.conrepl
-        con.cmd_raises("sysctl -w net.ipv4.ip_forward=1")
+        cmds = ["sysctl -w net.ipv4.ip_forward=1"]
         if self.unet.ipv6_enable:
             self.cmd_raises("sysctl -w net.ipv6.conf.all.forwarding=1")
         for ifname in sorted(self.intfs):
@@ -2269,10 +3327,10 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
             if not mtu and switch:
                 mtu = switch.config.get("mtu")
             if mtu:
-                con.cmd_raises(f"ip link set {ifname} mtu {mtu}")
-            con.cmd_raises(f"ip link set {ifname} up")
+                cmds.append(f"ip link set {ifname} mtu {mtu}")
+            cmds.append(f"ip link set {ifname} up")
             # In case there was some preconfig e.g., cloud-init
-            con.cmd_raises(f"ip -4 addr flush dev {ifname}")
+            cmds.append(f"ip -4 addr flush dev {ifname}")
             sw_is_nat = switch and hasattr(switch, "is_nat") and switch.is_nat
             if ifaddr := self.get_intf_addr(ifname, ipv6=False):
                 oifaddr = self.get_peer_intf_addr(ifname, ipv6=False)
@@ -2281,15 +3339,15 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
                     and oifaddr is not None
                     and ifaddr.network != oifaddr.network
                 ):
-                    con.cmd_raises(
+                    cmds.append(
                         f"ip addr add {ifaddr.ip} peer {oifaddr.network} dev {ifname}"
                     )
                 else:
-                    con.cmd_raises(f"ip addr add {ifaddr} dev {ifname}")
+                    cmds.append(f"ip addr add {ifaddr} dev {ifname}")
                 if sw_is_nat:
                     # In case there was some preconfig e.g., cloud-init
-                    con.cmd_raises("ip route flush exact default")
-                    con.cmd_raises(f"ip route add default via {switch.ip_address}")
+                    cmds.append("ip route flush exact default")
+                    cmds.append(f"ip route add default via {switch.ip_address}")
             if ifaddr := self.get_intf_addr(ifname, ipv6=True):
                 oifaddr = self.get_peer_intf_addr(ifname, ipv6=True)
                 if (
@@ -2297,58 +3355,71 @@ class L3QemuVM(L3NodeMixin, LinuxNamespace):
                     and oifaddr is not None
                     and ifaddr.network != oifaddr.network
                 ):
-                    con.cmd_raises(
+                    cmds.append(
                         f"ip addr add {ifaddr.ip} peer {oifaddr.network} dev {ifname}"
                     )
                 else:
-                    con.cmd_raises(f"ip -6 addr add {ifaddr} dev {ifname}")
+                    cmds.append(f"ip -6 addr add {ifaddr} dev {ifname}")
                 if sw_is_nat:
                     # In case there was some preconfig e.g., cloud-init
-                    con.cmd_raises("ip -6 route flush exact default")
-                    con.cmd_raises(f"ip -6 route add default via {switch.ip6_address}")
-        con.cmd_raises("ip link set lo up")
+                    cmds.append("ip -6 route flush exact default")
+                    cmds.append(f"ip -6 route add default via {switch.ip6_address}")
+        cmds.append("ip link set lo up")
+
+        if self.qga:
+            # One round trip for all the commands.
+            await self.qga.cmd_raises("set -e\n" + "\n".join(cmds))
+        else:
+            # Send all the commands before reading any results.
+            for cmd, (rc, output) in zip(cmds, self.conrepl.cmds_status(cmds)):
+                if rc:
+                    raise CalledProcessError(rc, cmd, output)
 
         # This is already mounted now
         # if self.unet.cfgopt.getoption("--coverage"):
         #     con.cmd_raises("mount -t debugfs none /sys/kernel/debug")
 
     async def gather_coverage_data(self):
-        con = self.conrepl
+        gcmd = self.guest_cmd_raises
         gcda_root = "/sys/kernel/debug/gcov"
         dest = "/tmp/gcov-data.tgz"
 
         if gcda_root != "/sys/kernel/debug/gcov":
-            con.cmd_raises(
+            await gcmd(
                 rf"cd {gcda_root} && find * -name '*.gc??' "
                 "| tar -cf - -T - | gzip -c > {dest}"
             )
         else:
             # Some tars dont try and read 0 length files so we need to copy them.
-            tmpdir = con.cmd_raises("mktemp -d").strip()
-            con.cmd_raises(
+            tmpdir = (await gcmd("mktemp -d")).strip()
+            await gcmd(
                 rf"cd {gcda_root} && find -type d -exec mkdir -p {tmpdir}/{{}} \;"
             )
-            con.cmd_raises(
+            await gcmd(
                 rf"cd {gcda_root} && "
                 rf"find -name '*.gcda' -exec sh -c 'cat < $0 > {tmpdir}/$0' {{}} \;"
             )
-            con.cmd_raises(
+            await gcmd(
                 rf"cd {gcda_root} && "
                 rf"find -name '*.gcno' -exec sh -c 'cp -d $0 {tmpdir}/$0' {{}} \;"
             )
-            con.cmd_raises(
+            await gcmd(
                 rf"cd {tmpdir} && "
                 rf"find * -name '*.gc??' | tar -cf - -T - | gzip -c > {dest}"
             )
-            con.cmd_raises(rf"rm -rf {tmpdir}")
+            await gcmd(rf"rm -rf {tmpdir}")
 
         self.logger.debug("Saved coverage data in VM at %s", dest)
         ldest = os.path.join(self.rundir, "gcov-data.tgz")
         if self.use_ssh:
             self.cmd_raises(["/bin/cat", dest], stdout=open(ldest, "wb"))
             self.logger.debug("Saved coverage data on host at %s", ldest)
+        elif self.qga:
+            with open(ldest, "wb") as f:
+                f.write(await self.qga.pull(dest))
+            self.logger.debug("Saved coverage data on host at %s", ldest)
         else:
-            output = con.cmd_raises(rf"base64 {dest}")
+            output = self.conrepl.cmd_raises(rf"base64 {dest}")
             with open(ldest, "wb") as f:
                 f.write(base64.b64decode(output))
             self.logger.debug("Saved coverage data on host at %s", ldest)
@@ -2732,6 +3803,7 @@ users:
                 )
                 self.disk_created = True
 
+        self.diskpath = diskpath
         disk_driver = qc.get("disk-driver", "virtio")
         if diskpath:
             if disk_driver == "virtio":
@@ -2793,14 +3865,21 @@ users:
             "virtconsole,chardev=vcon0",
             "-device",
             "virtconsole,chardev=vcon1",
-            # 2 monitors
-            "-monitor",
-            f"unix:{_sd}/_monitor,server,nowait",
+            # QMP for munet and a monitor for the user
+            "-qmp",
+            f"unix:{_sd}/_qmp,server,nowait",
             "-monitor",
             f"unix:{_sd}/monitor,server,nowait",
             "-gdb",
             f"unix:{_sd}/gdbserver,server,nowait",
         ]
+        if qc.get("guest-agent"):
+            args += [
+                "-chardev",
+                f"socket,path={_sd}/_qga,server=on,wait=off,id=qga0",
+                "-device",
+                "virtserialport,chardev=qga0,name=org.qemu.guest_agent.0",
+            ]
 
         usb_id = 0
         for i, m in enumerate(self.extra_mounts):
@@ -2827,25 +3906,31 @@ users:
 
         args += ["-nographic"]
 
+        if qc.get("snapshot"):
+            if snapdir := QemuSnapshot.get_dir(self, args):
+                self.snapshot = QemuSnapshot(self, snapdir)
+                if not self.snapshot.setup_dir():
+                    self.snapshot = None
+                elif self.snapshot.exists():
+                    self.snapshot.prepare_restore()
+
         #
         # Launch Qemu
         #
 
         stdout = open(os.path.join(self.rundir, "qemu.out"), "wb")
         stderr = open(os.path.join(self.rundir, "qemu.err"), "wb")
-        self.launch_p = await self.async_popen_nsonly(
-            args,
-            stdin=subprocess.DEVNULL,
-            stdout=stdout,
-            stderr=stderr,
-            pass_fds=pass_fds,
-            # Don't want Keybaord interrupt etc to pass to child.
-            # start_new_session=True,
-            preexec_fn=os.setsid,
-        )
-
-        if self.nsenter_fork:
-            self.launch_pid = await self.get_proc_child_pid(self.launch_p)
+        if self.snapshot and self.snapshot.restored:
+            await self._async_start_qemu(
+                args + ["-incoming", "defer"], stdout, stderr, pass_fds
+            )
+            if not await self.snapshot.restore():
+                # Boot normally instead, saving a new snapshot.
+                await self._async_stop_qemu()
+                self.snapshot.abort_restore()
+                await self._async_start_qemu(args, stdout, stderr, pass_fds)
+        else:
+            await self._async_start_qemu(args, stdout, stderr, pass_fds)
 
         self.pytest_hook_run_cmd(stdout, stderr)
 
@@ -2853,9 +3938,20 @@ users:
         for fd in pass_fds:
             os.close(fd)
 
-        self.logger.debug(
-            "%s: popen => %s (%s)", self, self.launch_p.pid, self.launch_pid
-        )
+        status = await self.qmp.query_status()
+        self.logger.debug("VM status: %s", status)
+
+        kvm = await self.qmp.query_kvm()
+        self.logger.debug("KVM status: %s", kvm)
+        self.is_kvm = kvm["enabled"]
+
+        #
+        # Set thread affinity
+        #
+        cpus = await self.qmp.query_cpus_fast()
+        self.cpu_thread_map = {x["cpu-index"]: x["thread-id"] for x in cpus}
+        if cpuaff := self.qemu_config.get("cpu-affinity"):
+            await self.set_cpu_affinity(cpuaff)
 
         confiles = ["_console"]
         if use_cmdcon:
@@ -2880,39 +3976,26 @@ users:
         prompt = cc.get("prompt")
         if prompt is not None:
             prompt.replace("%NAME%", str(self.name))
-        cons = await self._opencons(
-            *confiles,
-            prompt=prompt,
-            is_bourne=not bool(prompt),
-            user=cc.get("user", "root"),
-            password=password,
-            expects=expects,
-            sends=sends,
-            timeout=int(cc.get("timeout", 60)),
-        )
+        with self.unet.profiler.span("console-login", self.name):
+            cons = await self._opencons(
+                *confiles,
+                prompt=prompt,
+                is_bourne=not bool(prompt),
+                user=cc.get("user", "root"),
+                password=password,
+                expects=expects,
+                sends=sends,
+                timeout=int(cc.get("timeout", 60)),
+            )
         self.conrepl = cons[0]
         if use_cmdcon:
             self.cmdrepl = cons[1]
-        self.monrepl = await self.monitor(os.path.join(self.sockdir, "_monitor"))
-
-        # the monitor output has super annoying ANSI escapes in it
 
-        output = self.monrepl.cmd_nostatus("info status")
-        self.logger.debug("VM status: %s", output)
+        if self.snapshot and not self.snapshot.restored:
+            await self.snapshot.save()
 
-        output = self.monrepl.cmd_nostatus("info kvm")
-        self.logger.debug("KVM status: %s", output)
-
-        #
-        # Set thread affinity
-        #
-        output = self.monrepl.cmd_nostatus("info cpus")
-        matches = re.findall(r"CPU #(\d+): *thread_id=(\d+)", output)
-        self.cpu_thread_map = {int(k): int(v) for k, v in matches}
-        if cpuaff := self.qemu_config.get("cpu-affinity"):
-            await self.set_cpu_affinity(cpuaff)
-
-        self.is_kvm = "disabled" not in output
+        if qc.get("guest-agent"):
+            await self.connect_guest_agent(int(cc.get("timeout", 60)))
 
         if qc.get("unix-os", True):
             await self.renumber_interfaces()
@@ -2928,6 +4011,39 @@ users:
 
         return self.launch_p
 
+    async def _async_start_qemu(self, args, stdout, stderr, pass_fds):
+        self.launch_p = await self.async_popen_nsonly(
+            args,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            pass_fds=pass_fds,
+            # Don't want Keybaord interrupt etc to pass to child.
+            # start_new_session=True,
+            preexec_fn=os.setsid,
+        )
+
+        if self.nsenter_fork:
+            self.launch_pid = await self.get_proc_child_pid(self.launch_p)
+
+        self.logger.debug(
+            "%s: popen => %s (%s)", self, self.launch_p.pid, self.launch_pid
+        )
+
+        self.qmp = QMPClient(
+            os.path.join(self.sockdir, "_qmp"),
+            logger=self.logger,
+            logpath=os.path.join(self.rundir, "_qmp-log.txt"),
+        )
+        await self.qmp.connect()
+
+    async def _async_stop_qemu(self):
+        await self.qmp.close()
+        self.qmp = None
+        await self.async_cleanup_proc(self.launch_p, self.launch_pid)
+        self.launch_p = None
+        self.launch_pid = None
+
     def launch_completed(self, future):
         self.logger.debug("%s: launch (qemu) completed called", self)
         self.use_ssh = False
@@ -2972,6 +4088,13 @@ users:
                 "Got an error during delete from async_cleanup_cmd: %s", error
             )
 
+        if self.control_master:
+            try:
+                await self.control_master.async_stop()
+            except Exception as error:
+                self.logger.warning("%s: error stopping ssh master: %s", self, error)
+            self.control_master = None
+
         try:
             if not self.launch_p:
                 self.logger.warning("async_delete: qemu is not running")
@@ -2980,9 +4103,170 @@ users:
         except Exception as error:
             self.logger.warning("%s: failed to cleanup qemu process: %s", self, error)
 
+        if self.qga:
+            await self.qga.close()
+            self.qga = None
+        if self.qmp:
+            await self.qmp.close()
+            self.qmp = None
+
         await super()._async_delete()
 
 
+class LinkScheduler:
+    """Run link operations concurrently while keeping their dependencies.
+
+    Each operation is given the set of endpoints (nodes, or switch ports) it
+    modifies. Operations which share an endpoint are run in the order they were
+    added, and the rest are run concurrently, at most `limit` at a time. Plain
+    functions are run on the munet thread pool and coroutine functions are run on
+    the event loop.
+
+    The operations can also be started in the background using `start()`, after
+    which `wait_for()` waits for just the operations of a single node.
+    """
+
+    def __init__(self, unet, limit):
+        self.unet = unet
+        self.limit = limit
+        self.ops = []
+        self.tasks = []
+        self.node_tasks = {}
+
+    def add(self, endpoints, func, *args):
+        """Add an operation calling `func(*args)` which modifies `endpoints`."""
+        self.ops.append((frozenset(endpoints), func, args))
+
+    async def _run_op(self, deps, sem, pool, func, args):
+        if deps:
+            await asyncio.wait(deps)
+            for dep in deps:
+                # Skip anything that depends on a failed operation.
+                if error := dep.exception():
+                    raise error
+        async with sem:
+            if asyncio.iscoroutinefunction(func):
+                await func(*args)
+            else:
+                loop = asyncio.get_running_loop()
+                ctx = contextvars.copy_context()
+                await loop.run_in_executor(
+                    pool, functools.partial(ctx.run, func, *args)
+                )
+
+    async def run(self):
+        """Run all the operations, raising the first error (if any)."""
+        if self.limit <= 1:
+            for _, func, args in self.ops:
+                if asyncio.iscoroutinefunction(func):
+                    await func(*args)
+                else:
+                    func(*args)
+            return
+
+        self.start()
+        await self.wait()
+
+    def start(self):
+        """Start running all the operations in the background."""
+        limit = max(self.limit, 1)
+        pool = self.unet.get_thread_pool(limit)
+        sem = asyncio.Semaphore(limit)
+        last = {}
+        for endpoints, func, args in self.ops:
+            deps = {last[x] for x in endpoints if x in last}
+            task = asyncio.create_task(self._run_op(deps, sem, pool, func, args))
+            for x in endpoints:
+                last[x] = task
+                # Switch port endpoints are (switch, intf) tuples.
+                name = x[0] if isinstance(x, tuple) else x
+                self.node_tasks.setdefault(name, []).append(task)
+            self.tasks.append(task)
+
+    @staticmethod
+    async def _wait_tasks(tasks):
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def wait(self):
+        """Wait for all the started operations, raising the first error (if any)."""
+        await self._wait_tasks(self.tasks)
+
+    async def wait_for(self, name):
+        """Wait for the started operations on node `name`, raising any error."""
+        await self._wait_tasks(self.node_tasks.get(name, []))
+
+
+class ResourceSampler:
+    """Sample the CPU, memory and I/O usage of the nodes of a topology.
+
+    Each sample is appended as a line of JSON to RUNDIR/resources.jsonl, either on
+    demand using `sample()` or periodically after `start()`.
+    """
+
+    def __init__(self, unet):
+        self.unet = unet
+        self.task = None
+
+    def get_usage(self):
+        """Get the current CPU, memory and I/O usage of each node.
+
+        Returns:
+            A dict of node names to the usage from `CGroup.get_stats`, nodes without
+            their own cgroup are not included.
+        """
+        usage = {}
+        for name, host in self.unet.hosts.items():
+            if cgroup := host.get_resource_cgroup():
+                usage[name] = cgroup.get_stats()
+        return usage
+
+    def sample(self):
+        """Append the current resource usage of each node to RUNDIR/resources.jsonl.
+
+        Returns:
+            The sample, a dict with the `time` and the `nodes` usage.
+        """
+        sample = {"time": time.time(), "nodes": self.get_usage()}
+        path = os.path.join(self.unet.rundir, "resources.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(sample) + "\n")
+        return sample
+
+    def _try_sample(self):
+        try:
+            self.sample()
+        except OSError as error:
+            self.unet.logger.warning(
+                "%s: error sampling resources: %s", self.unet, error
+            )
+
+    async def _async_run(self, interval):
+        while True:
+            self._try_sample()
+            await asyncio.sleep(interval)
+
+    def start(self, interval):
+        """Sample node resource usage every `interval` seconds until stopped."""
+        if self.task:
+            self.task.cancel()
+        self.task = asyncio.create_task(
+            self._async_run(interval), name="resource-sampler"
+        )
+
+    async def stop(self):
+        """Stop sampling resource usage, taking one final sample."""
+        if not self.task:
+            return
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.task = None
+        self._try_sample()
+
+
 class Munet(BaseMunet):
     """Munet."""
 
@@ -3002,10 +4286,20 @@ class Munet(BaseMunet):
         if logger is None:
             logger = logging.getLogger("munet.unet")
 
+        if config and "executor" not in kwargs:
+            topoconf = config.get("topology", {})
+            kwargs["executor"] = topoconf.get("command-executor", False)
+        if config and "netlink" not in kwargs:
+            topoconf = config.get("topology", {})
+            backend = topoconf.get("network-backend", "netlink")
+            kwargs["netlink"] = backend == "netlink"
+
         super().__init__("munet", pid=pid, rundir=rundir, logger=logger, **kwargs)
 
         self.built = False
         self.tapcount = 0
+        self.log_scanner = LogScanner(self.logger)
+        self.pending_links = None
 
         self.cmd_raises(f"mkdir -p {self.rundir} && chmod 755 {self.rundir}")
         self.set_ns_cwd(self.rundir)
@@ -3141,6 +4435,13 @@ ff02::2\tip6-allrouters
         self.topoconf = self.config["topology"]
         self.ipv6_enable = self.topoconf.get("ipv6-enable", False)
 
+        self.cgroup_topology = None
+        self.cgroup_mode = self.topoconf.get(
+            "cgroup", "node" if self._has_node_resources() else "none"
+        )
+        self._setup_cgroup(self.cgroup_mode)
+        self.resource_sampler = ResourceSampler(self)
+
         if self.isolated:
             if not self.ipv6_enable:
                 # Disable IPv6
@@ -3205,6 +4506,12 @@ ff02::2\tip6-allrouters
         autonumber = self.autonumber
         ipv6_enable = self.ipv6_enable
 
+        # Start creating namespaces for nodes in the background.
+        if count := int(topoconf.get("namespace-pool", 0)):
+            self.fill_namespace_pool(
+                count, self.build_concurrency, pid=True, executor=self.use_executor
+            )
+
         # ---------------------------------------------
         # Merge Kinds and perform variable substitution
         # ---------------------------------------------
@@ -3223,8 +4530,10 @@ ff02::2\tip6-allrouters
             if "ipv6" not in conf and autonumber and ipv6_enable:
                 conf["ipv6"] = "auto"
             topoconf["networks"][name] = conf
-            self.add_network(name, conf, logger=logger)
+            with self.profiler.span("network", name):
+                self.add_network(name, conf, logger=logger)
 
+        nodeconfs = []
         for name, conf in config_to_dict_with_key(topoconf, "nodes", "name").items():
             if kind := conf.get("kind"):
                 if kconf := kinds[kind]:
@@ -3241,7 +4550,10 @@ ff02::2\tip6-allrouters
                 configdir=self.config_dirname,
             )
             topoconf["nodes"][name] = conf
-            self.add_l3_node(name, conf, logger=logger)
+            nodeconfs.append((name, conf))
+
+        with self.profiler.span("nodes"):
+            await self.async_add_l3_nodes(nodeconfs, logger=logger)
 
         # ------------------
         # Create connections
@@ -3267,6 +4579,9 @@ ff02::2\tip6-allrouters
                 nconns.append(cconf)
             nconf["connections"] = nconns
 
+        # Create all the links, operations on different nodes run concurrently.
+        links = LinkScheduler(self, self.build_concurrency)
+        p2p_intfs = set()
         for name, node in self.hosts.items():
             nconf = node.config
             if "connections" not in nconf:
@@ -3274,7 +4589,7 @@ ff02::2\tip6-allrouters
             for cconf in nconf["connections"]:
                 if "to" not in cconf:
                     # unconnected intf
-                    await self.add_dummy_link(node, cconf)
+                    links.add([name], self.add_dummy_link, node, cconf)
                     continue
                 to = cconf["to"]
                 if to in self.switches:
@@ -3290,12 +4605,88 @@ ff02::2\tip6-allrouters
                             k: v for k, v in switch.config.items() if k not in nontc
                         }
                         swconf = deepcopy(swconf)
-                    await self.add_native_link(switch, node, swconf, cconf)
-                elif cconf["name"] not in node.intfs:
+                    self.schedule_native_link(links, switch, node, swconf, cconf)
+                elif (
+                    cconf["name"] not in node.intfs
+                    and (name, cconf["name"]) not in p2p_intfs
+                ):
                     # Only add the p2p interface if not already there.
                     other = self.hosts[to]
                     oconf = find_matching_net_config(name, cconf, other.config)
-                    await self.add_native_link(node, other, cconf, oconf)
+                    self.schedule_native_link(links, node, other, cconf, oconf)
+                    p2p_intfs.add((to, oconf["name"]))
+        if self.build_pipeline:
+            # Each node waits for only its own links in `run()`.
+            links.start()
+            self.pending_links = links
+        else:
+            with self.profiler.span("links"):
+                await links.run()
+
+    async def async_wait_links(self, node=None):
+        """Wait for links still being created by a pipelined build.
+
+        Args:
+            node: if given only wait for the links of this node, otherwise wait for
+                all the links.
+        """
+        if not self.pending_links:
+            return
+        if node is not None:
+            await self.pending_links.wait_for(node.name)
+            return
+        try:
+            await self.pending_links.wait()
+        finally:
+            self.pending_links = None
+
+    def _has_node_resources(self):
+        """Return True if any node or kind config has `resources`."""
+        confs = []
+        for value in (self.topoconf.get("nodes"), self.config.get("kinds")):
+            if isinstance(value, dict):
+                confs.extend(value.values())
+            elif value:
+                confs.extend(value)
+        return any("resources" in x for x in confs)
+
+    def _setup_cgroup(self, mode):
+        """Create the cgroup subtree used to track the processes of the topology.
+
+        Args:
+            mode: "none" to not use a cgroup, "topology" to use a single cgroup for
+                all processes, or "node" to also use a child cgroup per node.
+        """
+        if mode == "none":
+            # Don't leave a stale record for `munet --kill`.
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(os.path.join(self.rundir, CGROUP_FILE))
+            return
+        cg = CGroup.create_topology()
+        if cg is None:
+            self.logger.warning("%s: cgroup v2 not available, not using cgroup", self)
+            return
+        self.cgroup_topology = cg
+        pids = {self.p.pid if self.p else None, self.pid} - {None, our_pid}
+        if mode == "node":
+            # Our cgroup must first give the controllers to the topology cgroup.
+            delegate_controllers(pids)
+            cg.enable_controllers()
+            self.cgroup = cg.child("munet")
+        else:
+            self.cgroup = cg
+        for pid in pids:
+            self.cgroup.add_pid(pid)
+        write_rundir_cgroup(self.rundir, cg)
+        self.logger.debug("%s: tracking processes using %s", self, cg)
+
+    def get_node_cgroup(self, name):
+        """Get the CGroup for the processes of node `name`, or None."""
+        if not self.cgroup_topology:
+            return None
+        if self.cgroup_mode == "node":
+            return self.cgroup_topology.child(name)
+        return self.cgroup_topology
 
     @property
     def autonumber(self):
@@ -3313,6 +4704,17 @@ ff02::2\tip6-allrouters
     def autonumber_loopbacks(self, value):
         self.topoconf["loopbacks-autonumber"] = bool(value)
 
+    @property
+    def build_concurrency(self):
+        """The maximum number of nodes or links to create concurrently."""
+        limit = self.topoconf.get("build-concurrency", 0)
+        return int(limit) if limit else os.cpu_count()
+
+    @property
+    def build_pipeline(self):
+        """True if each node is run as soon as its own links are created."""
+        return bool(self.topoconf.get("build-pipeline", False))
+
     async def add_dummy_link(self, node1, c1=None):
         c1 = {} if c1 is None else c1
 
@@ -3332,8 +4734,7 @@ ff02::2\tip6-allrouters
             super().add_dummy(node1, if1, **c1)
             node1.set_dummy_addr(c1)
 
-    async def add_native_link(self, node1, node2, c1=None, c2=None):
-        """Add a link between switch and node or 2 nodes."""
+    def _get_link_ends(self, node1, node2, c1, c2):
         isp2p = False
 
         c1 = {} if c1 is None else c1
@@ -3354,11 +4755,31 @@ ff02::2\tip6-allrouters
 
         if "name" not in c1:
             c1["name"] = node1.get_next_intf_name()
-        if1 = c1["name"]
-
         if "name" not in c2:
             c2["name"] = node2.get_next_intf_name()
-        if2 = c2["name"]
+
+        return node1, node2, c1, c2, isp2p
+
+    def schedule_native_link(self, links, node1, node2, c1=None, c2=None):
+        """Add an operation to `links` to create a link, see `add_native_link`.
+
+        Interface names are allocated now so they do not depend on the order the
+        links are created in.
+        """
+        node1, node2, c1, c2, isp2p = self._get_link_ends(node1, node2, c1, c2)
+        if isp2p:
+            endpoints = [node1.name, node2.name]
+        else:
+            # Ports of a bridge are independent of each other.
+            endpoints = [(node1.name, c1["name"]), node2.name]
+        if any(k in c for c in (c1, c2) for k in ("hostintf", "physical")):
+            links.add(endpoints, self.add_native_link, node1, node2, c1, c2)
+        else:
+            links.add(endpoints, self._add_native_link, node1, node2, c1, c2, isp2p)
+
+    async def add_native_link(self, node1, node2, c1=None, c2=None):
+        """Add a link between switch and node or 2 nodes."""
+        node1, node2, c1, c2, isp2p = self._get_link_ends(node1, node2, c1, c2)
 
         do_add_link = True
         for n, c in ((node1, c1), (node2, c2)):
@@ -3368,6 +4789,13 @@ ff02::2\tip6-allrouters
             elif "physical" in c:
                 await n.add_phy_intf(c["physical"], c["name"])
                 do_add_link = False
+
+        self._add_native_link(node1, node2, c1, c2, isp2p, do_add_link)
+
+    def _add_native_link(self, node1, node2, c1, c2, isp2p, do_add_link=True):
+        if1 = c1["name"]
+        if2 = c2["name"]
+
         if do_add_link:
             assert "hostintf" not in c1
             assert "hostintf" not in c2
@@ -3383,34 +4811,91 @@ ff02::2\tip6-allrouters
             else:
                 mtu = c2.get("mtu")
 
-            super().add_link(node1, node2, if1, if2, mtu=mtu)
+            with self.profiler.span("link-create", node2.name):
+                super().add_link(node1, node2, if1, if2, mtu=mtu)
 
         if isp2p:
-            node1.set_p2p_addr(node2, c1, c2)
+            with self.profiler.span("addresses", node1.name):
+                node1.set_p2p_addr(node2, c1, c2)
         else:
-            node2.set_lan_addr(node1, c2)
+            with self.profiler.span("addresses", node2.name):
+                node2.set_lan_addr(node1, c2)
 
         if isinstance(node1, ExternalNetwork):
             pass
         elif "physical" not in c1 and not node1.is_vm:
-            node1.set_intf_constraints(if1, **c1)
+            with self.profiler.span("tc", node1.name):
+                node1.set_intf_constraints(if1, **c1)
         if "physical" not in c2 and not node2.is_vm:
-            node2.set_intf_constraints(if2, **c2)
+            with self.profiler.span("tc", node2.name):
+                node2.set_intf_constraints(if2, **c2)
+
+    @staticmethod
+    def get_l3_node_class(config):
+        if config and config.get("image"):
+            return L3ContainerNode
+        if config and config.get("qemu"):
+            return L3QemuVM
+        if config and config.get("server"):
+            return SSHRemote
+        if config and config.get("hostnet"):
+            return HostnetNode
+        return L3NamespaceNode
 
     def add_l3_node(self, name, config=None, **kwargs):
         """Add a node to munet."""
-        if config and config.get("image"):
-            cls = L3ContainerNode
-        elif config and config.get("qemu"):
-            cls = L3QemuVM
-        elif config and config.get("server"):
-            cls = SSHRemote
-        elif config and config.get("hostnet"):
-            cls = HostnetNode
-        else:
-            cls = L3NamespaceNode
+        cls = self.get_l3_node_class(config)
         return super().add_host(name, cls=cls, config=config, **kwargs)
 
+    async def async_add_l3_nodes(self, nodeconfs, **kwargs):
+        """Add nodes to munet, creating them concurrently.
+
+        At most `build-concurrency` nodes are created at the same time. Node ordinals
+        are allocated in `nodeconfs` order before creation, and the nodes are added to
+        `hosts` in that order, so the result is the same as adding them one by one.
+
+        Args:
+            nodeconfs: list of (name, config) tuples.
+            **kwargs: passed to the node constructors.
+        """
+        limit = min(self.build_concurrency, len(nodeconfs))
+        if limit <= 1:
+            for name, conf in nodeconfs:
+                with self.profiler.span("node", name):
+                    self.add_l3_node(name, conf, **kwargs)
+            return
+
+        self.logger.debug(
+            "%s: creating %s nodes %s at a time", self, len(nodeconfs), limit
+        )
+        loop = asyncio.get_running_loop()
+        pool = self.get_thread_pool(limit)
+        futures = []
+        for name, conf in nodeconfs:
+            ordinal = None if "id" in conf else L3NodeMixin._get_next_ord()
+            create = functools.partial(
+                self._create_l3_node, name, conf, ordinal=ordinal, **kwargs
+            )
+            ctx = contextvars.copy_context()
+            futures.append(loop.run_in_executor(pool, ctx.run, create))
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        # Add all the created nodes so they are cleaned up even on failure
+        error = None
+        for (name, _), result in zip(nodeconfs, results):
+            if isinstance(result, BaseException):
+                self.logger.error("%s: error creating node %s: %s", self, name, result)
+                error = error if error else result
+            else:
+                self.hosts[name] = result
+        if error:
+            raise error
+
+    def _create_l3_node(self, name, config, **kwargs):
+        with self.profiler.span("node", name):
+            cls = self.get_l3_node_class(config)
+            return self.create_host(name, cls, config=config, **kwargs)
+
     def add_network(self, name, config=None, **kwargs):
         """Add a l2 or l3 switch to munet."""
         if config is None:
@@ -3489,18 +4974,34 @@ done""")
         #     f"\nCOVERAGE-SUMMARY-START\n{output}\nCOVERAGE-SUMMARY-END\n"
         # )
 
+    async def async_inspect_image(self, image):
+        """Get the ID of the local container `image`, or None if it's not present.
+
+        Found images are cached for the process lifetime so each image is only
+        inspected once across all the topologies run (e.g., by mutest).
+        """
+        if image in image_ids:
+            return image_ids[image]
+        logging.debug("Checking for image %s", image)
+        rc, o, _ = await self.rootcmd.async_cmd_status(
+            ["podman", "image", "inspect", "--format={{.Id}}", image], warn=False
+        )
+        if rc or not o.strip():
+            return None
+        image_ids[image] = o.strip()
+        return image_ids[image]
+
     async def load_images(self, images):
+        images = sorted(images)
+        ids = await asyncio.gather(*[self.async_inspect_image(x) for x in images])
         tasks = []
-        for image in images:
-            logging.debug("Checking for image %s", image)
-            rc, _, _ = self.rootcmd.cmd_status(
-                f"podman image inspect {image}", warn=False
-            )
-            if not rc:
+        for image, image_id in zip(images, ids):
+            if image_id:
                 continue
             logging.info("Pulling missing image %s", image)
 
             aw = self.rootcmd.async_cmd_raises_once(f"podman pull {image}")
+            aw = self.async_profile_span(aw, "image-pull", image)
             tasks.append(asyncio.create_task(aw))
         if not tasks:
             return
@@ -3512,12 +5013,13 @@ done""")
         hosts = self.hosts.values()
 
         images = {x.container_image for x in hosts if hasattr(x, "container_image")}
-        await self.load_images(images)
+        with self.profiler.span("images"):
+            await self.load_images(images)
 
         launch_nodes = [x for x in hosts if hasattr(x, "launch")]
         launch_nodes = [x for x in launch_nodes if x.config.get("qemu")]
         run_nodes = [x for x in hosts if x.has_run_cmd()]
-        ready_nodes = [x for x in hosts if x.has_ready_cmd()]
+        ready_nodes = [x for x in hosts if x.has_ready()]
 
         if self.cfgopt.getoption("--coverage"):
             self.coverage_setup()
@@ -3533,6 +5035,8 @@ done""")
                     host, intf = pcap.split(":")
                     pcap = f"{host}-{intf}"
                     host = self.hosts[host]
+                    # The interface may still be being created by a pipelined build.
+                    await self.async_wait_links(host)
                 else:
                     host = self
                     intf = pcap
@@ -3542,10 +5046,31 @@ done""")
                     title=f"cap:{pcap}",
                 )
 
+        if self.build_pipeline:
+            await self._async_run_pipelined(launch_nodes, run_nodes, ready_nodes, tasks)
+        else:
+            await self._async_run_phased(launch_nodes, run_nodes, ready_nodes, tasks)
+
+        logging.debug("All done returning tasks: %s", tasks)
+
+        self.profiler.write(os.path.join(self.rundir, "build-profile.json"))
+
+        if interval := self.cfgopt.getoption("--sample-resources"):
+            self.resource_sampler.start(float(interval))
+
+        return tasks
+
+    async def _async_run_phased(self, launch_nodes, run_nodes, ready_nodes, tasks):
+        """Run the nodes with each phase finishing for all nodes before the next."""
         if launch_nodes:
             # would like a info when verbose here.
             logging.debug("Launching nodes")
-            await asyncio.gather(*[x.launch() for x in launch_nodes])
+            await asyncio.gather(
+                *[
+                    self.async_profile_span(x.launch(), "qemu-launch", x.name)
+                    for x in launch_nodes
+                ]
+            )
 
         logging.debug("Launched nodes -- Queueing Waits")
 
@@ -3562,7 +5087,12 @@ done""")
         if run_nodes:
             # would like a info when verbose here.
             logging.debug("Running `cmd` on nodes")
-            await asyncio.gather(*[x.run_cmd() for x in run_nodes])
+            await asyncio.gather(
+                *[
+                    self.async_profile_span(x.run_cmd(), "run-cmd", x.name)
+                    for x in run_nodes
+                ]
+            )
 
         logging.debug("Ran cmds -- Queueing Waits")
 
@@ -3576,27 +5106,133 @@ done""")
 
         # Wait for nodes to be ready
         if ready_nodes:
+            await self.async_wait_ready(ready_nodes)
 
-            async def wait_until_ready(x):
-                while not await x.async_ready_cmd():
-                    logging.debug("Waiting for ready on: %s", x)
-                    await asyncio.sleep(0.25)
-                logging.debug("%s is ready!", x)
+    async def _async_run_pipelined(self, launch_nodes, run_nodes, ready_nodes, tasks):
+        """Run the nodes with each node moving through the phases independently.
 
-            tasks = [asyncio.create_task(wait_until_ready(x)) for x in ready_nodes]
+        A node is launched, and then its `cmd` is run, as soon as its own links
+        (which include those to its peers and switches) have been created, and then
+        it is waited on to be ready.
+        """
 
-            logging.debug("Waiting for ready on nodes: %s", ready_nodes)
-            _, pending = await asyncio.wait(tasks, timeout=30)
-            if pending:
-                logging.warning("Timeout waiting for ready: %s", pending)
-                for nr in pending:
-                    nr.cancel()
-                raise asyncio.TimeoutError()
-            logging.debug("All nodes ready")
+        async def run_node(x):
+            with self.profiler.span("node-links", x.name):
+                await self.async_wait_links(x)
+            if x in launch_nodes:
+                await self.async_profile_span(x.launch(), "qemu-launch", x.name)
+                task = asyncio.create_task(
+                    x.launch_p.wait(), name=f"Node-{x.name}-launch"
+                )
+                task.add_done_callback(x.launch_completed)
+                tasks.append(task)
+            if x in run_nodes:
+                await self.async_profile_span(x.run_cmd(), "run-cmd", x.name)
+                task = asyncio.create_task(x.cmd_p.wait(), name=f"Node-{x.name}-cmd")
+                task.add_done_callback(x.cmd_completed)
+                tasks.append(task)
+            if x in ready_nodes:
+                return await self._async_node_ready(x)
+            return None
 
-        logging.debug("All done returning tasks: %s", tasks)
+        nodes = list(self.hosts.values())
+        logging.debug("Running nodes pipelined: %s", nodes)
+        results = await asyncio.gather(
+            *[run_node(x) for x in nodes], return_exceptions=True
+        )
+        # Raise any error creating links not seen by a node.
+        await self.async_wait_links()
+        results = dict(zip(nodes, results))
+        for result in results.values():
+            if isinstance(result, BaseException) and not isinstance(
+                result, asyncio.TimeoutError
+            ):
+                raise result
+        if ready_nodes:
+            self._report_ready(ready_nodes, [results[x] for x in ready_nodes])
 
-        return tasks
+    async def async_wait_ready(self, ready_nodes, marks=None):
+        """Wait for each of `ready_nodes` to be ready.
+
+        Each node is given the `timeout` from its `ready` config (default 30s). The
+        time each node took to become ready is logged and written to
+        `ready-times.json` in the munet run directory. `marks` is a dict of
+        `ready.ResetMarks` for nodes being reset.
+
+        Raises:
+            asyncio.TimeoutError: if any node is not ready within its timeout.
+        """
+        logging.debug("Waiting for ready on nodes: %s", ready_nodes)
+        results = await asyncio.gather(
+            *[
+                self._async_node_ready(x, marks.get(x) if marks else None)
+                for x in ready_nodes
+            ],
+            return_exceptions=True,
+        )
+        self._report_ready(ready_nodes, results)
+
+    async def _async_node_ready(self, x, marks=None):
+        with self.profiler.span("ready", x.name):
+            elapsed = await x.async_wait_ready(marks)
+        logging.debug("%s is ready after %.3fs", x, elapsed)
+        return elapsed
+
+    def _report_ready(self, ready_nodes, results):
+        """Write and log the ready times and raise any error waiting for ready."""
+        times = {}
+        failed = []
+        for x, result in zip(ready_nodes, results):
+            if isinstance(result, asyncio.TimeoutError):
+                failed.append(x.name)
+                times[x.name] = None
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                times[x.name] = result
+        ready_path = os.path.join(self.rundir, "ready-times.json")
+        with open(ready_path, "w", encoding="utf-8") as f:
+            json.dump(times, f, indent=2)
+        ready_times = sorted(
+            ((k, v) for k, v in times.items() if v is not None), key=lambda x: -x[1]
+        )
+        self.logger.info(
+            "Ready times (secs):\n%s",
+            "\n".join(f"  {k:20} {v:9.3f}" for k, v in ready_times),
+        )
+        if failed:
+            logging.warning("Timeout waiting for ready: %s", failed)
+            raise asyncio.TimeoutError(f"nodes not ready: {', '.join(failed)}")
+        logging.debug("All nodes ready")
+
+    async def async_reset(self):
+        """Reset a running topology so that it can be reused by another test.
+
+        This is much cheaper than deleting and rebuilding the topology. The
+        `reset-cmd` of each node is run, the marks of all watched logs are moved to
+        the current end of the logs, and then the nodes are waited on to be ready
+        again. The `ready` file and log probes of a node with a `reset-cmd` only
+        succeed for files modified, or content logged, after the reset started.
+        """
+        hosts = self.hosts.values()
+        reset_nodes = [x for x in hosts if x.has_reset_cmd()]
+        marks = {x: ready.ResetMarks(x) for x in reset_nodes if x.has_ready()}
+        if reset_nodes:
+            logging.debug("Running `reset-cmd` on nodes")
+            await asyncio.gather(
+                *[
+                    self.async_profile_span(x.async_reset_cmd(), "reset-cmd", x.name)
+                    for x in reset_nodes
+                ]
+            )
+
+        for x in hosts:
+            if hasattr(x, "reset_watched_logs"):
+                x.reset_watched_logs()
+
+        ready_nodes = [x for x in hosts if x.has_ready()]
+        if ready_nodes:
+            await self.async_wait_ready(ready_nodes, marks)
 
     async def _async_delete(self):
         from .testing.util import async_pause_test  # pylint: disable=C0415
@@ -3613,10 +5249,24 @@ done""")
             except Exception as error:
                 self.logger.error("\n...continuing after error: %s", error)
 
+        await self.resource_sampler.stop()
+
+        # Let any links still being created by a pipelined build finish.
+        if self.pending_links:
+            await asyncio.gather(*self.pending_links.tasks, return_exceptions=True)
+            self.pending_links = None
+
         # Run cleanup-cmd's.
         nodes = (x for x in self.hosts.values() if x.has_cleanup_cmd())
         try:
-            await asyncio.gather(*(x.async_cleanup_cmd() for x in nodes))
+            await asyncio.gather(
+                *(
+                    self.async_profile_span(
+                        x.async_cleanup_cmd(), "cleanup-cmd", x.name
+                    )
+                    for x in nodes
+                )
+            )
         except Exception as error:
             logging.warning("Error running cleanup cmds: %s", error)
 
@@ -3634,11 +5284,46 @@ done""")
 
         # XXX should we cancel launch and run tasks?
 
+        self.log_scanner.close()
+
         try:
-            await super()._async_delete()
+            with self.profiler.span("delete"):
+                await super()._async_delete()
         except Exception as error:
             self.logger.error("Error cleaning up: %s", error, exc_info=True)
             raise
+        finally:
+            try:
+                self.profiler.write(os.path.join(self.rundir, "build-profile.json"))
+            except OSError as error:
+                self.logger.warning("Error writing build profile: %s", error)
+            # Kill anything left behind by the nodes.
+            if self.cgroup_topology:
+                self.cgroup_topology.kill_and_remove()
+                self.cgroup_topology = None
+                self.cgroup = None
+
+
+def get_podman_resource_args(resources):
+    """Get the `podman run` arguments for the node `resources` config."""
+    args = []
+    for key, value in resources.items():
+        if key == "cpu-weight":
+            # Map cgroup v2 weight [1, 10000] to the v1 shares podman takes.
+            args.append(f"--cpu-shares={2 + ((int(value) - 1) * 262142) // 9999}")
+        elif key == "cpu-max":
+            quota, period = get_cpu_max(value).split()
+            if quota != "max":
+                args += [f"--cpu-quota={quota}", f"--cpu-period={period}"]
+        elif key == "cpuset":
+            args.append(f"--cpuset-cpus={value}")
+        elif key == "memory-max":
+            args.append(f"--memory={value}")
+        elif key == "pids-max":
+            args.append(f"--pids-limit={value}")
+        else:
+            raise ValueError(f"unknown resource {key}")
+    return args
 
 
 async def run_cmd_update_ceos(node, shell_cmd, cmds, cmd):
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""A minimal rtnetlink client for link, address and route operations.
+
+This is used in place of running `ip` commands during topology build. The netlink
+socket is opened inside the target network namespace (using `linux.setns`) and
+then used from the original namespace, a netlink socket stays bound to the
+namespace it was created in.
+"""
+
+import errno
+import fcntl
+import ipaddress
+import logging
+import os
+import socket
+import struct
+import threading
+
+from . import linux
+
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_ECHO = 0x8
+NLM_F_DUMP = 0x300
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_MASTER = 10
+IFLA_LINKINFO = 18
+IFLA_NET_NS_FD = 28
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+VETH_INFO_PEER = 1
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+RTA_DST = 1
+RTA_GATEWAY = 5
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE = 0
+RTN_UNICAST = 1
+
+IFF_UP = 0x1
+
+SIOCGSKNS = 0x894C
+
+TUNSETIFF = 0x400454CA
+TUNSETPERSIST = 0x400454CB
+IFF_TUN = 0x0001
+IFF_TAP = 0x0002
+IFF_NO_PI = 0x1000
+
+NLMSG_HDR_FMT = "=IHHII"
+NLMSG_HDR_SIZE = struct.calcsize(NLMSG_HDR_FMT)
+IFINFOMSG_FMT = "=BxHiII"
+IFADDRMSG_FMT = "=BBBBI"
+RTMSG_FMT = "=BBBBBBBBI"
+
+
+class NetlinkError(OSError):
+    """A netlink request failed."""
+
+
+def _align(n):
+    return (n + 3) & ~3
+
+
+def _attr(atype, data):
+    if isinstance(data, str):
+        data = data.encode("utf-8") + b"\0"
+    elif isinstance(data, int):
+        data = struct.pack("=I", data)
+    pad = b"\0" * (_align(len(data)) - len(data))
+    return struct.pack("=HH", 4 + len(data), atype) + data + pad
+
+
+def _parse_attrs(data):
+    attrs = {}
+    off = 0
+    while off + 4 <= len(data):
+        alen, atype = struct.unpack_from("=HH", data, off)
+        if alen < 4:
+            break
+        # Mask off the nested and byte-order flags
+        attrs[atype & 0x3FFF] = data[off + 4 : off + alen]
+        off += _align(alen)
+    return attrs
+
+
+def _ifinfomsg(index=0, flags=0, change=0):
+    return struct.pack(IFINFOMSG_FMT, socket.AF_UNSPEC, 0, index, flags, change)
+
+
+def _parse_link(payload):
+    _, _, index, flags, _ = struct.unpack_from(IFINFOMSG_FMT, payload)
+    attrs = _parse_attrs(payload[struct.calcsize(IFINFOMSG_FMT) :])
+    link = {"index": index, "flags": flags}
+    if IFLA_IFNAME in attrs:
+        link["ifname"] = attrs[IFLA_IFNAME].rstrip(b"\0").decode("utf-8")
+    if IFLA_ADDRESS in attrs:
+        link["address"] = ":".join(f"{x:02x}" for x in attrs[IFLA_ADDRESS])
+    if IFLA_MTU in attrs:
+        link["mtu"] = struct.unpack("=I", attrs[IFLA_MTU][:4])[0]
+    if IFLA_MASTER in attrs:
+        link["master"] = struct.unpack("=I", attrs[IFLA_MASTER][:4])[0]
+    return link
+
+
+def run_in_netns(nspath, func, *args):
+    """Run `func(*args)` inside the network namespace at `nspath`.
+
+    Only the calling thread changes namespace and it is restored before returning.
+    A new thread is not used as threads can not be created after an inline unshare
+    of a PID namespace, and /proc may not show our process, so the current
+    namespace is obtained from a socket.
+    """
+    if not nspath:
+        return func(*args)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        ofd = fcntl.ioctl(sock.fileno(), SIOCGSKNS, 0)
+    try:
+        fd = os.open(nspath, os.O_RDONLY)
+        try:
+            linux.setns(fd, linux.CLONE_NEWNET)
+        finally:
+            os.close(fd)
+        try:
+            return func(*args)
+        finally:
+            linux.setns(ofd, linux.CLONE_NEWNET)
+    finally:
+        os.close(ofd)
+
+
+def _tuntap_add(ifname, mode):
+    flags = (IFF_TAP if mode == "tap" else IFF_TUN) | IFF_NO_PI
+    fd = os.open("/dev/net/tun", os.O_RDWR)
+    try:
+        ifr = struct.pack("16sH22x", ifname.encode("utf-8"), flags)
+        fcntl.ioctl(fd, TUNSETIFF, ifr)
+        fcntl.ioctl(fd, TUNSETPERSIST, 1)
+    finally:
+        os.close(fd)
+
+
+class RtNetlink:
+    """An rtnetlink socket bound to a network namespace.
+
+    Methods raise `NetlinkError` if the kernel rejects a request.
+    """
+
+    def __init__(self, nspath=None, logger=None):
+        """Open a netlink socket.
+
+        Args:
+            nspath: path to the network namespace file (e.g., /proc/PID/ns/net),
+                if None the current network namespace is used.
+            logger: logger to use, if None the root logger is used.
+        """
+        self.nspath = nspath
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.sock = run_in_netns(
+            nspath,
+            socket.socket,
+            socket.AF_NETLINK,
+            socket.SOCK_RAW | socket.SOCK_CLOEXEC,
+            NETLINK_ROUTE,
+        )
+        self.sock.bind((0, 0))
+
+    def __str__(self):
+        return f"RtNetlink({self.nspath})"
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def request(self, mtype, flags, body, what):
+        """Send a request and return the list of `(type, payload)` replies.
+
+        Args:
+            mtype: netlink message type.
+            flags: netlink flags, NLM_F_REQUEST and NLM_F_ACK are always added.
+            body: the request payload.
+            what: a description of the request used in exceptions.
+
+        Raises:
+            NetlinkError: if the kernel returns an error for the request.
+        """
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+            flags |= NLM_F_REQUEST | NLM_F_ACK
+            hdr = struct.pack(
+                NLMSG_HDR_FMT, NLMSG_HDR_SIZE + len(body), mtype, flags, seq, 0
+            )
+            self.sock.send(hdr + body)
+            replies = []
+            while True:
+                data = self.sock.recv(1 << 16)
+                off = 0
+                while off + NLMSG_HDR_SIZE <= len(data):
+                    mlen, rtype, _, rseq, _ = struct.unpack_from(
+                        NLMSG_HDR_FMT, data, off
+                    )
+                    payload = data[off + NLMSG_HDR_SIZE : off + mlen]
+                    off += _align(mlen)
+                    if rseq != seq:
+                        continue
+                    if rtype == NLMSG_DONE:
+                        return replies
+                    if rtype == NLMSG_ERROR:
+                        (err,) = struct.unpack_from("=i", payload)
+                        if err:
+                            raise NetlinkError(-err, f"{what}: {os.strerror(-err)}")
+                        return replies
+                    replies.append((rtype, payload))
+
+    # -----
+    # Links
+    # -----
+
+    def get_link(self, ifname):
+        """Get a dict of `index`, `ifname`, `address`, `mtu` and `flags` for a link."""
+        body = _ifinfomsg() + _attr(IFLA_IFNAME, ifname)
+        for rtype, payload in self.request(RTM_GETLINK, 0, body, f"get {ifname}"):
+            if rtype == RTM_NEWLINK:
+                return _parse_link(payload)
+        raise NetlinkError(errno.ENODEV, f"get {ifname}: {os.strerror(errno.ENODEV)}")
+
+    def get_links(self):
+        """Get a dict of all links keyed by name, see `get_link`."""
+        links = {}
+        for rtype, payload in self.request(
+            RTM_GETLINK, NLM_F_DUMP, _ifinfomsg(), "dump links"
+        ):
+            if rtype == RTM_NEWLINK:
+                link = _parse_link(payload)
+                links[link.get("ifname")] = link
+        return links
+
+    def link_add(
+        self,
+        ifname,
+        kind,
+        mtu=None,
+        up=False,
+        master=None,
+        peer=None,
+        peer_netns=None,
+        peer_mtu=None,
+    ):
+        """Create a link.
+
+        Args:
+            ifname: name of the new link.
+            kind: type of link (e.g., "veth", "bridge", "dummy").
+            mtu: MTU of the link.
+            up: if True the link is set up.
+            master: name of the master (bridge) device of the link.
+            peer: name of the peer for a "veth" link.
+            peer_netns: path to the network namespace file for the peer.
+            peer_mtu: MTU of the peer. The peer can not be set up until after
+                it is created, see `link_set`.
+
+        Returns:
+            The new link, see `get_link`, using the kernel's echo of the request.
+        """
+        attrs = _attr(IFLA_IFNAME, ifname)
+        if mtu:
+            attrs += _attr(IFLA_MTU, int(mtu))
+        if master:
+            attrs += _attr(IFLA_MASTER, self.get_link(master)["index"])
+        data = b""
+        if peer:
+            pattrs = _attr(IFLA_IFNAME, peer)
+            if peer_mtu:
+                pattrs += _attr(IFLA_MTU, int(peer_mtu))
+            pfd = os.open(peer_netns, os.O_RDONLY) if peer_netns else None
+            if pfd is not None:
+                pattrs += _attr(IFLA_NET_NS_FD, pfd)
+            data = _attr(
+                IFLA_INFO_DATA,
+                _attr(VETH_INFO_PEER, _ifinfomsg() + pattrs),
+            )
+        else:
+            pfd = None
+        attrs += _attr(IFLA_LINKINFO, _attr(IFLA_INFO_KIND, kind) + data)
+        flags = IFF_UP if up else 0
+        try:
+            replies = self.request(
+                RTM_NEWLINK,
+                NLM_F_CREATE | NLM_F_EXCL | NLM_F_ECHO,
+                _ifinfomsg(0, flags, flags) + attrs,
+                f"add {kind} {ifname}",
+            )
+        finally:
+            if pfd is not None:
+                os.close(pfd)
+        for rtype, payload in replies:
+            if rtype == RTM_NEWLINK:
+                link = _parse_link(payload)
+                if link.get("ifname") == ifname:
+                    return link
+        # Older kernels do not echo new links
+        return self.get_link(ifname)
+
+    def link_set(self, ifname, mtu=None, up=None, master=None, name=None, netns=None):
+        """Change a link.
+
+        Args:
+            ifname: name of the link.
+            mtu: new MTU of the link.
+            up: if True set the link up, if False set it down.
+            master: name of the new master (bridge) device of the link.
+            name: new name of the link.
+            netns: path to the network namespace file to move the link to.
+        """
+        index = self.get_link(ifname)["index"]
+        attrs = b""
+        if mtu:
+            attrs += _attr(IFLA_MTU, int(mtu))
+        if master:
+            attrs += _attr(IFLA_MASTER, self.get_link(master)["index"])
+        if name:
+            attrs += _attr(IFLA_IFNAME, name)
+        fd = os.open(netns, os.O_RDONLY) if netns else None
+        if fd is not None:
+            attrs += _attr(IFLA_NET_NS_FD, fd)
+        flags = IFF_UP if up else 0
+        change = IFF_UP if up is not None else 0
+        try:
+            self.request(
+                RTM_NEWLINK,
+                0,
+                _ifinfomsg(index, flags, change) + attrs,
+                f"set {ifname}",
+            )
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def link_del(self, ifname):
+        """Delete a link."""
+        body = _ifinfomsg() + _attr(IFLA_IFNAME, ifname)
+        self.request(RTM_DELLINK, 0, body, f"delete {ifname}")
+
+    def tuntap_add(self, ifname, mode="tap"):
+        """Create a persistent tun or tap link (uses ioctl rather than netlink)."""
+        run_in_netns(self.nspath, _tuntap_add, ifname, mode)
+
+    # ---------
+    # Addresses
+    # ---------
+
+    def addr_add(self, ifname, ifaddr, peer=None):
+        """Add an address to a link.
+
+        Args:
+            ifname: name of the link.
+            ifaddr: the address and prefix length (e.g., "10.0.0.1/24").
+            peer: the network of the peer for a point-to-point address.
+        """
+        ifaddr = ipaddress.ip_interface(ifaddr)
+        family = socket.AF_INET if ifaddr.version == 4 else socket.AF_INET6
+        index = self.get_link(ifname)["index"]
+        if peer is not None:
+            peer = ipaddress.ip_network(peer)
+            plen, address = peer.prefixlen, peer.network_address
+        else:
+            plen, address = ifaddr.network.prefixlen, ifaddr.ip
+        body = struct.pack(IFADDRMSG_FMT, family, plen, 0, RT_SCOPE_UNIVERSE, index)
+        body += _attr(IFA_LOCAL, ifaddr.ip.packed)
+        body += _attr(IFA_ADDRESS, address.packed)
+        self.request(
+            RTM_NEWADDR,
+            NLM_F_CREATE | NLM_F_EXCL,
+            body,
+            f"add address {ifaddr} to {ifname}",
+        )
+
+    def addr_flush(self, ifname):
+        """Remove all the addresses from a link."""
+        index = self.get_link(ifname)["index"]
+        body = struct.pack(IFADDRMSG_FMT, socket.AF_UNSPEC, 0, 0, 0, 0)
+        for rtype, payload in self.request(RTM_GETADDR, NLM_F_DUMP, body, "dump addrs"):
+            if rtype != RTM_NEWADDR:
+                continue
+            if struct.unpack_from(IFADDRMSG_FMT, payload)[4] != index:
+                continue
+            self.request(RTM_DELADDR, 0, payload, f"delete address from {ifname}")
+
+    # ------
+    # Routes
+    # ------
+
+    def route_add(self, gateway, dst=None):
+        """Add a route, if `dst` is None a default route is added."""
+        gateway = ipaddress.ip_address(gateway)
+        family = socket.AF_INET if gateway.version == 4 else socket.AF_INET6
+        body = b""
+        dst_len = 0
+        if dst is not None:
+            dst = ipaddress.ip_network(dst)
+            dst_len = dst.prefixlen
+            body += _attr(RTA_DST, dst.network_address.packed)
+        body += _attr(RTA_GATEWAY, gateway.packed)
+        rtm = struct.pack(
+            RTMSG_FMT,
+            family,
+            dst_len,
+            0,
+            0,
+            RT_TABLE_MAIN,
+            RTPROT_BOOT,
+            RT_SCOPE_UNIVERSE,
+            RTN_UNICAST,
+            0,
+        )
+        self.request(
+            RTM_NEWROUTE,
+            NLM_F_CREATE | NLM_F_EXCL,
+            rtm + body,
+            f"add route {dst if dst else 'default'} via {gateway}",
+        )
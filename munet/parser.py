@@ -299,7 +299,11 @@ async def async_build_topology(
     pytestconfig=None,
     search_root=None,
     top_level_pidns=True,
+    wait_links=True,
 ):
+    # With `build-pipeline` links may still be being created when the build
+    # returns, this is only OK (i.e., `wait_links` False) if `Munet.run()` is called
+    # next as it waits for each node's links.
     if not rundir:
         rundir = tempfile.mkdtemp(prefix="unet")
     subprocess.run(f"mkdir -p {rundir} && chmod 755 {rundir}", check=True, shell=True)
@@ -355,7 +359,8 @@ async def async_build_topology(
     )
 
     try:
-        await unet._async_build(logger)  # pylint: disable=W0212
+        with unet.profiler.span("build"):
+            await unet._async_build(logger)  # pylint: disable=W0212
     except Exception as error:
         logging.critical("Failure building munet topology: %s", error, exc_info=True)
         await unet.async_delete()
@@ -369,6 +374,14 @@ async def async_build_topology(
         return unet
 
     dns_network = topoconf.get("dns-network")
+    if wait_links or dns_network:
+        # The hosts files need the addresses of all the nodes.
+        try:
+            await unet.async_wait_links()
+        except Exception as error:
+            logging.critical("Failure building munet topology: %s", error)
+            await unet.async_delete()
+            raise
     if dns_network:
         append_hosts_files(unet, dns_network)
 
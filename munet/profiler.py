@@ -0,0 +1,150 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""Record where munet spends time while building and deleting a topology.
+
+A span is a named wall-clock interval, optionally for a single node. Spans nest, and
+each span also counts the subprocesses started while it is active (including in
+nested spans). The current span is tracked using a context variable so that spans
+work with concurrent asyncio tasks and with work run on the munet thread pool (when
+run using `contextvars.copy_context().run`).
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import time
+
+from collections import defaultdict
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A named wall-clock interval."""
+
+    def __init__(self, name, node, parent, start):
+        self.name = name
+        self.node = node
+        self.parent = parent
+        self.start = start
+        self.end = None
+        self.subprocs = 0
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+
+def count_subprocess():
+    """Count a new subprocess in the current span and all the enclosing spans."""
+    span = current_span.get()
+    while span is not None:
+        span.subprocs += 1
+        span = span.parent
+
+
+class BuildProfiler:
+    """Collect timing spans for the phases of a munet build and delete.
+
+    When disabled `span()` does nothing so it can be used unconditionally.
+    """
+
+    def __init__(self, enabled=False, logger=None):
+        self.enabled = enabled
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.t0 = time.monotonic()
+        self.started = time.time()
+        self.spans = []
+
+    @contextlib.contextmanager
+    def span(self, name, node=None):
+        """Record a span for the duration of the `with` block.
+
+        Args:
+            name: name of the phase, e.g., "links".
+            node: name of the node (or other object) the span is for, if any.
+        """
+        if not self.enabled:
+            yield None
+            return
+        span = Span(name, node, current_span.get(), time.monotonic())
+        self.spans.append(span)
+        token = current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end = time.monotonic()
+            current_span.reset(token)
+
+    def get_report(self):
+        """Get the profile as a JSON serializable dict."""
+        phases = {}
+        for span in self.spans:
+            if span.name not in phases:
+                phases[span.name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "first-start": span.start - self.t0,
+                    "last-end": 0.0,
+                    "subprocesses": 0,
+                    "nodes": defaultdict(lambda: {"total": 0.0, "subprocesses": 0}),
+                }
+            phase = phases[span.name]
+            phase["count"] += 1
+            phase["total"] += span.duration
+            phase["last-end"] = max(phase["last-end"], span.start + span.duration)
+            phase["subprocesses"] += span.subprocs
+            if span.node is not None:
+                phase["nodes"][span.node]["total"] += span.duration
+                phase["nodes"][span.node]["subprocesses"] += span.subprocs
+        for phase in phases.values():
+            # Spans of a phase can run concurrently so wall time is not the total.
+            phase["last-end"] -= self.t0
+            phase["wall"] = phase["last-end"] - phase["first-start"]
+            phase["nodes"] = dict(phase["nodes"])
+        return {
+            "started": self.started,
+            "phases": phases,
+            "spans": [
+                {
+                    "name": x.name,
+                    "node": x.node,
+                    "parent": x.parent.name if x.parent else None,
+                    "start": x.start - self.t0,
+                    "duration": x.duration,
+                    "subprocesses": x.subprocs,
+                }
+                for x in self.spans
+            ],
+        }
+
+    def get_summary(self, top=10):
+        """Get a summary of the `top` slowest phases and spans as a string."""
+        report = self.get_report()
+        phases = sorted(report["phases"].items(), key=lambda x: -x[1]["wall"])
+        spans = sorted(report["spans"], key=lambda x: -x["duration"])
+        lines = [f"Slowest {top} phases (wall secs, total secs, count, subprocs):"]
+        for name, p in phases[:top]:
+            lines.append(
+                f"  {name:20} {p['wall']:9.3f} {p['total']:9.3f}"
+                f" {p['count']:6} {p['subprocesses']:6}"
+            )
+        lines.append(f"Slowest {top} spans (secs, subprocs):")
+        for s in spans[:top]:
+            name = f"{s['name']}({s['node']})" if s["node"] else s["name"]
+            lines.append(f"  {name:40} {s['duration']:9.3f} {s['subprocesses']:6}")
+        return "\n".join(lines)
+
+    def write(self, path, top=10):
+        """Write the profile to `path` as JSON and log the summary."""
+        if not self.enabled:
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.get_report(), f, indent=2)
+        self.logger.info("Wrote build profile to %s\n%s", path, self.get_summary(top))
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""Readiness probes for munet nodes.
+
+The probes are configured under the ``ready`` node config. A node is ready when all
+of its probes, and its ``ready-cmd`` if given, succeed. Probes which can wait for an
+event do so (a file being created or a log matching, using inotify), the others are
+retried with an exponential backoff.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import time
+
+from pathlib import Path
+
+from . import netlink
+from .watchlog import FileNotifier
+from .watchlog import WatchLog
+
+DEFAULT_TIMEOUT = 30
+
+
+class Backoff:
+    """An exponential backoff for retrying probes."""
+
+    def __init__(self, initial=0.05, maximum=1.0, factor=2):
+        self.delay = initial
+        self.maximum = maximum
+        self.factor = factor
+
+    async def sleep(self):
+        await asyncio.sleep(self.delay)
+        self.delay = min(self.delay * self.factor, self.maximum)
+
+
+def parse_tcp_addr(addr):
+    """Parse ``ADDR:PORT`` or ``[ADDR]:PORT`` into an ``(ip_address, port)`` tuple."""
+    host, sep, port = addr.rpartition(":")
+    if not sep:
+        raise ValueError(f"no port in TCP ready probe address '{addr}'")
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+    return ipaddress.ip_address(host), int(port)
+
+
+def node_path(node, path):
+    """Get the path usable by munet for a probe path of ``node``.
+
+    Relative paths are relative to the node's run directory and absolute paths are
+    in the node's mount namespace.
+    """
+    path = str(path).replace("%CONFIGDIR%", str(node.unet.config_dirname))
+    path = path.replace("%RUNDIR%", str(node.rundir))
+    path = path.replace("%NAME%", str(node.name))
+    if not os.path.isabs(path):
+        return Path(node.rundir).joinpath(path)
+    root_path = getattr(node, "root_path", None)
+    return Path(f"{root_path}{path}") if root_path else Path(path)
+
+
+async def _connect(node, family, address):
+    loop = asyncio.get_running_loop()
+    nspath = node.netns_path if family != socket.AF_UNIX or address[0] == "\0" else None
+    sock = netlink.run_in_netns(nspath, socket.socket, family, socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        await loop.sock_connect(sock, address)
+    finally:
+        sock.close()
+
+
+async def wait_tcp(node, addr):
+    """Wait until ``addr`` is connectable in the network namespace of ``node``."""
+    ip, port = parse_tcp_addr(addr)
+    family = socket.AF_INET6 if ip.version == 6 else socket.AF_INET
+    backoff = Backoff()
+    while True:
+        try:
+            await _connect(node, family, (str(ip), port))
+            return
+        except OSError as error:
+            logging.debug("%s: ready tcp %s: %s", node, addr, error)
+        await backoff.sleep()
+
+
+async def wait_unix(node, path):
+    """Wait until the unix socket ``path`` of ``node`` is connectable."""
+    if path.startswith("@"):
+        address = "\0" + path[1:]
+    else:
+        address = str(node_path(node, path))
+    backoff = Backoff()
+    while True:
+        try:
+            await _connect(node, socket.AF_UNIX, address)
+            return
+        except OSError as error:
+            logging.debug("%s: ready unix %s: %s", node, path, error)
+        await backoff.sleep()
+
+
+class ResetMarks:
+    """The state of the file and log probes of a node before it is reset.
+
+    After a reset, a file probe only succeeds for a file modified since the reset
+    started and a log probe only matches content logged since then. Otherwise
+    leftovers from before the reset would make the node ready straight away.
+    """
+
+    def __init__(self, node):
+        self.time = time.time()
+        # Creating the WatchLog snapshots the existing content.
+        self.logs = {
+            x["path"]: WatchLog(node_path(node, x["path"]))
+            for x in node.config.get("ready", {}).get("log", [])
+        }
+
+
+def _file_ready(fpath, since):
+    try:
+        return since is None or fpath.stat().st_mtime >= since
+    except FileNotFoundError:
+        return False
+
+
+async def wait_file(node, path, since=None):
+    """Wait until the file ``path`` of ``node`` exists.
+
+    If ``since`` is given the file must also have been modified at or after that
+    time.
+    """
+    fpath = node_path(node, path)
+    backoff = Backoff()
+    notifier = None
+    try:
+        while True:
+            if notifier is None and fpath.parent.exists():
+                notifier = FileNotifier.create(fpath)
+            if _file_ready(fpath, since):
+                return
+            logging.debug("%s: ready file %s: not present", node, path)
+            if notifier:
+                await notifier.async_wait(backoff.maximum * 2)
+            else:
+                await backoff.sleep()
+    finally:
+        if notifier:
+            notifier.close()
+
+
+async def wait_log(node, path, regex, wl=None):
+    """Wait until ``regex`` matches in the log file ``path`` of ``node``.
+
+    The whole log is searched unless ``wl``, a `WatchLog` of the log, is given in
+    which case only content since its last snapshot is searched.
+    """
+    if wl is None:
+        wl = WatchLog(node_path(node, path))
+        # Search from the start of the log
+        wl.reset()
+    while True:
+        try:
+            await wl.async_wait_for_match(regex, DEFAULT_TIMEOUT)
+            return
+        except TimeoutError:
+            logging.debug("%s: ready log %s: no match for '%s'", node, path, regex)
+
+
+async def wait_cmd(node):
+    """Wait until the ``ready-cmd`` of ``node`` succeeds."""
+    backoff = Backoff()
+    while not await node.async_ready_cmd():
+        logging.debug("Waiting for ready on: %s", node)
+        await backoff.sleep()
+
+
+def get_probes(node, marks=None):
+    """Get the awaitables for the readiness probes configured for ``node``.
+
+    Args:
+        node: the node to probe.
+        marks: the `ResetMarks` of the node if it is being reset.
+    """
+    rconfig = node.config.get("ready", {})
+    since = marks.time if marks else None
+    logs = marks.logs if marks else {}
+    probes = [wait_tcp(node, x) for x in rconfig.get("tcp", [])]
+    probes += [wait_unix(node, x) for x in rconfig.get("unix", [])]
+    probes += [wait_file(node, x, since) for x in rconfig.get("file", [])]
+    probes += [
+        wait_log(node, x["path"], x["regex"], logs.get(x["path"]))
+        for x in rconfig.get("log", [])
+    ]
+    if node.has_ready_cmd():
+        probes.append(wait_cmd(node))
+    return probes
+
+
+async def async_wait_ready(node, marks=None):
+    """Wait for all the readiness probes of ``node`` to succeed.
+
+    Args:
+        node: the node to wait on.
+        marks: the `ResetMarks` of the node if it is being reset, see `get_probes`.
+
+    Returns:
+        The number of seconds it took for the node to become ready.
+
+    Raises:
+        asyncio.TimeoutError: if the node is not ready within its ``timeout``.
+    """
+    timeout = node.config.get("ready", {}).get("timeout", DEFAULT_TIMEOUT)
+    start = time.monotonic()
+    probes = [asyncio.ensure_future(x) for x in get_probes(node, marks)]
+    try:
+        await asyncio.wait_for(asyncio.gather(*probes), timeout)
+    except asyncio.TimeoutError:
+        logging.warning("%s: timeout after %ss waiting for ready", node, timeout)
+        raise
+    finally:
+        for probe in probes:
+            probe.cancel()
+    return time.monotonic() - start
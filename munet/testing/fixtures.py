@@ -198,6 +198,7 @@ async def _unet_impl(
             unshare_inline=unshare,
             top_level_pidns=top_level_pidns,
             pytestconfig=_pytestconfig,
+            wait_links=False,
         )
     except Exception as error:
         logging.debug(
@@ -8,14 +8,30 @@
 """A module supporting an object for watching a logfile."""
 
 import asyncio
+import codecs
 import logging
+import os
 import re
+import select
 import time
 
 from pathlib import Path
 
+from . import linux
 from .base import Timeout
 
+# Seconds between checks when inotify is not available.
+POLL_INTERVAL = 0.25
+# Seconds between checks when using inotify, in case an event is missed.
+RECHECK_INTERVAL = 2.0
+# Default maximum number of characters of log content kept in memory.
+MAX_CONTENT = 16 * 1024 * 1024
+# Default number of characters before new content that are searched again for
+# matches that span updates.
+MATCH_OVERLAP = 4096
+# A numbered backreference or conditional group in a regular expression.
+NUMBERED_REF_RE = re.compile(r"\\[1-9]|\(\?\(\d")
+
 
 def _dbg(fmt, *args, **kwargs):
     logging.debug("watchlog: " + fmt, *args, **kwargs)
@@ -30,29 +46,154 @@ class MatchFoundError(Exception):
         super().__init__(watchlog, match)
 
 
-class WatchLog:
-    """An object for watching a logfile."""
+class FileNotifier:
+    """Wait for changes to a file using inotify.
+
+    The directory containing the file is watched rather than the file itself so
+    that the file being created, replaced or deleted is also noticed.
+    """
+
+    MASK = (
+        linux.IN_MODIFY
+        | linux.IN_CREATE
+        | linux.IN_DELETE
+        | linux.IN_MOVED_FROM
+        | linux.IN_MOVED_TO
+        | linux.IN_DELETE_SELF
+        | linux.IN_MOVE_SELF
+    )
+
+    def __init__(self, path):
+        path = Path(path)
+        self.name = os.fsencode(path.name)
+        self.fd = linux.inotify_init(linux.IN_NONBLOCK | linux.IN_CLOEXEC)
+        try:
+            linux.inotify_add_watch(self.fd, path.parent, self.MASK)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    @classmethod
+    def create(cls, path):
+        """Return a new notifier for `path` or None if inotify is not available."""
+        try:
+            return cls(path)
+        except (OSError, AttributeError) as error:
+            _dbg("%s inotify unavailable, polling: %s", path, error)
+            return None
+
+    def close(self):
+        if self.fd != -1:
+            os.close(self.fd)
+            self.fd = -1
+
+    def changed(self):
+        """Consume pending events, return True if any were for the file."""
+        changed = False
+        while events := linux.inotify_read(self.fd):
+            for _, mask, _, name in events:
+                if mask & (linux.IN_Q_OVERFLOW | linux.IN_IGNORED):
+                    changed = True
+                elif not name or name == self.name:
+                    # No name is an event for the directory itself.
+                    changed = True
+        return changed
+
+    def wait(self, timeout):
+        """Wait up to `timeout` seconds for the file to change.
+
+        Returns:
+            True if the file changed, False on timeout.
+        """
+        timeo = Timeout(timeout)
+        while True:
+            remaining = max(0, timeo.remaining())
+            if select.select([self.fd], [], [], remaining)[0] and self.changed():
+                return True
+            if timeo:
+                return False
 
-    def __init__(self, path, encoding="utf-8"):
+    async def async_wait(self, timeout):
+        """Wait up to `timeout` seconds for the file to change.
+
+        Returns:
+            True if the file changed, False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        timeo = Timeout(timeout)
+        event = asyncio.Event()
+        loop.add_reader(self.fd, event.set)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(event.wait(), max(0, timeo.remaining()))
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+                if self.changed():
+                    return True
+                if timeo:
+                    return False
+        finally:
+            loop.remove_reader(self.fd)
+
+
+class WatchLog:
+    """An object for watching a logfile.
+
+    Only new data is read from the logfile on each update, and at most
+    ``max_content`` characters of the most recent content are kept in memory.
+    Marks (see `set_mark()` and `snapshot()`) are offsets into all the content read
+    from the logfile so they remain valid as older content is discarded, however,
+    content from before the kept content is no longer returned.
+
+    Waiting for new content is event driven using inotify (see `FileNotifier`) when
+    available, otherwise the logfile is polled. Searches for a match only scan the
+    content that is new since the last search, along with the preceding
+    ``match_overlap`` characters to catch matches that span updates.
+    """
+
+    def __init__(
+        self,
+        path,
+        encoding="utf-8",
+        max_content=MAX_CONTENT,
+        match_overlap=MATCH_OVERLAP,
+    ):
         """Watch a logfile.
 
         Args:
             path: that path of the logfile to watch
             encoding: the encoding of the logfile
+            max_content: maximum number of characters of content to keep, or None
+                to keep all of it.
+            match_overlap: number of characters of previously searched content to
+                search again along with new content.
         """
         # Immutable
         self.path = Path(path)
         self.encoding = encoding
+        self.max_content = max_content
+        self.match_overlap = match_overlap
 
         # Mutable
         self.content = ""
+        self.content_base = 0
         self.last_snap_mark = 0
         self.last_user_mark = 0
         self.stat = None
+        self.offset = 0
+        self.ino = None
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
 
         if self.path.exists():
             self.snapshot()
 
+    @property
+    def content_end(self):
+        """The offset of the end of the content, i.e., the current mark."""
+        return self.content_base + len(self.content)
+
     def _stat_snapshot(self):
         ostat = self.stat
 
@@ -76,47 +217,81 @@ class WatchLog:
     def reset(self):
         self.stat = None
         self.content = ""
+        self.content_base = 0
         self.last_user_mark = 0
         self.last_snap_mark = 0
+        self.offset = 0
+        self.ino = None
+        self.decoder.reset()
+
+    def _add_content(self, newcontent):
+        self.content += newcontent
+        # Trim to max_content once it has been exceeded by half again so that the
+        # copying cost of trimming is amortized.
+        if self.max_content and len(self.content) > self.max_content * 3 // 2:
+            drop = len(self.content) - self.max_content
+            self.content = self.content[drop:]
+            self.content_base += drop
 
     def update_content(self):
-        ostat = self.stat
-        osize = ostat.st_size if ostat else 0
-        oino = ostat.st_ino if ostat else -1
         if not self._stat_snapshot():
             _dbg("%s no stat change", self.path)
             return ""
 
-        assert self.stat is not None
-        nino = self.stat.st_ino
+        stat = self.stat
+        if stat is None:
+            # The file was removed, keep the content in case it is recreated.
+            _dbg("%s removed", self.path)
+            return ""
+
         # If the inode changed and we had content previously warn
-        if oino != -1 and oino != nino and self.content:
+        if self.ino is not None and self.ino != stat.st_ino and self.offset:
             logging.warning(
                 "watchlog: %s replaced (new inode) resetting content", self.path
             )
             self.reset()
-            osize = 0
-
-        nsize = self.stat.st_size
-        if osize > nsize:
+            self.stat = stat
+        elif self.offset > stat.st_size:
             logging.warning("watchlog: %s shrunk resetting content", self.path)
             self.reset()
-            osize = 0
+            self.stat = stat
 
-        if osize == nsize:
-            _dbg("%s no update, osize == nsize == %s", self.path, osize)
+        nsize = stat.st_size
+        if self.offset == nsize:
+            _dbg("%s no update, size == %s", self.path, nsize)
             return ""
 
-        # Read non-blocking
-        with open(self.path, "r", encoding=self.encoding) as f:
-            if osize:
-                f.seek(osize)
-            _dbg("%s reading new content from %s to %s", self.path, osize, nsize)
-            newcontent = f.read(nsize - osize)
+        # Read only the new data
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            _dbg("%s reading new content from %s to %s", self.path, self.offset, nsize)
+            data = f.read(nsize - self.offset)
+        self.offset += len(data)
+        self.ino = stat.st_ino
 
-        self.content += newcontent
+        newcontent = self.decoder.decode(data)
+        self._add_content(newcontent)
         return newcontent
 
+    def search_from(self, cre, start, floor=0):
+        """Search the content from offset ``start`` (but not before ``floor``).
+
+        Args:
+            cre: the compiled regular expression to search for.
+            start: the offset to search from, as returned by a previous search.
+            floor: the offset to search from if the content has been reset.
+
+        Return:
+            (match, start): the match or None and the offset to start the next search
+            of the content from.
+        """
+        if start > self.content_end:
+            # The content was reset.
+            start = floor
+        start = max(start, floor, self.content_base)
+        m = cre.search(self.content, start - self.content_base)
+        return m, max(start, self.content_end - self.match_overlap)
+
     def raise_if_match_task(self, match):
         """Start an async task that searches for a match.
 
@@ -127,12 +302,22 @@ class WatchLog:
         async def scan_for_match(wl, regex):
             cre = re.compile(regex)
             _dbg("%s scan_for_match %s", wl.path, regex)
-            while True:
-                wl.update_content()
-                if m := cre.search(wl.content):
-                    _dbg("%s scan_for_match %s FOUND", wl.path, regex)
-                    raise MatchFoundError(wl, m)
-                await asyncio.sleep(2)
+            notifier = FileNotifier.create(wl.path)
+            start = 0
+            try:
+                while True:
+                    wl.update_content()
+                    m, start = wl.search_from(cre, start)
+                    if m:
+                        _dbg("%s scan_for_match %s FOUND", wl.path, regex)
+                        raise MatchFoundError(wl, m)
+                    if notifier:
+                        await notifier.async_wait(RECHECK_INTERVAL)
+                    else:
+                        await asyncio.sleep(2)
+            finally:
+                if notifier:
+                    notifier.close()
 
         aw = scan_for_match(self, match)
         return asyncio.create_task(aw)
@@ -141,16 +326,68 @@ class WatchLog:
         cre = re.compile(regex)
         timeo = Timeout(timeout)
         logging.debug("scanning %s for %s", self.path, regex)
-        while True:
-            content = self.peek_snapshot()
-            if m := cre.search(content):
-                logging.debug("found '%s' in %s", m.group(0), self.path)
-                return m
-            # Check timeo here so timeout=0 doesn't fail for existing data
-            if timeo:
-                break
-            _dbg("%s wait for '%s' remaining: %s", self.path, regex, timeo.remaining())
-            time.sleep(0.25)
+        # Create the notifier first so changes after checking the content are seen.
+        notifier = FileNotifier.create(self.path) if timeout else None
+        start = self.last_snap_mark
+        try:
+            while True:
+                self.update_content()
+                m, start = self.search_from(cre, start, self.last_snap_mark)
+                if m:
+                    logging.debug("found '%s' in %s", m.group(0), self.path)
+                    return m
+                # Check timeo here so timeout=0 doesn't fail for existing data
+                if timeo:
+                    break
+                remaining = timeo.remaining()
+                _dbg("%s wait for '%s' remaining: %s", self.path, regex, remaining)
+                if notifier:
+                    notifier.wait(min(remaining, RECHECK_INTERVAL))
+                else:
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            if notifier:
+                notifier.close()
+        raise TimeoutError(f"timeout waiting for {regex} in {self.path}")
+
+    async def async_wait_for_match(self, regex, timeout):
+        """Wait for `regex` to match content since the last snapshot.
+
+        This is the same as `wait_for_match()` but does not block the event loop.
+
+        Args:
+            regex: the regular expression to search for.
+            timeout: seconds to wait for the match.
+
+        Return:
+            The match object.
+
+        Raises:
+            TimeoutError: if no match is found within `timeout` seconds.
+        """
+        cre = re.compile(regex)
+        timeo = Timeout(timeout)
+        logging.debug("scanning %s for %s", self.path, regex)
+        notifier = FileNotifier.create(self.path) if timeout else None
+        start = self.last_snap_mark
+        try:
+            while True:
+                self.update_content()
+                m, start = self.search_from(cre, start, self.last_snap_mark)
+                if m:
+                    logging.debug("found '%s' in %s", m.group(0), self.path)
+                    return m
+                if timeo:
+                    break
+                remaining = timeo.remaining()
+                _dbg("%s wait for '%s' remaining: %s", self.path, regex, remaining)
+                if notifier:
+                    await notifier.async_wait(min(remaining, RECHECK_INTERVAL))
+                else:
+                    await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            if notifier:
+                notifier.close()
         raise TimeoutError(f"timeout waiting for {regex} in {self.path}")
 
     def from_mark(self, mark=None):
@@ -160,6 +397,9 @@ class WatchLog:
 
         If the file has been replaced (inode changes) then the marks will reset to 0.
 
+        If the content at ``mark`` has been discarded (see ``max_content``) then the
+        content starting from the oldest kept content is returned.
+
         Args:
             mark: the mark in the content to return file content from.
 
@@ -168,12 +408,12 @@ class WatchLog:
         """
         if mark is None:
             mark = self.last_user_mark
-        return self.content[mark:]
+        return self.content[max(0, mark - self.content_base) :]
 
     def set_mark(self):
         """Set a mark for later use."""
         last_mark = self.last_user_mark
-        self.last_user_mark = len(self.content)
+        self.last_user_mark = self.content_end
         return last_mark
 
     def snapshot(self, update=True):
@@ -190,8 +430,8 @@ class WatchLog:
             self.update_content()
 
         last_mark = self.last_snap_mark
-        self.last_snap_mark = len(self.content)
-        return self.content[last_mark:]
+        self.last_snap_mark = self.content_end
+        return self.from_mark(last_mark)
 
     def peek_snapshot(self, update=True):
         """Same as ``snapshot()`` but does not create a new snapshot."""
@@ -200,3 +440,257 @@ class WatchLog:
         return self.from_mark(self.last_snap_mark)
 
     snapshot_refresh = peek_snapshot
+
+
+class LogSubscription:
+    """A regular expression to search a watched logfile for."""
+
+    def __init__(self, watchlog, regex, callback, once, name):
+        self.watchlog = watchlog
+        self.regex = regex
+        self.cre = re.compile(regex)
+        self.callback = callback
+        self.once = once
+        self.name = name
+        # Matches ending at or before this content offset have been dispatched.
+        self.seen = 0
+
+
+class LogScanner:
+    """Scan many watched logfiles for many regular expressions using a single task.
+
+    Each logfile is read once per change (using a single inotify instance for all
+    the logfiles when available), and all the regular expressions subscribed for a
+    logfile are searched for in one pass using an alternation of named groups. For
+    each match the subscriber's callback is called with the `WatchLog` and the
+    match.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.subs = {}
+        self.combined = {}
+        self.next_id = 0
+        self.task = None
+        self.wakeup = None
+        self.changed = set()
+        self.notify_fd = -1
+        self.watches = {}
+        self.dirs = {}
+
+    def subscribe(self, watchlog, regex, callback, once=False):
+        """Call ``callback(watchlog, match)`` for each match of ``regex``.
+
+        The existing content of ``watchlog`` is searched immediately, after that
+        only new content is searched.
+
+        Args:
+            watchlog: the `WatchLog` to search.
+            regex: the regular expression to search for.
+            callback: called with the `WatchLog` and the match object.
+            once: if True unsubscribe after the first match.
+
+        Return:
+            The `LogSubscription` to pass to `unsubscribe()`.
+        """
+        sub = LogSubscription(watchlog, regex, callback, once, f"_ls{self.next_id}")
+        self.next_id += 1
+
+        watchlog.update_content()
+        pos = 0
+        while m := sub.cre.search(watchlog.content, pos):
+            self._dispatch(sub, m)
+            if once:
+                return sub
+            pos = max(m.end(), m.start() + 1)
+        sub.seen = watchlog.content_end
+
+        self.subs.setdefault(watchlog, []).append(sub)
+        self._compile(watchlog)
+        self._add_notify(watchlog.path)
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run(), name="log-scanner")
+        return sub
+
+    def unsubscribe(self, sub):
+        subs = self.subs.get(sub.watchlog, [])
+        if sub in subs:
+            subs.remove(sub)
+            if subs:
+                self._compile(sub.watchlog)
+            else:
+                del self.subs[sub.watchlog]
+                del self.combined[sub.watchlog]
+
+    def watch_for(self, watchlog, regex):
+        """Return a future that fails with `MatchFoundError` when ``regex`` matches.
+
+        Cancelling the future unsubscribes it.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def found(wl, m):
+            if not future.done():
+                future.set_exception(MatchFoundError(wl, m))
+
+        sub = self.subscribe(watchlog, regex, found, once=True)
+        future.add_done_callback(lambda _: self.unsubscribe(sub))
+        return future
+
+    def _compile(self, watchlog):
+        subs = self.subs[watchlog]
+        if any(NUMBERED_REF_RE.search(x.regex) for x in subs):
+            # Combining renumbers the groups so numbered references would break.
+            _dbg("%s numbered group reference, not combining", watchlog.path)
+            self.combined[watchlog] = None
+            return
+        regex = "|".join(f"(?P<{x.name}>{x.regex})" for x in subs)
+        try:
+            self.combined[watchlog] = re.compile(regex)
+        except re.error as error:
+            # E.g., a regex using global inline flags, search each individually.
+            _dbg("%s combined regex failed, not combining: %s", watchlog.path, error)
+            self.combined[watchlog] = None
+
+    def _dispatch(self, sub, m):
+        if sub.once:
+            self.unsubscribe(sub)
+        try:
+            sub.callback(sub.watchlog, m)
+        except Exception as error:
+            self.logger.warning(
+                "%s: error in match callback for %s: %s",
+                sub.watchlog.path,
+                sub.regex,
+                error,
+                exc_info=True,
+            )
+
+    def scan(self, watchlog):
+        """Read new content from ``watchlog`` and dispatch any matches."""
+        watchlog.update_content()
+        subs = self.subs.get(watchlog)
+        if not subs:
+            return
+
+        base = watchlog.content_base
+        content = watchlog.content
+        end = watchlog.content_end
+        for sub in subs:
+            if sub.seen > end:
+                # The content was reset.
+                sub.seen = 0
+        start = min(x.seen for x in subs) - watchlog.match_overlap
+        pos = max(start, base) - base
+
+        def dispatch_new(sub, m):
+            if base + m.end() > sub.seen:
+                self._dispatch(sub, m)
+
+        cre = self.combined[watchlog]
+        if cre is None:
+            for sub in list(subs):
+                p = pos
+                while m := sub.cre.search(content, p):
+                    dispatch_new(sub, m)
+                    if sub.once and sub not in subs:
+                        break
+                    p = max(m.end(), m.start() + 1)
+        else:
+            # The alternation only finds one match at a position, so check all the
+            # subscribers there.
+            next_pos = {}
+            while m := cre.search(content, pos):
+                p = m.start()
+                for sub in list(subs):
+                    if p < next_pos.get(sub, 0):
+                        continue
+                    if sm := sub.cre.match(content, p):
+                        next_pos[sub] = max(sm.end(), p + 1)
+                        dispatch_new(sub, sm)
+                if watchlog not in self.combined:
+                    break
+                cre = self.combined[watchlog]
+                pos = p + 1
+
+        for sub in subs:
+            sub.seen = end
+
+    def _add_notify(self, path):
+        if self.notify_fd == -1:
+            try:
+                self.notify_fd = linux.inotify_init(
+                    linux.IN_NONBLOCK | linux.IN_CLOEXEC
+                )
+            except (OSError, AttributeError) as error:
+                _dbg("inotify unavailable, polling: %s", error)
+                self.notify_fd = -2
+                return
+            loop = asyncio.get_running_loop()
+            loop.add_reader(self.notify_fd, self._read_notify)
+        if self.notify_fd < 0 or path.parent in self.dirs:
+            return
+        try:
+            wd = linux.inotify_add_watch(self.notify_fd, path.parent, FileNotifier.MASK)
+        except OSError as error:
+            _dbg("%s: inotify watch failed, polling: %s", path, error)
+            return
+        self.dirs[path.parent] = wd
+        self.watches[wd] = path.parent
+
+    def _read_notify(self):
+        for wd, mask, _, name in linux.inotify_read(self.notify_fd):
+            if mask & linux.IN_Q_OVERFLOW:
+                self.changed.update(self.subs)
+            elif mask & linux.IN_IGNORED:
+                # The directory is gone, rescan its logs and stop watching it.
+                if (dpath := self.watches.pop(wd, None)) is not None:
+                    del self.dirs[dpath]
+                    self.changed.update(x for x in self.subs if x.path.parent == dpath)
+            elif (dpath := self.watches.get(wd)) is not None:
+                path = dpath.joinpath(os.fsdecode(name)) if name else None
+                self.changed.update(
+                    x for x in self.subs if path is None or x.path == path
+                )
+        if self.changed:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), RECHECK_INTERVAL)
+                changed = self.changed
+            except asyncio.TimeoutError:
+                # Check everything in case an event was missed (or no inotify).
+                changed = set(self.subs)
+            self.wakeup.clear()
+            self.changed = set()
+            for watchlog in changed:
+                if watchlog not in self.subs:
+                    continue
+                # Keep scanning the other logs, e.g., if this one was just rotated.
+                try:
+                    self.scan(watchlog)
+                except Exception as error:
+                    self.logger.warning(
+                        "%s: error scanning log: %s",
+                        watchlog.path,
+                        error,
+                        exc_info=not isinstance(error, OSError),
+                    )
+
+    def close(self):
+        """Stop scanning and release resources."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.notify_fd >= 0:
+            try:
+                asyncio.get_running_loop().remove_reader(self.notify_fd)
+            except RuntimeError:
+                pass
+            os.close(self.notify_fd)
+        self.notify_fd = -1
+        self.watches = {}
+        self.dirs = {}
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of batched ip and tc commands."
+
+import pytest
+
+from munet.base import BatchCmdError
+from munet.base import CmdBatch
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+
+async def test_topology(unet_unshare):
+    unet = unet_unshare
+    r1 = unet.hosts["r1"]
+    o = r1.cmd_raises("ip addr show dev eth0")
+    assert "mtu 4500" in o
+    assert "10.0.1.1/24" in o
+    assert "fc00:0:0:1::1/64" in o
+    o = r1.cmd_raises("ip addr show dev eth1")
+    assert "mtu 9000" in o
+    assert "10.254.1.0/31" in o
+    assert "tbf" in r1.cmd_raises("tc qdisc show dev eth1")
+
+    r2 = unet.hosts["r2"]
+    assert "mtu 9000" in r2.cmd_raises("ip link show dev eth1")
+
+
+async def test_ip_batch(unet_unshare):
+    r1 = unet_unshare.hosts["r1"]
+    with r1.ip_batch() as b:
+        b.add("ip link add name veth0 type veth peer name veth1")
+        b.add(["link", "set", "veth0", "mtu", "1400"])
+        b.add("link set veth0 up")
+        b.add("addr add 10.10.0.1/24 dev veth0")
+        b.add("addr add fc10::1/64 dev veth0")
+        assert len(b) == 5
+
+    o = r1.cmd_raises("ip addr show dev veth0")
+    assert "mtu 1400" in o
+    assert "10.10.0.1/24" in o
+    assert "fc10::1/64" in o
+
+    # Options are not allowed in batch lines
+    with pytest.raises(ValueError):
+        with r1.ip_batch() as b:
+            b.add("ip -6 addr add fc10::2/64 dev veth0")
+
+
+async def test_ip_batch_error(unet_unshare):
+    r1 = unet_unshare.hosts["r1"]
+    with r1.ip_batch() as b:
+        b.add("link delete nonexistent0", ignore_error=True)
+        b.add("link add name vetha type veth peer name vethap")
+
+    with pytest.raises(BatchCmdError) as excinfo:
+        with r1.ip_batch() as b:
+            b.add("link add name vethb type veth peer name vethbp")
+            b.add("link set nonexistent0 up")
+            b.add("link set vethb up")
+    assert excinfo.value.failed == [(2, "link set nonexistent0 up")]
+    assert "failed line 2" in str(excinfo.value)
+    # Commands after the failure are still run
+    assert "UP" in r1.cmd_raises("ip link show vethb")
+
+    b = CmdBatch(r1, "ip")
+    b.add("link set nonexistent0 up")
+    rc, _, _ = b.flush(raises=False)
+    assert rc != 0
+
+
+async def test_tc_batch(unet_unshare):
+    r1 = unet_unshare.hosts["r1"]
+    with r1.tc_batch() as b:
+        b.add(
+            "tc qdisc add dev vetha root handle 1: tbf rate 1mbit burst 32kbit latency 400ms"
+        )
+    assert "rate 1Mbit" in r1.cmd_raises("tc qdisc show dev vetha")
+
+    b = CmdBatch(r1, "tc")
+    b.add("qdisc del dev vetha root")
+    rc, _, _ = await b.async_flush()
+    assert rc == 0
+    assert "tbf" not in r1.cmd_raises("tc qdisc show dev vetha")
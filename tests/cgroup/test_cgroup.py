@@ -0,0 +1,140 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of tracking munet processes using cgroups."
+
+import os
+import subprocess
+import time
+
+import pytest
+
+from munet.cgroup import CGROUP_FILE
+from munet import cgroup
+from munet.cgroup import CGroup
+from munet.cgroup import delegate_controllers
+from munet.cgroup import get_delegatable_controllers
+from munet.cgroup import read_rundir_cgroup
+from munet.cgroup import write_rundir_cgroup
+from munet.cleanup import cleanup_previous
+from munet.cleanup import is_running_in_rundir
+
+
+def get_test_cgroup():
+    cg = CGroup.create_topology()
+    if cg is None:
+        pytest.skip("cgroup v2 not available")
+    return cg
+
+
+def wait_pid(cg, pid, recursive=True):
+    """Wait for `pid` to move itself into `cg`, see `CGroup.get_enter_cmd`."""
+    for _ in range(50):
+        if pid in cg.get_pids(recursive):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_cgroup_kill(tmp_path):
+    cg = get_test_cgroup()
+    child = cg.child("node")
+    p = subprocess.Popen(child.get_enter_cmd() + ["sleep", "30"])
+    try:
+        assert wait_pid(cg, p.pid)
+        assert cg.get_pids() == [p.pid]
+        assert cg.populated
+        assert "usage_usec" in child.get_stats()
+
+        write_rundir_cgroup(tmp_path, cg)
+        assert is_running_in_rundir(tmp_path)
+        cleanup_previous(tmp_path)
+        assert p.wait(timeout=5) == -9
+        assert not cg.path.exists()
+        assert not is_running_in_rundir(tmp_path)
+    finally:
+        p.kill()
+        p.wait()
+        cg.kill_and_remove()
+
+
+def test_rundir_cgroup_checked(tmp_path):
+    """Only munet topology cgroups recorded in a rundir are used."""
+    cg = get_test_cgroup()
+    try:
+        write_rundir_cgroup(tmp_path, cg)
+        assert read_rundir_cgroup(tmp_path).path == cg.path
+
+        # A node cgroup, the cgroup munet runs in, or a path outside of the
+        # cgroup hierarchy are never killed.
+        for path in (cg.child("node").path, cg.path.parent, "/tmp", "/"):
+            tmp_path.joinpath(CGROUP_FILE).write_text(f"{path}\n", encoding="ascii")
+            assert read_rundir_cgroup(tmp_path) is None
+        fake = cg.path.parent / ".." / cg.path.parent.name / "munet-1-1"
+        tmp_path.joinpath(CGROUP_FILE).write_text(f"{fake}\n", encoding="ascii")
+        assert read_rundir_cgroup(tmp_path) is None
+    finally:
+        cg.kill_and_remove()
+
+
+def test_delegate_controllers(tmp_path, monkeypatch):
+    """Munet moves itself into a leaf cgroup to delegate the controllers."""
+
+    def enable_controllers(self, controllers):
+        # Unlike the kernel, the written file isn't the set of enabled controllers.
+        path = self.path / "cgroup.subtree_control"
+        path.write_text(" ".join(path.read_text().split() + list(controllers)))
+        return controllers
+
+    monkeypatch.setattr(cgroup, "_our_cgroup_path", tmp_path)
+    monkeypatch.setattr(CGroup, "enable_controllers", enable_controllers)
+    tmp_path.joinpath("cgroup.controllers").write_text("cpu memory hugetlb\n")
+    tmp_path.joinpath("cgroup.subtree_control").write_text("cpu\n")
+    procs = tmp_path.joinpath("cgroup.procs")
+
+    # Another process keeps the controllers from being enabled.
+    procs.write_text(f"{os.getpid()}\n1\n")
+    assert get_delegatable_controllers() == ["cpu"]
+    assert delegate_controllers() == ["cpu"]
+    assert not list(tmp_path.glob("munet-main-*"))
+
+    procs.write_text(f"{os.getpid()}\n1\n")
+    assert get_delegatable_controllers(pids=[1]) == ["cpu", "memory"]
+    tmp_path.joinpath("munet-main-1").mkdir()
+    assert delegate_controllers(pids=[1]) == ["cpu", "memory"]
+    assert tmp_path.joinpath("cgroup.subtree_control").read_text() == "cpu memory"
+    leaf = tmp_path / f"munet-main-{os.getpid()}"
+    assert leaf.joinpath("cgroup.procs").read_text() == "1"
+    assert not tmp_path.joinpath("munet-main-1").exists()
+
+
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_topology_cgroup(unet_unshare):
+    unet = unet_unshare
+    tcg = unet.cgroup_topology
+    if tcg is None:
+        pytest.skip("cgroup v2 not available")
+    r1 = unet.hosts["r1"]
+    r2 = unet.hosts["r2"]
+
+    assert unet.rundir.joinpath("cgroup").read_text().strip() == str(tcg.path)
+    assert unet.cgroup.path == tcg.path.joinpath("munet")
+    assert r1.cgroup.path == tcg.path.joinpath("r1")
+    assert r2.cgroup.path == tcg.path.joinpath("r2")
+
+    # The node's namespace and `cmd` processes are in its cgroup.
+    assert r1.p.pid in r1.cgroup.get_pids()
+    assert r1.cmd_p.pid in r1.cgroup.get_pids()
+
+    p = r2.popen(["sleep", "30"])
+    try:
+        assert wait_pid(r2.cgroup, p.pid, recursive=False)
+        assert p.pid in tcg.get_pids()
+    finally:
+        p.kill()
+        p.wait()
+    assert r2.cgroup.get_stats()["usage_usec"] > 0
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of concurrent node creation."
+
+import pytest
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_build_order(unet_unshare):
+    unet = unet_unshare
+    assert unet.build_concurrency == 4
+    assert unet.thread_pool is not None
+
+    # Nodes are added in config order with ordinals allocated in config order
+    assert list(unet.hosts) == ["r1", "r2", "r3", "r4", "r5", "r6"]
+    ids = [unet.hosts[x].id for x in ("r1", "r2", "r4", "r5", "r6")]
+    assert ids == list(range(ids[0], ids[0] + 5))
+    assert unet.hosts["r3"].id == 100
+
+
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_nodes_running(unet_unshare):
+    unet = unet_unshare
+    unet_pidns = unet.cmd_raises("readlink /proc/self/ns/pid").strip()
+    netns = set()
+    for host in unet.hosts.values():
+        assert host.p.poll() is None, f"{host} namespace process exited"
+
+        # Each node has it's own namespaces created from the unet PID namespace
+        assert len(host.pids) == len(unet.pids)
+        netns.add(host.cmd_raises("readlink /proc/self/ns/net").strip())
+        assert host.cmd_raises("readlink /proc/self/ns/pid").strip() != unet_pidns
+
+        o = host.cmd_raises("ip -o addr show dev eth0")
+        assert f" {host.get_intf_addr('eth0').ip}/" in o
+    assert len(netns) == len(unet.hosts)
+
+
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_links(unet_unshare):
+    unet = unet_unshare
+
+    # Interface names are allocated in config order, not creation order
+    assert sorted(unet.links.values()) == sorted(
+        [("net0", f"net0-e{i}", f"r{i + 1}", "eth0") for i in range(6)]
+        + [("r1", "eth1", "r6", "eth1")]
+    )
+
+    r1, r6 = unet.hosts["r1"], unet.hosts["r6"]
+    o = r1.cmd_raises("ip -o addr show dev eth1")
+    assert f" {r1.get_intf_addr('eth1').ip}/" in o
+    o = r6.cmd_raises("ip -o addr show dev eth1")
+    assert f" {r6.get_intf_addr('eth1').ip}/" in o
+    o = unet.cmd_raises("ip -o link show master net0")
+    assert len(o.splitlines()) == 6
@@ -52,3 +52,20 @@ async def test_container_mounts(unet):
     await unet.hosts["r2"].async_cmd_raises("echo foobaz > /mybind/foobar.txt")
     o = await unet.hosts["r2"].async_cmd_raises("cat /mybind/foobar.txt")
     assert o == "foobaz\n"
+
+
+async def test_container_direct_exec(unet):
+    r2 = unet.hosts["r2"]
+    r3 = unet.hosts["r3"]
+    assert r3.get_direct_exec_cmd() is not None
+
+    # Commands run in the container's namespaces and environment.
+    assert (await r3.async_cmd_raises("hostname")).strip() == "r3"
+    assert (await r3.async_cmd_raises("echo $MYVAR")).strip() == "direct"
+    assert (await r3.async_cmd_raises("echo $MUNET_NODENAME")).strip() == "r3"
+    os_release = await r2.async_cmd_raises("cat /etc/os-release")
+    assert await r3.async_cmd_raises("cat /etc/os-release") == os_release
+
+    # Processes see the container's PID namespace.
+    o = await r3.async_cmd_raises("cat /proc/1/cmdline")
+    assert "tail" in o or "init" in o or "catatonit" in o
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the asyncio native expect engine and AsyncShellWrapper."
+
+import asyncio
+import os
+import socket
+import subprocess
+import time
+
+import pytest
+
+from munet.aioexpect import ExpectEOF
+from munet.aioexpect import ExpectTimeout
+from munet.aioexpect import create_process_spawn
+from munet.base import CalledProcessError
+from munet.base import commander
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+PROMPT = r"(^|\r?\n)[^#\$]*[#\$] "
+
+
+async def test_expect():
+    p = await create_process_spawn(
+        ["/bin/sh", "-c", "echo one; sleep 0.2; echo two three; exec cat"]
+    )
+    try:
+        assert await p.expect(["three", "one"]) == 1
+        assert p.before == ""
+        assert await p.expect([r"t(\w+)", "three"]) == 0
+        assert p.match.group(1) == "wo"
+        with pytest.raises(ExpectTimeout):
+            await p.expect("four", timeout=0.2)
+        p.sendline("five")
+        assert await p.expect("five") == 0
+        # The process is in its own session, away from our terminal.
+        assert os.getsid(p.proc.pid) == p.proc.pid
+        p.writer.close()
+        with pytest.raises(ExpectEOF):
+            await p.expect("six")
+    finally:
+        await p.close()
+
+
+@pytest.mark.parametrize("mode", ["pty", "piped"])
+@pytest.mark.parametrize("shellcmd", ["/bin/bash", "/bin/dash"])
+async def test_async_shell(mode, shellcmd):
+    if not os.path.exists(shellcmd):
+        pytest.skip(f"{shellcmd} not installed skipping")
+    use_pty = mode == "pty"
+    cmd = [shellcmd] if use_pty else [shellcmd, "-si"]
+    repl = await commander.async_shell_spawn(cmd, PROMPT, use_pty=use_pty, timeout=10)
+    try:
+        assert await repl.cmd_status("echo foo") == (0, "foo")
+        assert await repl.cmd_status("echo bar; false") == (1, "bar")
+        assert await repl.cmd_raises("for x in a b; do\n  echo $x\ndone") == "a\nb"
+        with pytest.raises(CalledProcessError):
+            await repl.cmd_raises("exit_code=3; (exit $exit_code)")
+        results = await repl.cmds_status(["echo one", "if then fi", "echo two"])
+        assert results[0] == (0, "one")
+        assert results[1][0] != 0
+        assert results[2] == (0, "two")
+
+        repl.framed = False
+        assert await repl.cmd_status("echo bar; false") == (1, "bar")
+    finally:
+        await repl.close()
+
+
+async def test_async_shell_concurrent():
+    """Commands on several shells run concurrently without blocking the loop."""
+    repls = [
+        await commander.async_shell_spawn(["/bin/sh", "-si"], PROMPT, timeout=10)
+        for _ in range(4)
+    ]
+    try:
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *[x.cmd_status("sleep 1; echo done") for x in repls]
+        )
+        assert time.monotonic() - start < 3
+        assert results == [(0, "done")] * 4
+    finally:
+        for repl in repls:
+            await repl.close()
+
+
+async def test_async_shell_socket():
+    """A shell behind a UNIX socket (e.g., a VM console) can be driven."""
+    ours, theirs = socket.socketpair()
+    with theirs:
+        proc = subprocess.Popen(
+            ["/bin/sh", "-si"], stdin=theirs, stdout=theirs, stderr=theirs
+        )
+    try:
+        repl = await commander.async_shell_spawn(ours, PROMPT, timeout=10)
+        assert await repl.cmd_status("echo sock; false") == (1, "sock")
+        await repl.close()
+    finally:
+        proc.kill()
+        proc.wait()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of framed (single round-trip) shell REPL commands."
+
+import os
+
+import pytest
+
+from munet.base import commander
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.mark.parametrize("mode", ["pty", "piped"])
+@pytest.mark.parametrize("shellcmd", ["/bin/bash", "/bin/dash"])
+async def test_framed_cmds(mode, shellcmd):
+    if not os.path.exists(shellcmd):
+        pytest.skip(f"{shellcmd} not installed skipping")
+    use_pty = mode == "pty"
+    cmd = [shellcmd] if use_pty else [shellcmd, "-si"]
+    prompt = r"(^|\r?\n)[^#\$]*[#\$] "
+    repl = await commander.shell_spawn(cmd, prompt, use_pty=use_pty, timeout=10)
+    try:
+        assert repl.framed
+
+        assert repl.cmd_status("echo foo") == (0, "foo")
+        assert repl.cmd_status("echo bar; false") == (1, "bar")
+        assert repl.cmd_status("printf nonl; (exit 7)") == (7, "nonl")
+        assert repl.cmd_status("for x in a b; do\n  echo $x\ndone") == (0, "a\nb")
+        assert repl.cmd_status("cat <<EOF\nline1\nline2\nEOF") == (0, "line1\nline2")
+        assert repl.cmd_status("") == (0, "")
+        assert repl.cmd_status("# just a comment") == (0, "")
+
+        # State is kept in the shell between commands.
+        repl.cmd_raises("FRAMED_V=42; cd /tmp")
+        assert repl.cmd_raises("echo $FRAMED_V; pwd") == "42\n/tmp"
+
+        # A syntax error is reported and the shell stays usable.
+        rc, _ = repl.cmd_status("if then fi")
+        assert rc != 0
+        assert repl.cmd_status("echo after") == (0, "after")
+
+        results = repl.cmds_status(
+            ["echo one", "echo two >&2; exit_code=3; (exit $exit_code)", "echo three"]
+        )
+        assert [x[0] for x in results] == [0, 3, 0]
+        assert results[0][1] == "one"
+        assert results[2][1] == "three"
+
+        results = repl.cmds_status(["echo a", "if then fi", "echo b"])
+        assert results[0] == (0, "a")
+        assert results[1][0] != 0
+        assert results[2] == (0, "b")
+
+        # The unframed (two round-trip) path gives the same results.
+        repl.framed = False
+        assert repl.cmd_status("echo bar; false") == (1, "bar")
+        assert repl.cmds_status(["echo one", "true"]) == [(0, "one"), (0, "")]
+    finally:
+        repl.child.kill(9)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the persistent namespace command executor."
+
+import asyncio
+import os
+import subprocess
+
+import pytest
+
+from munet.muexec import Executor
+
+
+@pytest.fixture(name="executor")
+def fixture_executor():
+    executor = Executor("test")
+    p = subprocess.Popen(executor.get_cmd(), pass_fds=(executor.child_fd,))
+    executor.started(p)
+    yield executor
+    executor.close()
+    p.wait(timeout=5)
+
+
+def test_executor_run(executor):
+    r, o, e = executor.run(["echo", "foo"])
+    assert r.returncode == 0
+    assert o == b"foo\n"
+    assert e == b""
+
+    r, o, e = executor.run(["/bin/bash", "-c", "echo bar >&2; exit 3"])
+    assert r.returncode == 3
+    assert o == b""
+    assert e == b"bar\n"
+
+    r, o, e = executor.run(["/bin/bash", "-c", "echo bar >&2"], stderr_to_stdout=True)
+    assert o == b"bar\n"
+
+    r, o, e = executor.run(["cat"], stdin=b"input data")
+    assert o == b"input data"
+
+    r, o, e = executor.run(["pwd"], cwd="/tmp")
+    assert o == b"/tmp\n"
+
+    r, o, e = executor.run(["printenv", "FOO"], env={**os.environ, "FOO": "baz"})
+    assert o == b"baz\n"
+
+    r, o, e = executor.run(["/nonexistent-binary"])
+    assert r.returncode == 127
+    assert b"failed to execute" in e
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        executor.run(["sleep", "10"], timeout=0.5)
+
+
+async def test_executor_async_run(executor):
+    results = await asyncio.gather(
+        *[
+            executor.async_run(["/bin/bash", "-c", f"sleep 1; echo {i}"])
+            for i in range(8)
+        ]
+    )
+    # Concurrent, so should take about 1 second total
+    for i, (r, o, _) in enumerate(results):
+        assert r.returncode == 0
+        assert o == f"{i}\n".encode()
+
+
+def test_executor_close(executor):
+    p = executor.p
+    executor.close()
+    assert p.wait(timeout=5) == 0
+    assert not executor.running
+
+
+@pytest.mark.parametrize("unet", [True, False], indirect=["unet"])
+async def test_executor_topology(unet):
+    for host in ("r1", "r2"):
+        node = unet.hosts[host]
+        assert node.executor is not None and node.executor.running
+
+        o = node.cmd_raises("echo Foobar")
+        assert o == "Foobar\n"
+
+        rc, o, e = node.cmd_status("ls ajfipoasdjiopa", warn=False)
+        assert rc == 2
+        assert "No such file or directory" in e
+
+        rc, o, e = await node.async_cmd_status("pwd")
+        assert o.strip() == str(node.rundir)
+
+        o = node.cmd_raises_nsonly("hostname")
+        assert o.strip() == host
+
+    o = unet.hosts["r1"].cmd_raises("ip -o link show")
+    assert "eth0" in o and "eth1" in o
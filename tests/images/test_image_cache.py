@@ -0,0 +1,81 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the concurrent and cached container image checks."
+
+import asyncio
+import time
+
+from types import MethodType
+from types import SimpleNamespace
+
+import pytest
+
+from munet import native
+from munet.native import Munet
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+
+class FakePodman:
+    """Answers `podman image inspect` after a delay, only for `present` images."""
+
+    def __init__(self, present):
+        self.present = present
+        self.inspected = []
+
+    async def async_cmd_status(self, cmd, **kwargs):
+        del kwargs
+        image = cmd[-1]
+        self.inspected.append(image)
+        await asyncio.sleep(0.5)
+        if image in self.present:
+            return 0, f"sha256:{image}\n", ""
+        return 125, "", "image not known"
+
+
+def get_unet(present):
+    unet = SimpleNamespace(rootcmd=FakePodman(present))
+    unet.async_inspect_image = MethodType(Munet.async_inspect_image, unet)
+    return unet
+
+
+async def test_image_inspect_cached(monkeypatch):
+    monkeypatch.setattr(native, "image_ids", {})
+    images = [f"image{x}" for x in range(4)]
+    unet = get_unet(images)
+
+    # Images are inspected concurrently.
+    start = time.monotonic()
+    await Munet.load_images(unet, set(images))
+    assert time.monotonic() - start < 1.5
+    assert sorted(unet.rootcmd.inspected) == images
+
+    # Found images aren't inspected again.
+    unet = get_unet(images)
+    assert await unet.async_inspect_image("image0") == "sha256:image0"
+    await Munet.load_images(unet, set(images))
+    assert not unet.rootcmd.inspected
+
+
+async def test_image_inspect_missing(monkeypatch):
+    monkeypatch.setattr(native, "image_ids", {})
+    unet = get_unet([])
+    assert await unet.async_inspect_image("missing") is None
+    assert await unet.async_inspect_image("missing") is None
+    assert unet.rootcmd.inspected == ["missing", "missing"]
+    assert not native.image_ids
+
+
+async def test_image_missing_error():
+    """`podman run` errors for a missing image are recognized."""
+    assert native.IMAGE_MISSING_RE.search(
+        "Error: docker.io/library/alpine:latest: image not known"
+    )
+    assert native.IMAGE_MISSING_RE.search("Error: no such image: alpine")
+    assert not native.IMAGE_MISSING_RE.search("Error: container name in use")
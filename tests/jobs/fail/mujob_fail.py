@@ -0,0 +1,16 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"""A failing test script run by test_jobs.py."""
+
+from munet.mutest.userapi import match_step
+from munet.mutest.userapi import section
+
+section("A failing test")
+
+match_step("r1", "echo mujob-pass", "mujob-pass", "Check passing step")
+match_step("r1", "echo mujob-fail", "not-seen", "Check failing step")
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of running mutest test directories concurrently (``-j``)."
+
+import logging
+import queue
+import subprocess
+import sys
+
+from pathlib import Path
+
+from munet.mutest.__main__ import LogCollator
+
+
+class ListHandler(logging.Handler):
+    """Keep the messages of the records handled."""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def make_record(index, msg):
+    record = logging.LogRecord("mutest.jobs", logging.INFO, "", 0, msg, None, None)
+    record.mutest_dir = index
+    return record
+
+
+def test_log_collator():
+    """Records are logged in directory order whatever order they arrive in."""
+    handler = ListHandler()
+    logger = logging.getLogger("mutest.jobs")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        q = queue.Queue()
+        collator = LogCollator(q, 3)
+        q.put(make_record(2, "c1"))
+        q.put(make_record(1, "b1"))
+        q.put(make_record(0, "a1"))
+        q.put(make_record(2, "c2"))
+        q.put(("done", 2))
+        q.put(make_record(1, "b2"))
+        q.put(make_record(0, "a2"))
+        q.put(("done", 0))
+        q.put(make_record(1, "b3"))
+        # Directory 1 never finishes, e.g., its worker failed.
+        collator.finish([1])
+    finally:
+        logger.removeHandler(handler)
+    assert handler.messages == ["a1", "a2", "b1", "b2", "b3", "c1", "c2"]
+    assert collator.held == [None] * 3
+
+
+def test_jobs_run(tmp_path):
+    """A ``-j 2`` run totals the results of all directories and fails if any fail."""
+    tdir = Path(__file__).parent
+    p = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "munet.mutest",
+            "-j",
+            "2",
+            "-d",
+            str(tmp_path),
+            "--file-select=mujob_*.py",
+            str(tdir / "fail"),
+            str(tdir / "pass"),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        timeout=300,
+        check=False,
+    )
+    assert p.returncode == 1, p.stdout
+    assert "run stats: 3 steps, 2 pass, 1 fail, 0 abort" in p.stdout
+    assert "END RUN: 2 test scripts, 1 passed, 1 failed" in p.stdout
+    assert " FAIL  1:" in p.stdout
+    assert " PASS  2:" in p.stdout
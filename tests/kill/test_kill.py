@@ -0,0 +1,58 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of waiting for and killing processes."
+
+import subprocess
+import time
+
+from types import SimpleNamespace
+
+from munet.base import Commander
+from munet.base import async_wait_pid_exit
+
+
+class KillGraceOption:
+    """Options with a short `--kill-grace`."""
+
+    def getoption(self, opt, default=None):
+        return 0.5 if opt == "--kill-grace" else default
+
+
+async def test_wait_pid_exit():
+    p = subprocess.Popen(["sleep", "30"])
+    try:
+        assert not await async_wait_pid_exit(p.pid, 0.2)
+        p.terminate()
+        start = time.monotonic()
+        assert await async_wait_pid_exit(p.pid, 10)
+        assert time.monotonic() - start < 1
+    finally:
+        p.kill()
+        p.wait()
+    # Already reaped
+    assert await async_wait_pid_exit(p.pid, 10)
+
+
+async def test_cleanup_pid():
+    c = Commander("test", unet=SimpleNamespace(cfgopt=KillGraceOption()))
+    assert c.kill_grace == 0.5
+    assert Commander("test").kill_grace == 30
+
+    # Exits on SIGHUP
+    p = subprocess.Popen(["sleep", "30"])
+    start = time.monotonic()
+    await c.cleanup_pid(p.pid)
+    assert time.monotonic() - start < 0.5
+
+    # Ignores SIGHUP so is killed after the grace period
+    p = subprocess.Popen(["/bin/bash", "-c", "trap '' HUP; sleep 30 & wait"])
+    time.sleep(0.2)
+    start = time.monotonic()
+    await c.cleanup_pid(p.pid, reap=False)
+    assert 0.5 <= time.monotonic() - start < 2
+    assert p.wait(timeout=5) == -9
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the netlink network backend."
+
+import errno
+import re
+
+import pytest
+
+from munet.netlink import NetlinkError
+from munet.netlink import RtNetlink
+
+# All tests are coroutines
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.parametrize(
+        "unet_unshare",
+        [("munet", True), ("munet-iproute2", True)],
+        indirect=["unet_unshare"],
+    ),
+]
+
+
+async def test_topology(unet_unshare):
+    unet = unet_unshare
+    assert bool(unet.hosts["r1"].get_netlink()) == unet.use_netlink
+
+    r1 = unet.hosts["r1"]
+    o = r1.cmd_raises("ip addr show dev eth0")
+    assert "mtu 4500" in o
+    assert f"inet {r1.get_intf_addr('eth0')} " in o
+    assert f"inet6 {r1.get_intf_addr('eth0', ipv6=True)} " in o
+    o = r1.cmd_raises("ip addr show dev eth1")
+    assert "mtu 9000" in o
+    assert f"inet {r1.get_intf_addr('eth1')} " in o
+
+    r2 = unet.hosts["r2"]
+    assert "mtu 9000" in r2.cmd_raises("ip link show dev eth1")
+    assert "UP" in r2.cmd_raises("ip link show dev eth1")
+
+    o = unet.cmd_raises("ip -o link show master net0")
+    assert len(re.findall("state UP", o)) == 2
+
+    # The cached MACs match the interfaces
+    for (name, ifname), mac in unet.macs.items():
+        node = unet.hosts[name] if name in unet.hosts else unet.switches[name]
+        o = node.cmd_raises_nsonly(f"ip -o link show {ifname}")
+        assert f"link/ether {mac} " in o
+        assert unet.rmacs[mac] == (name, ifname)
+
+
+async def test_rtnetlink(unet_unshare):
+    r1 = unet_unshare.hosts["r1"]
+    r2 = unet_unshare.hosts["r2"]
+
+    nl = RtNetlink(r1.netns_path)
+    try:
+        link = nl.link_add(
+            "nla", "veth", mtu=1400, up=True, peer="nlb", peer_netns=r2.netns_path
+        )
+        assert link["ifname"] == "nla"
+        assert link["mtu"] == 1400
+        assert link["address"] in r1.cmd_raises("ip link show nla")
+        assert "nlb" in r2.cmd_raises("ip link show nlb")
+
+        nl.addr_add("nla", "10.10.0.1/24")
+        nl.addr_add("nla", "10.10.1.1/32", peer="10.10.1.2/32")
+        nl.route_add("10.10.0.2", "10.11.0.0/16")
+        o = r1.cmd_raises("ip addr show nla")
+        assert "inet 10.10.0.1/24" in o
+        assert "inet 10.10.1.1 peer 10.10.1.2/32" in o
+        assert "10.11.0.0/16 via 10.10.0.2" in r1.cmd_raises("ip route show")
+
+        nl.addr_flush("nla")
+        assert "inet " not in r1.cmd_raises("ip addr show nla")
+
+        nl.link_set("nla", name="nlc", mtu=1300, up=False)
+        link = nl.get_link("nlc")
+        assert link["mtu"] == 1300
+        assert "nlc" in nl.get_links()
+
+        with pytest.raises(NetlinkError) as excinfo:
+            nl.link_add("nlc", "bridge")
+        assert excinfo.value.errno == errno.EEXIST
+
+        nl.link_del("nlc")
+        with pytest.raises(NetlinkError) as excinfo:
+            nl.get_link("nlc")
+        assert excinfo.value.errno == errno.ENODEV
+    finally:
+        nl.close()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the pre-created namespace pool."
+
+import os
+
+import pytest
+
+# All tests are coroutines
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.parametrize(
+        "unet_unshare", [("munet", True)], indirect=["unet_unshare"]
+    ),
+]
+
+
+async def test_nodes(unet_unshare):
+    unet = unet_unshare
+    netns = set()
+    for name, host in unet.hosts.items():
+        assert host.p.poll() is None
+        assert host.executor and host.executor.running
+        assert host.cmd_raises("hostname").strip() == name
+        assert os.path.exists(os.path.join(unet.rundir, f"{name}-mutini.log"))
+        netns.add(host.cmd_raises("readlink /proc/self/ns/net").strip())
+
+        o = host.cmd_raises("ip -o addr show dev eth0")
+        assert f" {host.get_intf_addr('eth0').ip}/" in o
+    assert len(netns) == len(unet.hosts)
+
+    r1 = unet.hosts["r1"]
+    o = r1.cmd_raises("ip -o addr show dev eth1")
+    assert f" {r1.get_intf_addr('eth1').ip}/" in o
+
+    # /run/netns is mounted by the node after adopting the namespace
+    o = r1.cmd_raises("ip netns add test && ip netns list && ip netns del test")
+    assert "test" in o
+
+
+async def test_pool_used(unet_unshare):
+    unet = unet_unshare
+    assert unet.ns_pool.count == 3
+
+    # Which pooled namespaces were adopted by nodes depends on timing, but each is
+    # either adopted or still pooled.
+    adopted = [
+        x
+        for x in ("pool1", "pool2", "pool3")
+        if not os.path.exists(os.path.join(unet.rundir, f"{x}-mutini.log"))
+    ]
+    remaining = [x for y in unet.ns_pool.futures.values() for x in y]
+    assert len(adopted) + len(remaining) == 3
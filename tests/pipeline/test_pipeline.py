@@ -0,0 +1,37 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of running a topology using a pipelined build."
+
+import json
+
+import pytest
+
+# All tests are coroutines
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.parametrize(
+        "unet_unshare", [("munet", True)], indirect=["unet_unshare"]
+    ),
+]
+
+
+async def test_pipeline(unet_unshare):
+    unet = unet_unshare
+    assert unet.build_pipeline
+    assert unet.pending_links is None
+
+    # Each node's links were created before its `cmd` was run.
+    for name in ("r1", "r2"):
+        links = unet.hosts[name].rundir.joinpath("links.txt").read_text()
+        assert "eth0" in links and "eth1" in links
+
+    for name in ("r1", "r2", "r3"):
+        assert "UP" in unet.hosts[name].cmd_raises("ip -o link show dev eth0")
+
+    with open(unet.rundir.joinpath("ready-times.json"), encoding="utf-8") as f:
+        assert set(json.load(f)) == {"r1", "r2"}
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the build profiler."
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from munet.base import commander
+from munet.profiler import BuildProfiler
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+
+async def test_profiler():
+    profiler = BuildProfiler()
+    with profiler.span("disabled"):
+        commander.cmd_raises("true")
+    assert not profiler.spans
+
+    profiler = BuildProfiler(enabled=True)
+
+    async def node_work(name):
+        with profiler.span("node", name):
+            await commander.async_cmd_raises("true")
+            await asyncio.sleep(0.1)
+
+    with profiler.span("build"):
+        commander.cmd_raises("true")
+        with profiler.span("nodes"):
+            await asyncio.gather(node_work("r1"), node_work("r2"))
+
+    report = profiler.get_report()
+    phases = report["phases"]
+    assert phases["build"]["subprocesses"] == 3
+    assert phases["nodes"]["subprocesses"] == 2
+    assert phases["node"]["count"] == 2
+    assert phases["node"]["subprocesses"] == 2
+    assert set(phases["node"]["nodes"]) == {"r1", "r2"}
+
+    # The node spans run concurrently
+    assert phases["node"]["total"] >= 0.2
+    assert phases["node"]["wall"] < phases["node"]["total"]
+
+    spans = {(x["name"], x["node"]): x for x in report["spans"]}
+    assert spans[("node", "r1")]["parent"] == "nodes"
+    assert spans[("nodes", None)]["parent"] == "build"
+    assert "node(r" in profiler.get_summary(top=3)
+
+
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_topology_profile(unet_unshare):
+    unet = unet_unshare
+    assert not unet.profiler.enabled
+    assert not unet.profiler.spans
+
+    unet.profiler.enabled = True
+    try:
+        with unet.profiler.span("test", "r1"):
+            unet.hosts["r1"].cmd_raises("ip link show")
+        path = os.path.join(unet.rundir, "test-profile.json")
+        unet.profiler.write(path)
+    finally:
+        unet.profiler.enabled = False
+
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["phases"]["test"]["nodes"]["r1"]["subprocesses"] >= 1
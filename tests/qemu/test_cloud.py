@@ -20,7 +20,7 @@ pytestmark = [
 
 async def test_qemu_up(unet):
     r1 = unet.hosts["r1"]
-    output = r1.monrepl.cmd_nostatus("info status")
+    output = await r1.moncmd("info status")
     assert output == "VM status: running"
 
 
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the guest agent client using a fake qemu-guest-agent."
+
+import asyncio
+import base64
+import json
+import subprocess
+
+import pytest
+
+from munet.base import CalledProcessError
+from munet.native import GuestAgentClient
+
+
+class FakeAgent:
+    """Serve the QGA commands used by munet, running commands locally."""
+
+    def __init__(self, garbage=b""):
+        self.garbage = garbage
+        self.procs = {}
+        self.files = {}
+        self.syncs = 0
+
+    async def serve(self, reader, writer):
+        while line := await reader.readline():
+            line = line.lstrip(b"\xff")
+            if not line.strip():
+                continue
+            msg = json.loads(line)
+            reply = await self.dispatch(msg["execute"], msg.get("arguments", {}))
+            if reply is None:
+                writer.write(self.garbage)
+                continue
+            reply["id"] = msg["id"]
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        writer.close()
+
+    async def dispatch(self, cmd, args):
+        if cmd == "guest-sync":
+            # Pretend the agent isn't running yet for the first sync.
+            self.syncs += 1
+            return None if self.syncs == 1 else {"return": args["id"]}
+        if cmd == "guest-exec":
+            stdin = base64.b64decode(args.get("input-data", ""))
+            p = await asyncio.create_subprocess_exec(
+                args["path"],
+                *args["arg"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            self.procs[p.pid] = asyncio.create_task(p.communicate(stdin))
+            self.procs[p.pid].proc = p
+            return {"return": {"pid": p.pid}}
+        if cmd == "guest-exec-status":
+            task = self.procs[args["pid"]]
+            if not task.done():
+                return {"return": {"exited": False}}
+            o, e = task.result()
+            status = {"exited": True, "exitcode": task.proc.returncode}
+            status["out-data"] = base64.b64encode(o).decode()
+            status["err-data"] = base64.b64encode(e).decode()
+            return {"return": status}
+        if cmd == "guest-file-open":
+            handle = len(self.files) + 1
+            # pylint: disable=consider-using-with
+            self.files[handle] = open(args["path"], args["mode"])
+            return {"return": handle}
+        if cmd == "guest-file-write":
+            data = base64.b64decode(args["buf-b64"])
+            self.files[args["handle"]].write(data)
+            return {"return": {"count": len(data), "eof": False}}
+        if cmd == "guest-file-read":
+            data = self.files[args["handle"]].read(args["count"])
+            ret = {"count": len(data), "buf-b64": base64.b64encode(data).decode()}
+            ret["eof"] = len(data) < args["count"]
+            return {"return": ret}
+        if cmd == "guest-file-close":
+            self.files.pop(args["handle"]).close()
+            return {"return": {}}
+        return {"error": {"class": "CommandNotFound", "desc": cmd}}
+
+
+async def test_guest_agent(tmp_path):
+    sockpath = str(tmp_path / "qga")
+    agent = FakeAgent()
+    server = await asyncio.start_unix_server(agent.serve, sockpath, limit=2**20)
+    qga = GuestAgentClient(sockpath)
+    try:
+        await qga.connect(timeout=10)
+
+        rc, o, e = await qga.cmd_status("echo foo; echo bar >&2; exit 3")
+        assert (rc, o, e) == (3, "foo\n", "bar\n")
+
+        # Commands are run concurrently.
+        outputs = await asyncio.gather(
+            *[qga.cmd_raises(f"sleep 0.5; echo {i}") for i in range(4)]
+        )
+        assert outputs == [f"{i}\n" for i in range(4)]
+
+        assert await qga.cmd_raises(["cat"], stdin="input") == "input"
+        with pytest.raises(CalledProcessError):
+            await qga.cmd_raises("false")
+        with pytest.raises(asyncio.TimeoutError):
+            await qga.exec("sleep 5", timeout=0.5)
+
+        # Binary files larger than a chunk are copied both ways.
+        data = bytes(range(256)) * 1000
+        path = str(tmp_path / "file.bin")
+        await qga.push(data, path, mode=0o755)
+        assert (tmp_path / "file.bin").read_bytes() == data
+        assert (tmp_path / "file.bin").stat().st_mode & 0o777 == 0o755
+        assert await qga.pull(path) == data
+    finally:
+        await qga.close()
+        server.close()
+        await server.wait_closed()
+        for task in agent.procs.values():
+            if task.proc.returncode is None:
+                task.proc.kill()
+            await task
+
+
+async def test_guest_agent_bad_messages(tmp_path):
+    """Output which isn't a JSON message (e.g., a partial reply) is skipped."""
+    sockpath = str(tmp_path / "qga")
+    agent = FakeAgent(garbage=b'"pid": 1}}\n\xff{"ret\n7\n')
+    server = await asyncio.start_unix_server(agent.serve, sockpath)
+    qga = GuestAgentClient(sockpath)
+    try:
+        await qga.connect(timeout=10)
+        assert await qga.cmd_raises("echo foo") == "foo\n"
+    finally:
+        await qga.close()
+        server.close()
+        await server.wait_closed()
+        for task in agent.procs.values():
+            await task
+
+
+async def test_guest_agent_closed(tmp_path):
+    sockpath = str(tmp_path / "qga")
+    server = await asyncio.start_unix_server(lambda r, w: w.close(), sockpath)
+    qga = GuestAgentClient(sockpath)
+    try:
+        with pytest.raises(EOFError):
+            await qga.connect(timeout=10)
+    finally:
+        await qga.close()
+        server.close()
+        await server.wait_closed()
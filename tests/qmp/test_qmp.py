@@ -0,0 +1,111 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the QMP client using a fake QEMU QMP server."
+
+import asyncio
+import json
+
+import pytest
+
+from munet.native import QMPClient
+from munet.native import QMPError
+
+GREETING = {"QMP": {"version": {"qemu": {"major": 8}}, "capabilities": []}}
+
+
+async def fake_qmp(reader, writer):
+    """Serve a few QMP commands, replying to `query-status` last."""
+
+    def send(msg):
+        writer.write(json.dumps(msg).encode() + b"\r\n")
+
+    send(GREETING)
+    negotiated = False
+    delayed = []
+    while line := await reader.readline():
+        msg = json.loads(line)
+        cmd, msgid = msg["execute"], msg.get("id")
+        if cmd == "qmp_capabilities":
+            negotiated = True
+            send({"return": {}, "id": msgid})
+        elif not negotiated:
+            send({"error": {"class": "CommandNotFound", "desc": "no"}, "id": msgid})
+        elif cmd == "query-status":
+            delayed.append({"return": {"status": "running"}, "id": msgid})
+        elif cmd == "query-cpus-fast":
+            cpus = [{"cpu-index": i, "thread-id": 100 + i} for i in range(2)]
+            send({"return": cpus, "id": msgid})
+        elif cmd == "human-monitor-command":
+            send({"return": "VM status: running\r\n", "id": msgid})
+        elif cmd == "system_reset":
+            send({"return": {}, "id": msgid})
+            send({"event": "RESET", "data": {"guest": False}, "timestamp": {}})
+        elif cmd == "quit":
+            send({"return": {}, "id": msgid})
+            send({"event": "SHUTDOWN", "data": {"guest": False}, "timestamp": {}})
+            await writer.drain()
+            break
+        else:
+            desc = f"The command {cmd} has not been found"
+            send({"error": {"class": "CommandNotFound", "desc": desc}, "id": msgid})
+        if delayed and cmd != "query-status":
+            for x in delayed:
+                send(x)
+            delayed = []
+        await writer.drain()
+    writer.close()
+
+
+async def test_qmp(tmp_path):
+    sockpath = str(tmp_path / "qmp")
+    server = await asyncio.start_unix_server(fake_qmp, sockpath)
+    qmp = QMPClient(sockpath, logpath=str(tmp_path / "qmp-log.txt"))
+    try:
+        await qmp.connect(timeout=5)
+        assert qmp.greeting == GREETING
+
+        # Replies are matched to commands using the id, not the order.
+        status, cpus = await asyncio.gather(qmp.query_status(), qmp.query_cpus_fast())
+        assert status == {"status": "running"}
+        assert {x["cpu-index"]: x["thread-id"] for x in cpus} == {0: 100, 1: 101}
+
+        output = await qmp.human_monitor_command("info status")
+        assert output == "VM status: running"
+
+        with pytest.raises(QMPError) as error:
+            await qmp.execute("bogus")
+        assert error.value.error["class"] == "CommandNotFound"
+
+        waiter = asyncio.create_task(qmp.wait_event("RESET", timeout=5))
+        await asyncio.sleep(0)
+        await qmp.execute("system_reset")
+        assert (await waiter)["data"] == {"guest": False}
+
+        events = qmp.subscribe(["SHUTDOWN"])
+        await qmp.execute("system_reset")
+        await qmp.execute("quit")
+        event = await asyncio.wait_for(events.get(), 5)
+        assert event["event"] == "SHUTDOWN"
+        # The connection closing is signalled to subscribers.
+        assert await asyncio.wait_for(events.get(), 5) is None
+
+        with pytest.raises(EOFError):
+            await qmp.execute("query-status", timeout=5)
+    finally:
+        await qmp.close()
+        server.close()
+        await server.wait_closed()
+
+    log = (tmp_path / "qmp-log.txt").read_text()
+    assert '-> {"execute": "qmp_capabilities", "id": 1}' in log
+
+
+async def test_qmp_connect_timeout(tmp_path):
+    qmp = QMPClient(str(tmp_path / "qmp"))
+    with pytest.raises(FileNotFoundError):
+        await qmp.connect(timeout=0.3)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the qemu boot snapshot key and directory."
+
+import logging
+import os
+import sys
+
+from pathlib import Path
+from types import SimpleNamespace
+
+from munet.native import QEMU_SNAPSHOT_DIR
+from munet.native import QemuSnapshot
+
+
+def get_vm(tmp_path, rundir, snapshot=True, name="r1", **kwargs):
+    vm = SimpleNamespace(
+        name=name,
+        rundir=Path(rundir),
+        diskpath=None,
+        disk_created=False,
+        qemu_config={"snapshot": snapshot, "memory": "512M"},
+        unet=SimpleNamespace(config_dirname=str(tmp_path)),
+        logger=logging.getLogger(__name__),
+    )
+    vm.qemu_config.update(kwargs)
+    return vm
+
+
+def get_args(rundir, tap=3, fd=7):
+    return [
+        sys.executable,
+        "-m",
+        "512M",
+        f"-chardev socket,id=_qga,path={rundir}/s/_qga,server=on,wait=off",
+        f"-netdev tap,id=n0,ifname=tap{tap},script=no,fd={fd}",
+    ]
+
+
+def test_snapshot_dir_normalized(tmp_path):
+    """Per-run values don't change the snapshot directory."""
+    vm1 = get_vm(tmp_path, "/tmp/unet-1/r1")
+    vm2 = get_vm(tmp_path, "/tmp/unet-2/r1")
+    dir1 = QemuSnapshot.get_dir(vm1, get_args(vm1.rundir))
+    dir2 = QemuSnapshot.get_dir(vm2, get_args(vm2.rundir, tap=9, fd=12))
+    assert dir1 == dir2
+    assert dir1.parent == Path(QEMU_SNAPSHOT_DIR)
+
+
+def test_snapshot_dir_changes(tmp_path):
+    """Changing the args, config or images gives a new snapshot directory."""
+    vm = get_vm(tmp_path, "/tmp/unet-1/r1")
+    args = get_args(vm.rundir)
+    base = QemuSnapshot.get_dir(vm, args)
+
+    assert QemuSnapshot.get_dir(vm, args + ["-smp 2"]) != base
+
+    vm2 = get_vm(tmp_path, "/tmp/unet-1/r1", memory="1G")
+    assert QemuSnapshot.get_dir(vm2, args) != base
+
+    kernel = tmp_path / "bzImage"
+    kernel.write_bytes(b"kernel")
+    vm3 = get_vm(tmp_path, "/tmp/unet-1/r1", kernel="bzImage")
+    kdir = QemuSnapshot.get_dir(vm3, args)
+    kernel.write_bytes(b"new kernel")
+    assert QemuSnapshot.get_dir(vm3, args) != kdir
+
+
+def test_snapshot_dir_option(tmp_path):
+    """A string `snapshot` value is the snapshot directory, persistent disks skip."""
+    vm = get_vm(tmp_path, "/tmp/unet-1/r1", snapshot=str(tmp_path / "snaps"))
+    path = QemuSnapshot.get_dir(vm, get_args(vm.rundir))
+    assert path.parent == tmp_path / "snaps"
+
+    vm.diskpath = str(tmp_path / "disk.qcow2")
+    assert QemuSnapshot.get_dir(vm, get_args(vm.rundir)) is None
+    vm.disk_created = True
+    assert QemuSnapshot.get_dir(vm, get_args(vm.rundir)) is not None
+
+
+def test_snapshot_dir_node(tmp_path):
+    """The node name and generated cloud-init data are part of the key."""
+    rundir = tmp_path / "r1"
+    vm = get_vm(tmp_path, rundir)
+    args = get_args(vm.rundir)
+    base = QemuSnapshot.get_dir(vm, args)
+    assert QemuSnapshot.get_dir(get_vm(tmp_path, rundir, name="r2"), args) != base
+
+    cidir = rundir / "ci-data"
+    cidir.mkdir(parents=True)
+    (cidir / "user-data").write_text("hostname: r1\n", encoding="utf-8")
+    cidata = QemuSnapshot.get_dir(vm, args)
+    assert cidata != base
+    (cidir / "user-data").write_text("hostname: r2\n", encoding="utf-8")
+    assert QemuSnapshot.get_dir(vm, args) != cidata
+
+
+def test_snapshot_prune(tmp_path):
+    """Least recently used snapshots and stale temporary directories are removed."""
+    vm = get_vm(tmp_path, tmp_path / "r1")
+    snaps = tmp_path / "snaps"
+    keys = {x: x[0] * 32 for x in ["a-old", "b-mid", "c-new", "d-current"]}
+    for i, key in enumerate(keys.values()):
+        path = snaps / key
+        path.mkdir(parents=True)
+        (path / "state").write_bytes(b"x" * 100)
+        os.utime(path, (1000 + i, 1000 + i))
+    # A pid which doesn't exist, and our own (in progress) save.
+    (snaps / f"{keys['a-old']}.tmp-999999999").mkdir()
+    (snaps / f"{keys['c-new']}.tmp-{os.getpid()}").mkdir()
+    # Anything else in the directory isn't ours and is left alone.
+    (snaps / "other").mkdir()
+    (snaps / "other" / "data").write_bytes(b"x" * 1000)
+    os.utime(snaps / "other", (900, 900))
+
+    QemuSnapshot(vm, snaps / keys["d-current"]).prune(max_size=300)
+    assert sorted(x.name for x in snaps.iterdir()) == [
+        keys["b-mid"],
+        keys["c-new"],
+        f"{keys['c-new']}.tmp-{os.getpid()}",
+        keys["d-current"],
+        "other",
+    ]
+
+
+def test_snapshot_setup_dir(tmp_path):
+    """The snapshot directory is private, others' directories aren't used."""
+    vm = get_vm(tmp_path, tmp_path / "r1")
+    snaps = tmp_path / "snaps"
+    assert QemuSnapshot(vm, snaps / ("0" * 32)).setup_dir()
+    assert snaps.stat().st_mode & 0o777 == 0o700
+
+    snaps.chmod(0o1777)
+    assert not QemuSnapshot(vm, snaps / ("0" * 32)).setup_dir()
+
+    link = tmp_path / "link"
+    link.symlink_to(tmp_path / "elsewhere")
+    (tmp_path / "elsewhere").mkdir(mode=0o700)
+    assert not QemuSnapshot(vm, link / ("0" * 32)).setup_dir()
+
+
+def test_snapshot_abort_restore(tmp_path):
+    """A failed restore puts back the new disk overlay and removes the snapshot."""
+    rundir = tmp_path / "r1"
+    rundir.mkdir()
+    vm = get_vm(tmp_path, rundir)
+    vm.diskpath = str(rundir / "disk.qcow2")
+    vm.disk_created = True
+    snapdir = tmp_path / "snaps" / "key"
+    snapdir.mkdir(parents=True)
+    (snapdir / "state").write_bytes(b"state")
+    (snapdir / "disk.qcow2").write_bytes(b"snapshot disk")
+    (rundir / "disk.qcow2").write_bytes(b"new disk")
+
+    snapshot = QemuSnapshot(vm, snapdir)
+    snapshot.prepare_restore()
+    assert snapshot.restored
+    assert (rundir / "disk.qcow2").read_bytes() == b"snapshot disk"
+    assert (rundir / "snapshot-state").read_bytes() == b"state"
+
+    snapshot.abort_restore()
+    assert not snapshot.restored
+    assert (rundir / "disk.qcow2").read_bytes() == b"new disk"
+    assert not (rundir / "snapshot-state").exists()
+    assert not snapdir.exists()
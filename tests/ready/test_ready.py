@@ -0,0 +1,50 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of node readiness probes."
+
+import json
+import socket
+
+import pytest
+
+from munet import ready
+
+
+def test_parse_tcp_addr():
+    ip, port = ready.parse_tcp_addr("10.0.0.1:80")
+    assert (str(ip), port) == ("10.0.0.1", 80)
+    ip, port = ready.parse_tcp_addr("[fc00::1]:179")
+    assert (str(ip), port) == ("fc00::1", 179)
+    with pytest.raises(ValueError):
+        ready.parse_tcp_addr("10.0.0.1")
+
+
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_ready(unet_unshare):
+    unet = unet_unshare
+    r1 = unet.hosts["r1"]
+    r2 = unet.hosts["r2"]
+    assert r1.has_ready() and not r1.has_ready_cmd()
+    assert r2.has_ready() and r2.has_ready_cmd()
+
+    # The topology is only returned once all the probes have succeeded.
+    assert r1.rundir.joinpath("started").exists()
+    assert "daemon is up" in r1.rundir.joinpath("daemon.log").read_text()
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(str(r1.rundir.joinpath("daemon.sock")))
+
+    with open(unet.rundir.joinpath("ready-times.json"), encoding="utf-8") as f:
+        times = json.load(f)
+    assert set(times) == {"r1", "r2"}
+    assert times["r1"] >= 0
+
+    # Readiness is checked again on reset, the probes are still satisfied.
+    await unet.async_reset()
+    with open(unet.rundir.joinpath("ready-times.json"), encoding="utf-8") as f:
+        times = json.load(f)
+    assert times["r1"] < 1
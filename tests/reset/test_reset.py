@@ -0,0 +1,63 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of resetting a running topology for reuse."
+
+import time
+
+import pytest
+
+# All tests are coroutines
+pytestmark = [
+    pytest.mark.asyncio,
+    pytest.mark.parametrize(
+        "unet_unshare", [("munet", True)], indirect=["unet_unshare"]
+    ),
+]
+
+
+async def test_reset(unet_unshare):
+    unet = unet_unshare
+    r1 = unet.hosts["r1"]
+    r2 = unet.hosts["r2"]
+    assert r1.has_reset_cmd()
+    assert not r2.has_reset_cmd()
+
+    logpath = r1.rundir.joinpath("test.log")
+    r1.add_watch_log(logpath)
+    wl = r1.watched_logs[logpath]
+    r1.cmd_raises(f"echo line-1 > {logpath}")
+    assert "line-1" in wl.peek_snapshot()
+
+    r1.cmd_raises(f"echo line-2 >> {logpath}")
+    await unet.async_reset()
+    assert r1.cmd_raises(f"cat {r1.rundir}/reset.log") == "reset\n"
+
+    # Content logged before the reset is no longer visible.
+    assert wl.peek_snapshot() == ""
+    assert wl.from_mark() == ""
+    r1.cmd_raises(f"echo line-3 >> {logpath}")
+    assert wl.peek_snapshot() == "line-3\n"
+
+    # The topology is still running and usable after a reset.
+    assert r1.cmd_p.returncode is None
+    await unet.async_reset()
+    assert r1.cmd_raises(f"cat {r1.rundir}/reset.log") == "reset\nreset\n"
+    assert "UP" in r2.cmd_raises("ip -o link show dev eth0")
+
+
+async def test_reset_ready(unet_unshare):
+    """Readiness after a reset isn't satisfied by a file or log from before it."""
+    unet = unet_unshare
+    r3 = unet.hosts["r3"]
+    logpath = r3.rundir.joinpath("daemon.log")
+    count = logpath.read_text(encoding="utf-8").count("daemon up")
+
+    start = time.monotonic()
+    await unet.async_reset()
+    assert time.monotonic() - start >= 1
+    assert logpath.read_text(encoding="utf-8").count("daemon up") == count + 1
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of node resource limits and usage sampling."
+
+import asyncio
+import json
+
+import pytest
+
+from munet.cgroup import CGroup
+from munet.cgroup import get_cpu_max
+from munet.cgroup import get_delegatable_controllers
+from munet.native import get_podman_resource_args
+
+
+def test_cpu_max():
+    assert get_cpu_max(0.5) == "50000 100000"
+    assert get_cpu_max(2) == "200000 100000"
+    assert get_cpu_max("1.5") == "150000 100000"
+    assert get_cpu_max("max 100000") == "max 100000"
+
+
+def test_podman_resource_args():
+    args = get_podman_resource_args(
+        {
+            "cpu-weight": 100,
+            "cpu-max": 0.5,
+            "cpuset": "0-1",
+            "memory-max": "64M",
+            "pids-max": 100,
+        }
+    )
+    assert args == [
+        "--cpu-shares=2597",
+        "--cpu-quota=50000",
+        "--cpu-period=100000",
+        "--cpuset-cpus=0-1",
+        "--memory=64M",
+        "--pids-limit=100",
+    ]
+    assert get_podman_resource_args({"cpu-weight": 1}) == ["--cpu-shares=2"]
+    assert get_podman_resource_args({"cpu-weight": 10000}) == ["--cpu-shares=262144"]
+    with pytest.raises(ValueError):
+        get_podman_resource_args({"cpu-count": 1})
+
+
+@pytest.mark.skipif(
+    not {"cpu", "memory", "pids"} <= set(get_delegatable_controllers()),
+    reason="cpu, memory and pids controllers not available to munet's cgroup",
+)
+@pytest.mark.parametrize("unet_unshare", [("munet", True)], indirect=["unet_unshare"])
+async def test_resource_limits(unet_unshare):
+    unet = unet_unshare
+    assert unet.cgroup_mode == "node"
+    r1 = unet.hosts["r1"]
+    assert r1.get_resource_cgroup().path == unet.cgroup_topology.path / "r1"
+
+    expected = {
+        "cpu.weight": "50",
+        "cpu.max": "50000 100000",
+        "memory.max": str(64 * 1024 * 1024),
+        "pids.max": "100",
+    }
+    for name, value in expected.items():
+        assert r1.cgroup.path.joinpath(name).read_text().strip() == value
+
+
+def test_resource_limits_unavailable(tmp_path):
+    cg = CGroup(tmp_path)
+    tmp_path.joinpath("pids.max").write_text("max")
+    cg.set_limits({"pids-max": 100})
+    assert tmp_path.joinpath("pids.max").read_text() == "100"
+    with pytest.raises(ValueError, match="memory controller is not available"):
+        cg.set_limits({"memory-max": "64M"})
+
+
+@pytest.mark.parametrize(
+    "unet_unshare", [("munet-sampling", True)], indirect=["unet_unshare"]
+)
+async def test_resource_sampling(unet_unshare):
+    unet = unet_unshare
+    if unet.cgroup_topology is None:
+        pytest.skip("cgroup v2 not available")
+    r2 = unet.hosts["r2"]
+
+    # Long-lived processes (i.e., not short commands) are placed in the cgroup.
+    p = r2.popen(["dd", "if=/dev/zero", "of=/dev/null", "bs=1M", "count=100"])
+    assert p.wait(timeout=30) == 0
+    sample = unet.resource_sampler.sample()
+    assert set(sample["nodes"]) == {"r1", "r2"}
+    assert sample["nodes"]["r2"]["usage_usec"] > 0
+
+    unet.resource_sampler.start(0.1)
+    await asyncio.sleep(0.5)
+    await unet.resource_sampler.stop()
+    assert unet.resource_sampler.task is None
+
+    lines = unet.rundir.joinpath("resources.jsonl").read_text().splitlines()
+    assert len(lines) >= 4
+    samples = [json.loads(x) for x in lines]
+    assert all(set(x["nodes"]) == {"r1", "r2"} for x in samples)
+    assert samples[-1]["time"] > samples[0]["time"]
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 eval: (blacken-mode 1) -*-
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+# October 17 2026
+#
+# Copyright (c) 2026, LabN Consulting, L.L.C.
+#
+"Testing of the managed ssh ControlMaster using a fake ssh."
+
+import asyncio
+import logging
+import sys
+
+from types import SimpleNamespace
+
+import pytest
+
+from munet.base import commander
+from munet.native import SSHControlMaster
+
+# All tests are coroutines
+pytestmark = pytest.mark.asyncio
+
+FAKE_SSH = """#!/bin/sh
+dir=$(dirname "$0")
+MASTER='
+import socket, sys, time
+s = socket.socket(socket.AF_UNIX)
+s.bind(sys.argv[1])
+time.sleep(60)
+'
+for a; do
+    case $a in
+        -oControlPath=*) path=${a#-oControlPath=} ;;
+        -MN) op=master ;;
+        -Ocheck) op=check ;;
+        -Oexit) op=exit ;;
+    esac
+done
+case $op in
+    master)
+        echo start >> "$dir/starts"
+        [ -e "$dir/fail" ] && exit 255
+        exec %s -c "$MASTER" "$path" ;;
+    check)
+        echo check >> "$dir/checks"
+        [ -S "$path" ] ;;
+    exit) rm -f "$path" ;;
+esac
+"""
+
+
+def get_master(tmp_path):
+    ssh = tmp_path / "ssh"
+    ssh.write_text(FAKE_SSH % sys.executable)
+    ssh.chmod(0o755)
+    rundir = tmp_path / "r1"
+    rundir.mkdir()
+    node = SimpleNamespace(name="r1", rundir=rundir, logger=logging.getLogger())
+    return SSHControlMaster(node, commander, [str(ssh), "-q"], "root@10.0.0.1")
+
+
+async def wait_args(ctl):
+    """Wait for the master to connect in the background returning its args."""
+    for _ in range(100):
+        if args := ctl.get_args():
+            return args
+        await asyncio.sleep(0.05)
+    return []
+
+
+def get_count(tmp_path, name="starts"):
+    path = tmp_path / name
+    return len(path.read_text().split()) if path.exists() else 0
+
+
+async def test_control_master(tmp_path):
+    ctl = get_master(tmp_path)
+    assert not ctl.check()
+
+    # Started in the background on first use, commands connect directly until up.
+    assert not ctl.get_args()
+    args = await wait_args(ctl)
+    assert args == ["-oControlMaster=no", f"-oControlPath={ctl.path}"]
+    assert ctl.path.parent == tmp_path / "r1" / "_ssh"
+    assert get_count(tmp_path) == 1
+
+    # The master is checked once connected, then only periodically.
+    assert get_count(tmp_path, "checks") == 1
+    for _ in range(5):
+        assert ctl.get_args() == args
+    assert get_count(tmp_path, "checks") == 1
+    ctl.checked_at -= ctl.CHECK_INTERVAL
+    assert ctl.get_args() == args
+    assert get_count(tmp_path, "checks") == 2
+    assert ctl.check()
+
+    # Re-started if the control socket goes away.
+    ctl.path.unlink()
+    assert not ctl.get_args()
+    assert await wait_args(ctl) == args
+    assert get_count(tmp_path) == 2
+
+    # Re-started if the master exits.
+    ctl.proc.kill()
+    ctl.proc.wait()
+    assert await wait_args(ctl) == args
+    assert get_count(tmp_path) == 3
+
+    await ctl.async_stop()
+    assert not ctl.check()
+    assert not ctl.sockdir.exists()
+
+
+async def test_control_master_fail(tmp_path):
+    ctl = get_master(tmp_path)
+    (tmp_path / "fail").touch()
+
+    # Commands connect directly and starting isn't retried right away.
+    assert not ctl.get_args()
+    ctl.proc.wait()
+    assert not ctl.get_args()
+    assert not ctl.get_args()
+    assert get_count(tmp_path) == 1
+
+    (tmp_path / "fail").unlink()
+    ctl.failed_at -= ctl.RETRY_DELAY
+    assert await wait_args(ctl)
+    assert get_count(tmp_path) == 2
+    await ctl.async_stop()
@@ -8,6 +8,14 @@
 
 "Testing of basic topology configuration."
 
+import asyncio
+import time
+
+import pytest
+
+from munet.watchlog import FileNotifier
+from munet.watchlog import LogScanner
+from munet.watchlog import MatchFoundError
 from munet.watchlog import WatchLog
 
 
@@ -70,3 +78,183 @@ def test_watchlog_wait(unet, stepf):
     finally:
         p.terminate()
         r1.cmd_status(f"rm -f {logpath}")
+
+
+async def test_watchlog_async_wait(tmp_path):
+    logpath = tmp_path.joinpath("test_watchlog.log")
+    wl = WatchLog(logpath)
+
+    notifier = FileNotifier.create(logpath)
+    assert notifier, "inotify should be available"
+    assert not notifier.changed()
+    logpath.write_text("line-1\n", encoding="utf-8")
+    assert notifier.wait(1)
+    # Changes to other files in the directory are ignored.
+    tmp_path.joinpath("other.log").write_text("other\n", encoding="utf-8")
+    assert not notifier.wait(0.2)
+    notifier.close()
+
+    async def append(line, delay):
+        await asyncio.sleep(delay)
+        with open(logpath, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    task = asyncio.create_task(append("line-2", 0.5))
+    start = time.monotonic()
+    m = await wl.async_wait_for_match(r"line-2", timeout=4)
+    assert m.group(0) == "line-2"
+    # Woken by the change rather than a polling interval.
+    assert time.monotonic() - start < 1.5
+    await task
+
+    with pytest.raises(TimeoutError):
+        await wl.async_wait_for_match(r"line-3", timeout=0.5)
+
+    mtask = wl.raise_if_match_task(r"line-3")
+    await asyncio.sleep(0.1)
+    await append("line-3", 0)
+    with pytest.raises(MatchFoundError):
+        await asyncio.wait_for(mtask, 1)
+
+
+def test_watchlog_bounded(tmp_path):
+    logpath = tmp_path.joinpath("test_watchlog.log")
+    wl = WatchLog(logpath, max_content=100, match_overlap=10)
+
+    with open(logpath, "w", encoding="utf-8") as f:
+        for i in range(50):
+            f.write(f"line-{i:03}\n")
+    assert wl.wait_for_match(r"line-049", timeout=1)
+
+    # Only the most recent content is kept, but marks are offsets into all of it.
+    assert len(wl.content) == 100
+    assert wl.content_end == 450
+    assert wl.set_mark() == 0
+    assert wl.last_user_mark == 450
+    assert wl.from_mark(0) == wl.content
+    with pytest.raises(TimeoutError):
+        wl.wait_for_match(r"line-000", timeout=0)
+
+    with open(logpath, "a", encoding="utf-8") as f:
+        f.write("line-050\n")
+    assert wl.snapshot() == wl.content
+    assert wl.from_mark() == "line-050\n"
+
+    # Only new content (and the overlap) is searched, a match spanning two
+    # updates is found.
+    with open(logpath, "ab") as f:
+        f.write(b"split-\xc3")
+        f.flush()
+        wl.update_content()
+        f.write(b"\xa9-match\n")
+    assert wl.wait_for_match(r"split-é-match", timeout=1)
+    assert wl.snapshot() == "split-é-match\n"
+
+
+async def test_log_scanner(tmp_path):
+    scanner = LogScanner()
+    logs = [WatchLog(tmp_path.joinpath(f"daemon{i}.log")) for i in range(20)]
+    logs[0].path.write_text("old assert\n", encoding="utf-8")
+
+    found = []
+    try:
+        for wl in logs:
+            for regex in (r"assert\w*", r"SIGSEGV", r"sanitizer"):
+                scanner.subscribe(wl, regex, lambda wl, m: found.append((wl, m[0])))
+        future = scanner.watch_for(logs[3], r"assertion (failed)?")
+
+        # Existing content is searched on subscribe.
+        assert found == [(logs[0], "assert")]
+        found.clear()
+
+        def append(wl, text):
+            with open(wl.path, "a", encoding="utf-8") as f:
+                f.write(text)
+
+        append(logs[1], "signal SIGSEGV, assertion failed\n")
+        append(logs[2], "nothing to see\n")
+        append(logs[3], "AddressSanitizer: sanitizer error\n")
+        for _ in range(20):
+            if len(found) == 3:
+                break
+            await asyncio.sleep(0.1)
+        # Logs are scanned in any order, each log's matches are in order.
+        found.sort(key=lambda x: logs.index(x[0]))
+        assert found == [
+            (logs[1], "SIGSEGV"),
+            (logs[1], "assertion"),
+            (logs[3], "sanitizer"),
+        ]
+        assert not future.done()
+
+        # Both patterns matching at the same position are dispatched.
+        found.clear()
+        append(logs[3], "assertion failed\n")
+        with pytest.raises(MatchFoundError) as error:
+            await asyncio.wait_for(future, 1)
+        assert error.value.match[0] == "assertion failed"
+        assert found == [(logs[3], "assertion")]
+        assert len(scanner.subs[logs[3]]) == 3
+    finally:
+        scanner.close()
+
+
+async def test_log_scanner_backref(tmp_path):
+    """Regexes using numbered backreferences still match when scanned together."""
+    scanner = LogScanner()
+    wl = WatchLog(tmp_path.joinpath("daemon.log"))
+    wl.path.write_text("", encoding="utf-8")
+
+    found = []
+    try:
+        scanner.subscribe(wl, r"x", lambda wl, m: found.append(m[0]))
+        scanner.subscribe(wl, r"(a)\1", lambda wl, m: found.append(m[0]))
+        scanner.subscribe(wl, r"(?P<b>b)(?P=b)", lambda wl, m: found.append(m[0]))
+        assert scanner.combined[wl] is None
+
+        with open(wl.path, "a", encoding="utf-8") as f:
+            f.write("aa bb x\n")
+        for _ in range(20):
+            if len(found) == 3:
+                break
+            await asyncio.sleep(0.1)
+        assert sorted(found) == ["aa", "bb", "x"]
+    finally:
+        scanner.close()
+
+
+async def test_log_scanner_error(tmp_path):
+    """An error scanning one log doesn't stop the scanner."""
+    scanner = LogScanner()
+    logs = [WatchLog(tmp_path.joinpath(f"daemon{i}.log")) for i in range(2)]
+    found = []
+    try:
+        for wl in logs:
+            scanner.subscribe(wl, r"assert", lambda wl, m: found.append(wl))
+
+        def update_content():
+            raise FileNotFoundError(logs[0].path)
+
+        # Simulate the log being removed while scanning.
+        logs[0].update_content = update_content
+        for wl in logs:
+            with open(wl.path, "a", encoding="utf-8") as f:
+                f.write("assert\n")
+        for _ in range(20):
+            if found:
+                break
+            await asyncio.sleep(0.1)
+        assert found == [logs[1]]
+
+        # The scanner is still running.
+        del logs[0].update_content
+        with open(logs[1].path, "a", encoding="utf-8") as f:
+            f.write("assert\n")
+        for _ in range(20):
+            if len(found) == 3:
+                break
+            await asyncio.sleep(0.1)
+        assert sorted(found, key=logs.index) == [logs[0], logs[1], logs[1]]
+        assert not scanner.task.done()
+    finally:
+        scanner.close()